@@ -1,12 +1,41 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from .routes import addresses, update, ens, stats
+from .routes import addresses, update, ens, stats, metrics, debug, stream
+from .services.scheduler import scheduler_service, SCHEDULER_ENABLED
+from .services.http import http_service
+from .services.metrics import MetricsMiddleware
+from .services.compression import CompressionMiddleware
+from .services.logging_service import logging_service
+from .services.snapshot import snapshot_service
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers share the published snapshot; build it if storage is newer or it's missing
+    try:
+        snapshot_service.ensure_current()
+    except FileNotFoundError:
+        print("No stored addresses yet, the snapshot is built on the first update")
+    # The scheduler runs its jobs on the server's event loop, in one worker only
+    if SCHEDULER_ENABLED:
+        scheduler_service.start_leader_election()
+    yield
+    if scheduler_service.scheduler.running:
+        scheduler_service.stop_scheduler()
+    await logging_service.flush()
+    await http_service.close()
 
 def create_app() -> FastAPI:
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
+    # The last middleware added runs first, so request metrics include cache hits
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(MetricsMiddleware)
     app.include_router(addresses.router)
     app.include_router(update.router)
     app.include_router(ens.router)
     app.include_router(stats.router)
+    app.include_router(metrics.router)
+    app.include_router(debug.router)
+    app.include_router(stream.router)
     return app
 
 app = create_app()
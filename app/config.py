@@ -1,23 +1,45 @@
 import json
-from web3 import Web3
+import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from .constants import PROVIDER_URL, STAKING_CONTRACT_ADDRESS, PRIME_TOKEN_ADDRESS
 
 load_dotenv()
 
-web3 = Web3(Web3.HTTPProvider(PROVIDER_URL))
+ABI_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "abi")
 
-with open("abi/staking_contract_abi.json", "r") as f:
-    staking_contract_abi = json.load(f)
+# web3 takes about a second to import, so the provider, ABIs and contracts are built on
+# first use; processes that only serve reads never import it
 
-with open("abi/prime_token_abi.json", "r") as f:
-    prime_token_abi = json.load(f)
+@lru_cache(maxsize=None)
+def get_web3():
+    from web3 import Web3
+    return Web3(Web3.HTTPProvider(PROVIDER_URL))
 
-staking_contract = web3.eth.contract(
-    address=web3.to_checksum_address(STAKING_CONTRACT_ADDRESS), 
-    abi=staking_contract_abi
-)
-prime_token_contract = web3.eth.contract(
-    address=web3.to_checksum_address(PRIME_TOKEN_ADDRESS), 
-    abi=prime_token_abi
-)
+@lru_cache(maxsize=None)
+def get_async_web3():
+    """AsyncWeb3 over the Ethereum mainnet RPC pool, for log and ENS calls made from the event loop"""
+    from web3 import AsyncWeb3
+    from .services.web3_provider import PoolProvider
+    return AsyncWeb3(PoolProvider("eth-mainnet"))
+
+@lru_cache(maxsize=None)
+def load_abi(name: str):
+    with open(os.path.join(ABI_DIR, f"{name}.json"), "r") as f:
+        return json.load(f)
+
+@lru_cache(maxsize=None)
+def get_staking_contract():
+    web3 = get_web3()
+    return web3.eth.contract(
+        address=web3.to_checksum_address(STAKING_CONTRACT_ADDRESS),
+        abi=load_abi("staking_contract_abi")
+    )
+
+@lru_cache(maxsize=None)
+def get_prime_token_contract():
+    web3 = get_web3()
+    return web3.eth.contract(
+        address=web3.to_checksum_address(PRIME_TOKEN_ADDRESS),
+        abi=load_abi("prime_token_abi")
+    )
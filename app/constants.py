@@ -1,5 +1,16 @@
-PROVIDER_URL = "https://ethereum-rpc.publicnode.com"
-PROVIDER_URL_BASE = "https://base-rpc.publicnode.com"
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upstream base URLs can be overridden, e.g. to point the app at benchmarks.simulator
+PROVIDER_URL = os.getenv("PROVIDER_URL", "https://ethereum-rpc.publicnode.com")
+PROVIDER_URL_BASE = os.getenv("PROVIDER_URL_BASE", "https://base-rpc.publicnode.com")
+ALCHEMY_BASE_URL = os.getenv("ALCHEMY_BASE_URL", "https://{network}.g.alchemy.com")  # {network} is e.g. eth-mainnet
+WAYFINDER_API_URL = os.getenv("WAYFINDER_API_URL", "https://caching.wayfinder.ai/api")
+DUNE_API_URL = os.getenv("DUNE_API_URL", "https://api.dune.com")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
 STAKING_CONTRACT_ADDRESS = "0x4a3826bd2e8a31956ad0397a49efde5e0d825238"
 STAKING_CONTRACT_ADDRESS_BASE = "0x75a44a70ccb0e886e25084be14bd45af57915451"
 PRIME_TOKEN_ADDRESS = "0xb23d80f5FefcDDaa212212F028021B41DEd428CF"
@@ -21,5 +21,10 @@ app.add_middleware(
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Workers share the leaderboard snapshot file; one of them runs the scheduled updates
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    # Worker processes import the app themselves, so they need the import string
+    target = app if workers == 1 else "app.main:app"
+    uvicorn.run(target, host="0.0.0.0", port=8000, workers=workers)
@@ -0,0 +1,28 @@
+from typing import Dict, NamedTuple, Optional
+
+class RecordSummary(NamedTuple):
+    """The handful of fields the leaderboard UI shows, built once per record at publish"""
+    address: str
+    ens_name: Optional[str]
+    leaderboard_rank: Optional[int]
+    position: Optional[int]
+    score: float
+    percentage: Optional[float]
+    prime_cached: int
+    avatar_count: int
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "RecordSummary":
+        data = record.get("data", {})
+        return cls(
+            address=record["address"],
+            ens_name=data.get("ens_name"),
+            leaderboard_rank=data.get("leaderboard_rank"),
+            position=data.get("position"),
+            score=sum(data.get("merged_score_data", {}).values()),
+            percentage=data.get("percentage"),
+            prime_cached=data.get("prime_amount_cached", 0) + data.get("base_prime_amount_cached", 0),
+            avatar_count=data.get("avatar_count", 0),
+        )
+
+SUMMARY_FIELDS = RecordSummary._fields
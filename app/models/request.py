@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class AddressRequest(BaseModel):
     addresses: list[str]
+
+class PositionBatchRequest(BaseModel):
+    queries: list[str] = Field(max_length=500, description="Ethereum addresses or ENS names")
+    window: int = Field(default=0, ge=0, le=10, description="Neighbouring records to include on each side")
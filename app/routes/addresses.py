@@ -1,92 +1,133 @@
 from fastapi import APIRouter, Query, HTTPException
-from ..services.blockchain import blockchain_service
-from ..models.request import AddressRequest
+from fastapi.responses import Response
+from ..services.snapshot import snapshot_service
+from ..services.history import history_service
+from ..models.request import AddressRequest, PositionBatchRequest
 import json
-from typing import Optional
-from .ens import ens_to_address  # Import the ENS lookup mapping
+from typing import List, Optional
 
 router = APIRouter()
 
+FIELDS_DESCRIPTION = "Comma-separated record data fields to return, or 'summary' for the compact record"
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+def _project(record: dict, fields: List[str]) -> dict:
+    data = record["data"]
+    return {"address": record["address"], "data": {field: data[field] for field in fields if field in data}}
+
+def _rows_json(snapshot, start: int, stop: int, fields: Optional[List[str]]) -> List[bytes]:
+    """Records of rows [start, stop) as stored, as summaries, or projected to `fields`"""
+    if fields is None:
+        return snapshot.records_json(start, stop)
+    if fields == ["summary"]:
+        # Built at publish, so summaries are served without decoding any record
+        return snapshot.summaries_json(start, stop)
+    return [
+        json.dumps(_project(json.loads(raw), fields), separators=(",", ":"), ensure_ascii=False).encode()
+        for raw in snapshot.records_json(start, stop)
+    ]
+
+def _boosters(snapshot, fields: Optional[List[str]]) -> dict:
+    """The booster table that records' modifier_boost_by_badge ids refer to, when records carry them"""
+    if fields is None or "modifier_boost_by_badge" in fields:
+        return {"boosters": snapshot.boosters}
+    return {}
+
+def _records_response(fields: dict, key: str, records: List[bytes]) -> Response:
+    """JSON response embedding records as stored in the snapshot, without decoding them"""
+    head = json.dumps(fields, separators=(",", ":"), ensure_ascii=False)[:-1]
+    separator = "," if fields else ""
+    body = f'{head}{separator}"{key}":['.encode() + b",".join(records) + b"]}"
+    return Response(content=body, media_type="application/json")
+
 @router.get("/get_global_data")
 async def get_total_score():
-    with open("interacting_addresses.json", "r") as f:
-        data = json.load(f)
-    total_score = 0
-    total_prime_cached = 0
-    for info in data:
-        address_data = info["data"]
-        if "merged_score_data" in address_data:
-            scores = address_data["merged_score_data"]
-            total_score += (
-                scores["prime_score"]		
-                + scores["community_score"]
-                + scores["initialization_score"]
-            )
-        if "prime_amount_cached" in address_data:
-            total_prime_cached += address_data["prime_amount_cached"]
-        if "base_prime_amount_cached" in address_data:
-            total_prime_cached += address_data["base_prime_amount_cached"]
+    meta = snapshot_service.current().meta
     return {
-        "total_score": total_score, 
-        "total_prime_cached": total_prime_cached,
-        "total_addresses": len(data)
+        "total_score": meta["total_score"], 
+        "total_prime_cached": meta["total_prime_cached"],
+        "total_addresses": meta["total_addresses"]
     }
 
 @router.get("/addresses")
 async def get_addresses(
     page: Optional[int] = Query(default=1, ge=1, description="Page number"),
-    page_size: Optional[int] = Query(default=10, ge=1, le=100, description="Number of items per page")
+    page_size: Optional[int] = Query(default=10, ge=1, le=100, description="Number of items per page"),
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION)
 ):
-    with open("interacting_addresses.json", "r") as f:
-        data = json.load(f)
-    
-    # Sort data by leaderboard_rank
-    data.sort(key=lambda x: x.get("data", {}).get("leaderboard_rank", float('inf')))
+    # Snapshot records are already sorted by leaderboard_rank
+    snapshot = snapshot_service.current()
     
     # Calculate pagination
     start_idx = (page - 1) * page_size
     end_idx = start_idx + page_size
+    fields = _parse_fields(fields)
     
-    # Get paginated data
-    paginated_data = data[start_idx:end_idx]
-    
-    return {
-        "total": len(data),
+    return _records_response({
+        "total": snapshot.count,
         "page": page,
         "page_size": page_size,
-        "total_pages": (len(data) + page_size - 1) // page_size,
-        "data": paginated_data
-    }
+        "total_pages": (snapshot.count + page_size - 1) // page_size,
+        "version": snapshot.version,
+        **_boosters(snapshot, fields),
+    }, "data", _rows_json(snapshot, start_idx, end_idx, fields))
+
+@router.get("/addresses/changes")
+async def get_address_changes(
+    since: int = Query(..., description="Snapshot version the client last synced to")
+):
+    # Net delta since that version, or a full resync once it has left the retained diffs
+    version, changes = snapshot_service.changes_since(since)
+    if changes is None:
+        return {"version": version, "since": since, "full_resync": True}
+    boosters = snapshot_service.current().boosters
+    return {"version": version, "since": since, "full_resync": False, "boosters": boosters, **changes}
+
+@router.get("/addresses/{address}/history")
+async def get_address_history(address: str):
+    # Rank, score and cached amount of one address at each update run
+    history = history_service.series(address)
+    if not history:
+        raise HTTPException(status_code=404, detail="No history for this address")
+    return {"address": address.lower(), "history": history}
 
 @router.post("/addresses")
-async def get_address_info(request: AddressRequest):
+async def get_address_info(
+    request: AddressRequest,
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION)
+):
+    fields = _parse_fields(fields)
     total_score = 0
     total_prime_cached = 0
     total_users = 0
-    addresses_found = 0
 
-    with open("interacting_addresses.json", "r") as f:
-        data = json.load(f)
+    snapshot = snapshot_service.current()
     
     addresses_found = []
-    total_combined_score = 0
     for address in request.addresses:
-        address_info = next((info for info in data if info["address"].lower() == address.lower()), None)
+        row = snapshot.find(address)
         
-        if address_info:
+        if row is not None:
+            address_info = snapshot.record(row)
             address_data = address_info["data"]
             if "merged_score_data" in address_data:
                 scores = address_data["merged_score_data"]
-                address_score = scores["prime_score"] + scores["community_score"] + scores["initialization_score"]
-                total_score += address_score
-                total_combined_score += address_score
+                total_score += scores["prime_score"] + scores["community_score"] + scores["initialization_score"]
             total_prime_cached += address_data.get("prime_amount_cached", 0) + address_data.get("base_prime_amount_cached", 0)
+            if fields == ["summary"]:
+                address_info = json.loads(snapshot.summaries_json(row, row + 1)[0])
+            elif fields is not None:
+                address_info = _project(address_info, fields)
             addresses_found.append(address_info)
     
-    total_users = len(data) - len(request.addresses) + 1
+    total_users = snapshot.count - len(request.addresses) + 1
     
     if addresses_found:
-        position = blockchain_service.calculate_addresses_position(request.addresses)
+        position = snapshot.position(request.addresses)
         return {
             "total_score": total_score,
             "total_prime_cached": total_prime_cached,
@@ -94,6 +135,7 @@ async def get_address_info(request: AddressRequest):
             "total_users": total_users,
             "addresses_processed": len(request.addresses),
             "addresses_found": addresses_found,
+            **_boosters(snapshot, fields),
             "addresses_not_found": len(request.addresses) - len(addresses_found)
         }
     else:
@@ -101,39 +143,31 @@ async def get_address_info(request: AddressRequest):
         return {"addresses_found": addresses_found}
 
 @router.get("/search_position")
-async def search_position(query: Optional[str] = Query(None, description="Ethereum address or ENS name")):
+async def search_position(
+    query: Optional[str] = Query(None, description="Ethereum address or ENS name"),
+    fields: Optional[str] = Query(default=None, description=FIELDS_DESCRIPTION)
+):
     # Validate query parameter
     if not query:
         raise HTTPException(status_code=400, detail="Query parameter is required")
 
     # Convert query to lowercase for case-insensitive matching
     query = query.lower()
+    snapshot = snapshot_service.current()
     
     # If the query looks like an ENS name (contains .eth), try to resolve it
     search_address = query
     if '.eth' in query:
-        if query in ens_to_address:
-            search_address = ens_to_address[query]
-        else:
+        search_address = snapshot.ens_address(query)
+        if search_address is None:
             raise HTTPException(status_code=404, detail="ENS name not found")
 
-    # Load and parse JSON data
-    with open("interacting_addresses.json", "r") as f:
-        data = json.load(f)
-    
-    # Sort data by leaderboard_rank
-    data.sort(key=lambda x: x.get("data", {}).get("leaderboard_rank", float('inf')))
-    
-    # Find the searched address and its position
-    searched_address_info = next(
-        (item for item in data if item["address"].lower() == search_address.lower()),
-        None
-    )
-    
-    if not searched_address_info:
+    # Find the searched address and its rank
+    row = snapshot.find(search_address)
+    if row is None:
         raise HTTPException(status_code=404, detail="Address not found")
     
-    searched_rank = searched_address_info["data"].get("leaderboard_rank")
+    searched_rank = snapshot.rank(row)
     if searched_rank is None:
         raise HTTPException(status_code=404, detail="Address has no rank")
     
@@ -141,17 +175,56 @@ async def search_position(query: Optional[str] = Query(None, description="Ethere
     next_round_number = ((searched_rank + 9) // 10) * 10
     
     # Get all addresses up to the next round number
-    context_addresses = []
-    for item in data:
-        rank = item["data"].get("leaderboard_rank")
-        if rank is not None and rank <= next_round_number:
-            context_addresses.append(item)
+    context_rows = snapshot.rows_up_to_rank(next_round_number)
+    fields = _parse_fields(fields)
     
-    return {
-        "addresses": context_addresses,
+    return _records_response({
         "position": searched_rank,
-        "total_addresses": len(data),
+        "total_addresses": snapshot.count,
         "queried_as": query,
         "resolved_address": search_address,
-        "next_round_number": next_round_number
-    }
+        "next_round_number": next_round_number,
+        **_boosters(snapshot, fields),
+    }, "addresses", _rows_json(snapshot, 0, context_rows, fields))
+
+@router.post("/search_position/batch")
+async def search_positions(request: PositionBatchRequest):
+    # Every lookup is a binary search in the snapshot's address index, so the cost
+    # depends on the batch size, not the leaderboard size
+    snapshot = snapshot_service.current()
+    results = []
+    for query in request.queries:
+        query = query.lower()
+        result = {"query": query}
+
+        search_address = query
+        if '.eth' in query:
+            search_address = snapshot.ens_address(query)
+        row = snapshot.find(search_address) if search_address is not None else None
+        rank, _, percentage = snapshot.derived(row) if row is not None else (None, None, None)
+        if search_address is None:
+            result["error"] = "ENS name not found"
+        elif row is None:
+            result["error"] = "Address not found"
+        elif rank is None:
+            result["error"] = "Address has no rank"
+        else:
+            result.update({
+                "resolved_address": search_address,
+                "position": rank,
+                "score": snapshot.scores[row],
+                "percentage": percentage,
+                "next_round_number": ((rank + 9) // 10) * 10,
+            })
+            if request.window:
+                # Neighbouring records are embedded as stored rather than decoded
+                window = snapshot.records_json(row - request.window, row + request.window + 1)
+                results.append(_records_response(result, "window", window).body)
+                continue
+        results.append(json.dumps(result, separators=(",", ":"), ensure_ascii=False).encode())
+
+    return _records_response({
+        "total_addresses": snapshot.count,
+        "version": snapshot.version,
+        **(_boosters(snapshot, None) if request.window else {}),
+    }, "results", results)
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+from ..services.tracing import tracer
+
+router = APIRouter()
+
+@router.get("/debug/traces")
+async def get_traces(
+    name: Optional[str] = Query(default=None, description="Only traces whose root span has this name"),
+    limit: int = Query(default=10, ge=1, le=20, description="Number of traces to return")
+):
+    """
+    Get the most recent traces (e.g. update runs) as span trees with per-span timings and attributes.
+    """
+    return tracer.get_traces(name=name, limit=limit)
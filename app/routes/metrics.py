@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..services.metrics import metrics_service
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Expose route, upstream, pipeline and snapshot metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics_service.render(), media_type="text/plain; version=0.0.4")
@@ -1,19 +1,26 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from app.services.dune import dune_service
+from app.services.indexer import indexer_service
 from app.services.stats import CacheStats
 
 router = APIRouter()
 
 @router.get("/stats", response_model=CacheStats)
-async def get_cache_stats():
+async def get_cache_stats(
+    source: str = Query(default="chain", pattern="^(chain|dune)$", description="chain (decoded logs) or dune")
+):
     """
     Get comprehensive statistics about PRIME caching activity.
     Returns various metrics including total cached, withdrawals, unique cachers, and time-based stats.
+    They are computed from the staking events the indexer decoded, or from the Dune query
+    until the indexer has any; source=dune always uses the Dune query, as a cross-check.
     """
     try:
-        stats = await dune_service.get_cache_stats()
+        stats = indexer_service.cache_stats() if source == "chain" else None
         if stats is None:
-            raise HTTPException(status_code=404, detail="No caching statistics available")
-        return stats
+            stats = await dune_service.get_cache_stats()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No caching statistics available")
+    return stats
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Header, Query
+from fastapi.responses import StreamingResponse
+from ..services.stream import stream_service
+from typing import Optional
+
+router = APIRouter()
+
+@router.get("/stream")
+async def get_stream(
+    changes: bool = Query(default=False, description="Also push the net delta of every published snapshot"),
+    addresses: Optional[str] = Query(default=None, description="Comma-separated addresses whose changes to push"),
+    since: Optional[int] = Query(default=None, description="Snapshot version the client last synced to"),
+    last_event_id: Optional[str] = Header(default=None)
+):
+    """
+    Server-sent events for each published snapshot: `version`, `global` when the totals
+    change, and `changes` (or `resync`) when changes or addresses are requested.
+    """
+    watched = frozenset(address.strip().lower() for address in addresses.split(",") if address.strip()) if addresses else None
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)  # Sent by EventSource on reconnect
+    subscription = stream_service.subscribe(changes, watched)
+
+    async def events():
+        try:
+            for event in stream_service.initial_events(subscription, since):
+                yield event
+            while True:
+                event = await subscription.queue.get()
+                if event is None:  # Dropped for lagging; the client reconnects with Last-Event-ID
+                    return
+                yield event
+        finally:
+            stream_service.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,15 +1,39 @@
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
 from ..services.scheduler import scheduler_service
+from ..services.checkpoint import checkpoint_service, RUN_ID_PATTERN
 from ..services.blockchain import blockchain_service
-import json
+from ..services.snapshot import snapshot_service
+from ..services.storage import storage_service
+from typing import Optional
 
 router = APIRouter()
 
 @router.post("/update_addresses")
-async def trigger_update_addresses(background_tasks: BackgroundTasks):
-    background_tasks.add_task(scheduler_service.update_interacting_addresses)
+async def trigger_update_addresses(
+    background_tasks: BackgroundTasks,
+    run_id: Optional[str] = Query(default=None, description="Checkpointed run to resume")
+):
+    if run_id is not None and not RUN_ID_PATTERN.match(run_id):
+        raise HTTPException(status_code=400, detail="Invalid run id")
+    if scheduler_service.is_update_running():
+        return {"message": "Address update already in progress"}
+    background_tasks.add_task(scheduler_service.run_update, "manual", run_id)
     return {"message": "Address update initiated"}
 
+@router.get("/update_runs")
+async def get_update_runs():
+    """
+    List the checkpointed update runs that can be resumed via /update_addresses?run_id=...
+    """
+    return checkpoint_service.list_runs()
+
+@router.get("/update_status")
+async def get_update_status():
+    """
+    Get the scheduler state and the status of the latest update run.
+    """
+    return scheduler_service.get_scheduler_status()
+
 @router.get("/update_ens")
 async def trigger_update_ens(background_tasks: BackgroundTasks):
     background_tasks.add_task(blockchain_service.update_ens_names)
@@ -20,15 +44,14 @@ async def trigger_update_ens(background_tasks: BackgroundTasks):
 async def recalculate_percentages():
     try:
         # Load current data
-        with open("interacting_addresses.json", "r") as f:
-            data = json.load(f)
+        data = storage_service.load_addresses()
         
         # Recalculate percentages and sort
         sorted_data = blockchain_service.calculate_and_sort_addresses(data)
         
         # Save updated data
-        with open("interacting_addresses.json", "w") as f:
-            json.dump(sorted_data, f, indent=4)
+        storage_service.save_addresses(sorted_data)
+        snapshot_service.publish(sorted_data)
         
         return {"message": "Successfully recalculated percentages"}
     except Exception as e:
@@ -1,8 +1,13 @@
-from ..config import web3
+from ..config import get_async_web3
+from ..constants import ALCHEMY_BASE_URL
 from .logging_service import logging_service
+from .http import http_service
+from .metrics import metrics_service
+from .tracing import tracer
+from .rpc import rpc_pool
+from .snapshot import snapshot_service
+from .storage import storage_service
 from dotenv import load_dotenv
-import aiohttp
-import json
 import logging
 import os
 import asyncio
@@ -14,119 +19,18 @@ MAX_CONCURRENT_REQUESTS = 50
 
 class BlockchainService:
 	def __init__(self):
-		self.api_key = os.getenv("ALCHEMY_API_KEY")
-		assert self.api_key, "Please set ALCHEMY_API_KEY in your .env file."
+		self._api_key = None
 
-	async def _fetch_logs(self, filter_params, semaphore):
-		loop = asyncio.get_running_loop()
-		async with semaphore:
-			return await loop.run_in_executor(None, web3.eth.get_logs, filter_params)
+	@property
+	def api_key(self) -> str:
+		# Checked on first upstream call, so read-only processes start without the key
+		if self._api_key is None:
+			self._api_key = os.getenv("ALCHEMY_API_KEY")
+			assert self._api_key, "Please set ALCHEMY_API_KEY in your .env file."
+		return self._api_key
 
-	async def fetch_logs_in_batches(self, contract_address, from_block, to_block, batch_size):
-		task_name = f"fetch_logs_{contract_address}"
-		logging_service.start_timer(task_name)
-		
-		all_logs = []
-		contract_address = web3.to_checksum_address(contract_address)
-		semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-		tasks = []
-		for start_block in range(from_block, to_block + 1, batch_size):
-			end_block = min(start_block + batch_size - 1, to_block)
-			filter_params = {
-				"fromBlock": start_block,
-				"toBlock": end_block,
-				"address": contract_address,
-			}
-			tasks.append(self._fetch_logs(filter_params, semaphore))
-		
-		# Run batch log requests concurrently
-		results = await asyncio.gather(*tasks, return_exceptions=False)
-		for logs in results:
-			all_logs.extend(logs)
-		
-		duration = logging_service.end_timer(task_name)
-		await logging_service.log(
-			f"Fetched logs for {contract_address} in {duration:.2f} seconds",
-			send_telegram=False
-		)
-		return all_logs
-
-	async def get_interacting_addresses_alchemy(self, network: str, contract_address: str, from_block: int):
-		task_name = f"get_interacting_addresses_alchemy_{network}"
-		logging_service.start_timer(task_name)
-		
-		await logging_service.log(
-			f"[{network}] Start get_interacting_addresses for contract: {contract_address}"
-		)
-		to_block = await self.get_latest_block_number(network)
-		logs = await self._fetch_logs_in_batches_alchemy(network, contract_address, from_block, to_block)
-		await logging_service.log(f"[{network}] Retrieved {len(logs)} logs from Alchemy")
-
-		addresses = []
-		for log in logs:
-			if len(log.get("topics", [])) > 1:
-				addr_hex = "0x" + log["topics"][1][-40:]
-				addresses.append(addr_hex.lower())
-
-		unique_addresses = set(addresses)
-		
-		duration = logging_service.end_timer(task_name)
-		await logging_service.log(
-			f"[{network}] Found {len(unique_addresses)} unique addresses in {duration:.2f} seconds"
-		)
-		return unique_addresses
-
-	async def _fetch_logs_in_batches_alchemy(self, network: str, contract_address: str, start_block: int, end_block: int):
-		"""
-		Chunk the block range into increments suited to Alchemy's limits, then run the requests concurrently.
-		"""
-		all_logs = []
-		batch_size = 100000 if network == "eth-mainnet" else 10000000
-		chunks = []
-		current_block = start_block
-		while current_block <= end_block:
-			chunk_end = min(current_block + batch_size - 1, end_block)
-			chunks.append((current_block, chunk_end))
-			current_block = chunk_end + 1
-
-		semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-		async with aiohttp.ClientSession() as session:
-			tasks = [
-				self._fetch_logs_alchemy_with_semaphore(session, network, contract_address, f, t, semaphore)
-				for f, t in chunks
-			]
-			results = await asyncio.gather(*tasks, return_exceptions=False)
-			for logs in results:
-				all_logs.extend(logs)
-		return all_logs
-
-	async def _fetch_logs_alchemy_with_semaphore(self, session: aiohttp.ClientSession, network: str, contract_address: str, from_block: int, to_block: int, semaphore: asyncio.Semaphore):
-		async with semaphore:
-			return await self._fetch_logs_alchemy(session, network, contract_address, from_block, to_block)
-
-	async def _fetch_logs_alchemy(self, session: aiohttp.ClientSession, network: str, contract_address: str, from_block: int, to_block: int):
-		"""Calls Alchemy's eth_getLogs endpoint for a given block range."""
-		def to_hex(block):
-			return hex(block) if isinstance(block, int) else str(block)
-
-		payload = {
-			"jsonrpc": "2.0",
-			"id": 1,
-			"method": "eth_getLogs",
-			"params": [{
-				"fromBlock": to_hex(from_block),
-				"toBlock": to_hex(to_block),
-				"address": contract_address,
-			}]
-		}
-
-		url = f"https://{network}.g.alchemy.com/v2/{self.api_key}"
-
-		async with session.post(url, json=payload) as resp:
-			resp.raise_for_status()
-			data = await resp.json()
-
-		return data.get("result", [])
+	def _alchemy_url(self, network: str, path: str = "v2") -> str:
+		return f"{ALCHEMY_BASE_URL.format(network=network)}/{path}/{self.api_key}"
 
 	def calculate_and_sort_addresses(self, data):
 		logging.debug("Starting calculate_and_sort_addresses function")
@@ -161,108 +65,88 @@ class BlockchainService:
 		return sorted_data
 
 	def calculate_addresses_position(self, addresses):
-		with open("interacting_addresses.json", "r") as f:
-			data = json.load(f)
-		
-		if len(addresses) == 1:
-			for index, address_info in enumerate(data):
-				if address_info["address"].lower() == addresses[0].lower():
-					return index + 1
-			return len(data)
-		else:
-			total_score = 0
-			for address in addresses:
-				address_info = next(
-					(info for info in data if info["address"].lower() == address.lower()),
-					None
-				)
-				if address_info:
-					total_score += sum(address_info["data"].get("merged_score_data", {}).values())
-			
-			higher_scores = sum(
-				1 for info in data
-				if sum(info["data"].get("merged_score_data", {}).values()) > total_score
-			)
-			
-			return higher_scores + 1
+		return snapshot_service.current().position(addresses)
 
-	async def get_avatar_count(self, addresses_data):
-		url = f"https://eth-mainnet.g.alchemy.com/nft/v3/{self.api_key}/getOwnersForContract"
+	@tracer.traced()
+	async def fetch_avatar_balances(self):
+		"""Fetch the avatar NFT balance of every owner, keyed by lowercase address."""
+		url = self._alchemy_url("eth-mainnet", "nft/v3") + "/getOwnersForContract"
 		params = {
 			"contractAddress": "0x0fc3dd8c37880a297166bed57759974a157f0e74",
 			"withTokenBalances": "true"
 		}
 		
 		async def fetch_owners(session):
-			async with session.get(url, params=params) as response:
-				if response.status == 200:
-					data = await response.json()
-					return data.get('owners', [])
-				else:
-					logging.error(f"Failed to fetch data: {response.status}")
-					return []
+			with metrics_service.track_upstream("alchemy") as call:
+				async with session.get(url, params=params) as response:
+					call.status = response.status
+					if response.status == 200:
+						data = await response.json()
+						return data.get('owners', [])
+					else:
+						logging.error(f"Failed to fetch data: {response.status}")
+						return []
 
-		async with aiohttp.ClientSession() as session:
-			owners_data = await fetch_owners(session)
+		owners_data = await fetch_owners(http_service.get_session())
+		tracer.current().set(owners=len(owners_data))
 
-		address_to_balance = {
+		return {
 			owner['ownerAddress'].lower(): sum(int(token['balance']) for token in owner['tokenBalances'])
 			for owner in owners_data
 		}
 
+	def apply_avatar_counts(self, addresses_data, address_to_balance):
 		for item in addresses_data:
 			address = item['address'].lower()
 			item['data']['avatar_count'] = address_to_balance.get(address, 0)
 
 		return addresses_data
 
-	async def get_latest_block_number(self, network: str) -> int:
-		url = f"https://{network}.g.alchemy.com/v2/{self.api_key}"
-		payload = {
-			"jsonrpc": "2.0",
-			"id": 1,
-			"method": "eth_blockNumber",
-			"params": []
-		}
+	async def get_avatar_count(self, addresses_data):
+		address_to_balance = await self.fetch_avatar_balances()
+		return self.apply_avatar_counts(addresses_data, address_to_balance)
 
-		async with aiohttp.ClientSession() as session:
-			async with session.post(url, json=payload) as resp:
-				resp.raise_for_status()
-				data = await resp.json()
-		
-		hex_block_number = data["result"]
+	async def get_latest_block_number(self, network: str) -> int:
+		hex_block_number = await rpc_pool.request(network, "eth_blockNumber", [])
 		return int(hex_block_number, 16)
 
+	@tracer.traced()
 	async def update_ens_names(self):
-		task_name = "update_ens_names"
-		logging_service.start_timer(task_name)
+		span = tracer.current()
 		
 		try:
 			await logging_service.log("Starting ENS name update process...")
 			
-			try:
-				with open("ens.json", "r") as f:
-					ens_data = json.load(f)
-				await logging_service.log(f"Loaded {len(ens_data)} existing ENS records")
-			except FileNotFoundError:
+			ens_data = storage_service.load_ens()
+			if ens_data is None:
 				await logging_service.log("No existing ENS data found, starting fresh")
 				ens_data = {}
+			else:
+				await logging_service.log(f"Loaded {len(ens_data)} existing ENS records")
+			try:
+				interacting_addresses = storage_service.load_addresses()
+			except FileNotFoundError:
+				interacting_addresses = []
+			changes = {}
 			
 			new_ens_count = 0
 			updated_ens_count = 0
 
-			loop = asyncio.get_running_loop()
 			semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+			web3 = get_async_web3()
 
 			async def process_address(i, address):
 				nonlocal new_ens_count, updated_ens_count
 				address = web3.to_checksum_address(address)
 				try:
 					async with semaphore:
-						ens_name = await loop.run_in_executor(None, web3.ens.name, address)
+						tracer.add("lookups")
+						with metrics_service.track_upstream("ens"):
+							ens_name = await web3.ens.name(address)
 					if ens_name:
 						if address.lower() not in ens_data or ens_data[address.lower()] != ens_name:
 							ens_data[address.lower()] = ens_name
+							changes[address.lower()] = ens_name
 							new_ens_count += 1
 						else:
 							updated_ens_count += 1
@@ -273,11 +157,13 @@ class BlockchainService:
 					else:
 						if address.lower() in ens_data:
 							del ens_data[address.lower()]
+							changes[address.lower()] = None
 						await logging_service.log(
 							f"[{i}/{len(ens_data)}] No ENS name found for {address}",
 							send_telegram=False
 						)
 				except Exception as e:
+					tracer.add("errors")
 					await logging_service.add_error("ENS Lookup", address, str(e))
 					await logging_service.log(
 						f"[{i}/{len(ens_data)}] Error getting ENS name for {address}: {e}",
@@ -285,31 +171,27 @@ class BlockchainService:
 					)
 
 			# Process all addresses concurrently with rate limiting via semaphore
-			unique_addresses = {info["address"] for info in ens_data}
+			unique_addresses = set(ens_data) | {info["address"].lower() for info in interacting_addresses}
 			tasks = [process_address(i, addr) for i, addr in enumerate(unique_addresses, 1)]
 			await asyncio.gather(*tasks)
 
-			# Save updated ENS data
-			with open("ens.json", "w") as f:
-				json.dump(ens_data, f, indent=4)
-			await logging_service.log("ENS data saved successfully")
+			# Save only the changed names; storage updates them on the stored records too
+			storage_service.update_ens(changes)
+			await logging_service.log(f"ENS data saved successfully ({len(changes)} changed)")
 			
-			# Update interacting addresses with new ENS data
 			try:
-				with open("interacting_addresses.json", "r") as f:
-					interacting_addresses = json.load(f)
-				
-				# Use the new add_ens_names function to update the addresses
-				updated_addresses = await self.add_ens_names(interacting_addresses)
-				
-				with open("interacting_addresses.json", "w") as f:
-					json.dump(updated_addresses, f, indent=4)
+				snapshot_service.publish(storage_service.load_addresses(), ens_data)
 				await logging_service.log("Interacting addresses updated successfully")
-				
 			except FileNotFoundError:
-				await logging_service.log("No interacting_addresses.json file found to update")
+				await logging_service.log("No interacting addresses stored yet to update")
 			
-			duration = logging_service.end_timer(task_name)
+			span.set(
+				addresses=len(unique_addresses),
+				new_ens_names=new_ens_count,
+				unchanged_ens_names=updated_ens_count,
+				ens_records=len(ens_data)
+			)
+			duration = span.elapsed
 			await logging_service.log(
 				f"\n🏁 ENS update summary ({duration:.2f} seconds):\n"
 				f"- Total addresses processed: {len(unique_addresses)}\n"
@@ -321,24 +203,30 @@ class BlockchainService:
 		except Exception as e:
 			await logging_service.add_error("Critical ENS Update", "global", str(e))
 			await logging_service.log(f"Critical error during ENS update process: {e}")
-			logging_service.end_timer(task_name)
 
-	async def add_ens_names(self, addresses_data):
+	async def load_ens_cache(self):
+		"""Load cached ENS names from storage, or None if there is no cache yet."""
+		ens_data = storage_service.load_ens()
+		if ens_data is None:
+			await logging_service.log("No cached ENS data found")
+		else:
+			await logging_service.log(f"Loaded {len(ens_data)} cached ENS records")
+		return ens_data
+
+	@tracer.traced()
+	async def add_ens_names(self, addresses_data, ens_data=None):
 		"""
-		Add ENS names to addresses_data using cached data from ens.json.
+		Add ENS names to addresses_data using the cached ENS names in storage.
 		This is a fast operation that doesn't make any network calls.
+		Pass ens_data to reuse an already loaded cache.
 		"""
-		task_name = "add_ens_names"
-		logging_service.start_timer(task_name)
+		span = tracer.current()
+		span.set(addresses=len(addresses_data))
 		
 		try:
-			try:
-				with open("ens.json", "r") as f:
-					ens_data = json.load(f)
-				await logging_service.log(f"Loaded {len(ens_data)} cached ENS records")
-			except FileNotFoundError:
-				await logging_service.log("No cached ENS data found")
-				logging_service.end_timer(task_name)
+			if ens_data is None:
+				ens_data = await self.load_ens_cache()
+			if ens_data is None:
 				return addresses_data
 
 			ens_matches = 0
@@ -350,7 +238,8 @@ class BlockchainService:
 				elif "ens_name" in address_info["data"]:
 					del address_info["data"]["ens_name"]
 
-			duration = logging_service.end_timer(task_name)
+			span.set(ens_matches=ens_matches)
+			duration = span.elapsed
 			await logging_service.log(
 				f"Added {ens_matches} ENS names from cache in {duration:.2f} seconds"
 			)
@@ -360,7 +249,6 @@ class BlockchainService:
 		except Exception as e:
 			await logging_service.add_error("Add ENS Names", "global", str(e))
 			await logging_service.log(f"Error during ENS name addition: {e}")
-			logging_service.end_timer(task_name)
 			return addresses_data
 
 # Create a singleton instance
@@ -0,0 +1,78 @@
+from typing import Callable, Dict, List, Union
+import hashlib
+import json
+
+# wayfinder sends each record's modifier_boost_by_badge as a map of badge -> booster,
+# where every booster is a JSON document in a string. Only a handful of distinct
+# boosters exist, so they are parsed once at ingest, shared between records, and
+# published as a table that records reference by id. The map appears on the record,
+# its primary address badge data and each of its secondary address badges.
+
+def booster_id(booster: Dict) -> str:
+    """Stable id of a booster, the same in every run and every worker"""
+    canonical = json.dumps(booster, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=4).hexdigest()
+
+class BoosterTable:
+    """Interns boosters so identical ones share one dict and one id"""
+    def __init__(self):
+        self.boosters: Dict[str, Dict] = {}
+        self._parsed: Dict[str, str] = {}  # Raw JSON string -> id, to parse each string once
+        self._known: Dict[tuple, str] = {}  # Booster items -> id, to hash each booster once
+
+    def intern(self, booster: Union[str, Dict]) -> str:
+        if isinstance(booster, str):
+            if booster in self._parsed:
+                return self._parsed[booster]
+            key = booster
+            booster = json.loads(booster)
+            self._parsed[key] = self.intern(booster)
+            return self._parsed[key]
+        try:
+            items = tuple(booster.items())
+            return self._known[items]
+        except KeyError:
+            pass
+        except TypeError:  # Nested values; not worth caching
+            items = None
+        ref = booster_id(booster)
+        self.boosters.setdefault(ref, booster)
+        if items is not None:
+            self._known[items] = ref
+        return ref
+
+    def references(self, boosters: Dict[str, Union[str, Dict]]) -> Dict[str, str]:
+        """badge -> booster id"""
+        return {badge: self.intern(booster) for badge, booster in boosters.items()}
+
+def map_boosters(data: Dict, convert: Callable[[Dict], Dict]) -> Dict:
+    """Copy of a record's data with `convert` applied to every modifier_boost_by_badge map"""
+    def convert_in(container: Dict) -> Dict:
+        if isinstance(container.get("modifier_boost_by_badge"), dict):
+            container = dict(container, modifier_boost_by_badge=convert(container["modifier_boost_by_badge"]))
+        return container
+
+    data = convert_in(data)
+    extra = data.get("extra")
+    if isinstance(extra, dict):
+        extra = dict(extra)
+        if isinstance(extra.get("primary_address_badge_data"), dict):
+            extra["primary_address_badge_data"] = convert_in(extra["primary_address_badge_data"])
+        if isinstance(extra.get("secondary_address_badges"), list):
+            extra["secondary_address_badges"] = [
+                convert_in(badge) if isinstance(badge, dict) else badge for badge in extra["secondary_address_badges"]
+            ]
+        data = dict(data, extra=extra)
+    return data
+
+def normalize_boosters(addresses_data: List[Dict]) -> List[Dict]:
+    """Replace JSON-string boosters with parsed dicts shared between records"""
+    table = BoosterTable()
+
+    def parsed(boosters: Dict) -> Dict:
+        return {badge: table.boosters[ref] for badge, ref in table.references(boosters).items()}
+
+    for address_info in addresses_data:
+        if "data" in address_info:
+            address_info["data"] = map_boosters(address_info["data"], parsed)
+    return addresses_data
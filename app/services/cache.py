@@ -1,9 +1,14 @@
 import aiohttp
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 import json
 from .logging_service import logging_service
+from .http import http_service
+from .checkpoint import RunCheckpoint
+from .metrics import metrics_service
+from .tracing import tracer
+from ..constants import WAYFINDER_API_URL
 
 load_dotenv()
 
@@ -13,68 +18,86 @@ class CacheService:
         self.TIMEOUT = 30  # Timeout in seconds
         self.MAX_CONCURRENT_REQUESTS = 50  # Limit concurrent connections
         self.semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        self.BATCH_DELAY = 1  # Seconds between batches to avoid overwhelming wayfinder
 
-    async def fetch_wayfinder_data(self, addresses: List[str]) -> List[Dict]:
-        """Fetch cache data for multiple addresses in batches"""
+    @tracer.traced()
+    async def fetch_wayfinder_data(self, addresses: List[str], checkpoint: Optional[RunCheckpoint] = None) -> List[Dict]:
+        """
+        Fetch cache data for multiple addresses in batches.
+        With a checkpoint, successful results are recorded as each batch completes and
+        addresses already fetched by an earlier attempt of the same run are skipped.
+        """
         all_results = []
-        total_batches = (len(addresses) + self.BATCH_SIZE - 1) // self.BATCH_SIZE
+        total_addresses = len(addresses)
         errors_count = 0
         success_count = 0
         
-        task_name = "fetch_wayfinder_data"
-        logging_service.start_timer(task_name)
-        
-        await logging_service.log(f"🚀 Starting to fetch wayfinder data for {len(addresses)} addresses")
+        span = tracer.current()
+        span.set(addresses=total_addresses)
         
-        # Process addresses in batches
-        connector = aiohttp.TCPConnector(limit=self.MAX_CONCURRENT_REQUESTS, force_close=True)
-        timeout = aiohttp.ClientTimeout(total=self.TIMEOUT)
+        await logging_service.log(f"🚀 Starting to fetch wayfinder data for {total_addresses} addresses")
 
+        if checkpoint is not None:
+            all_results = checkpoint.load_results("wayfinder")
+            if all_results:
+                fetched = {result["address"] for result in all_results}
+                addresses = [address for address in addresses if address not in fetched]
+                success_count = len(all_results)
+                span.set(resumed=success_count)
+                await logging_service.log(
+                    f"♻️ Resuming run {checkpoint.run_id}: {success_count} addresses already fetched, "
+                    f"{len(addresses)} remaining"
+                )
+        total_batches = (len(addresses) + self.BATCH_SIZE - 1) // self.BATCH_SIZE
         
-        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-            for i in range(0, len(addresses), self.BATCH_SIZE):
-                batch = addresses[i:i + self.BATCH_SIZE]
-                current_batch = i//self.BATCH_SIZE + 1
-                await logging_service.log(f"Processing batch {current_batch}/{total_batches}", send_telegram=False)
-                
-                tasks = [
-                    self._fetch_data(session, f"https://caching.wayfinder.ai/api/walletstats/{address}?format=json", address)
-                    for address in batch
-                ]
-                batch_results = await asyncio.gather(*tasks)
-                
-                # Count successes and failures
-                batch_success = sum(1 for r in batch_results if r["data"] is not None)
-                batch_errors = sum(1 for r in batch_results if r["data"] is None)
-                success_count += batch_success
-                errors_count += batch_errors
-                
-                all_results.extend(batch_results)
-                
-                # Send progress update less frequently
-                if current_batch % 10 == 0 or current_batch == total_batches:
-                    await logging_service.log(
-                        f"📊 Progress Update:\n"
-                        f"Batch: {current_batch}/{total_batches}\n"
-                        f"✅ Success: {success_count}\n"
-                        f"❌ Errors: {errors_count}\n"
-                        f"Progress: {(success_count/len(addresses)*100):.1f}%"
-                    )
-                
-                # Add a small delay between batches to prevent overwhelming
-                if i + self.BATCH_SIZE < len(addresses):
-                    await asyncio.sleep(1)
+        # Process addresses in batches over the shared connection pool
+        session = http_service.get_session()
+        for i in range(0, len(addresses), self.BATCH_SIZE):
+            batch = addresses[i:i + self.BATCH_SIZE]
+            current_batch = i//self.BATCH_SIZE + 1
+            await logging_service.log(f"Processing batch {current_batch}/{total_batches}", send_telegram=False)
+            
+            tasks = [
+                self._fetch_data(session, f"{WAYFINDER_API_URL}/walletstats/{address}?format=json", address)
+                for address in batch
+            ]
+            batch_results = await asyncio.gather(*tasks)
+            
+            # Count successes and failures
+            batch_success = sum(1 for r in batch_results if r["data"] is not None)
+            batch_errors = sum(1 for r in batch_results if r["data"] is None)
+            success_count += batch_success
+            errors_count += batch_errors
+            
+            all_results.extend(batch_results)
+            if checkpoint is not None:
+                checkpoint.append_results("wayfinder", [r for r in batch_results if r["data"] is not None])
+            
+            # Send progress update less frequently
+            if current_batch % 10 == 0 or current_batch == total_batches:
+                await logging_service.log(
+                    f"📊 Progress Update:\n"
+                    f"Batch: {current_batch}/{total_batches}\n"
+                    f"✅ Success: {success_count}\n"
+                    f"❌ Errors: {errors_count}\n"
+                    f"Progress: {(success_count/total_addresses*100):.1f}%"
+                )
+            
+            # Add a small delay between batches to prevent overwhelming
+            if i + self.BATCH_SIZE < len(addresses):
+                await asyncio.sleep(self.BATCH_DELAY)
 
         # Send any remaining errors
         await logging_service.send_error_report()
         
-        duration = logging_service.end_timer(task_name)
+        span.set(batches=total_batches, success=success_count, errors=errors_count)
+        duration = span.elapsed
         # Send final summary
         await logging_service.log(
             f"🏁 Cache data fetch completed in {duration:.2f} seconds\n"
             f"✅ Total successful: {success_count}\n"
             f"❌ Total failed: {errors_count}\n"
-            f"📊 Success rate: {(success_count/len(addresses)*100):.1f}%"
+            f"📊 Success rate: {(success_count/total_addresses*100):.1f}%"
         )
         
         return all_results
@@ -83,23 +106,30 @@ class CacheService:
         """Fetch data for a single address with basic error handling"""
         async with self.semaphore:  # Limit concurrent requests
             try:
-                async with session.get(api_url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {"address": address, "data": data}
-                    elif response.status == 429:  # Rate limit
-                        response_text = await response.text()
-                        await logging_service.add_error("Rate Limit", address, response_text)
-                        await asyncio.sleep(2)  # Wait a bit longer for rate limits
-                        return {"address": address, "data": None}
-                    else:
+                with metrics_service.track_upstream("wayfinder") as call:
+                    async with session.get(api_url, timeout=aiohttp.ClientTimeout(total=self.TIMEOUT)) as response:
+                        call.status = response.status
+                        if response.status == 200:
+                            body = await response.read()
+                            tracer.add("bytes", len(body))
+                            return {"address": address, "data": json.loads(body)}
+                        response_text = None
                         try:
                             response_text = await response.text()
-                            error_detail = f"Status {response.status}. Response: {response_text}"
                         except:
-                            error_detail = f"Status {response.status}. Could not read response body."
-                        await logging_service.add_error("HTTP Error", address, error_detail)
-                        return {"address": address, "data": None}
+                            pass
+                if response.status == 429:  # Rate limit
+                    tracer.add("rate_limited")
+                    await logging_service.add_error("Rate Limit", address, response_text or "")
+                    await asyncio.sleep(2)  # Wait a bit longer for rate limits
+                    return {"address": address, "data": None}
+                else:
+                    if response_text is not None:
+                        error_detail = f"Status {response.status}. Response: {response_text}"
+                    else:
+                        error_detail = f"Status {response.status}. Could not read response body."
+                    await logging_service.add_error("HTTP Error", address, error_detail)
+                    return {"address": address, "data": None}
                         
             except asyncio.TimeoutError:
                 error_detail = f"Request timed out after {self.TIMEOUT} seconds"
@@ -0,0 +1,156 @@
+from typing import Any, Dict, List, Optional
+import datetime
+import json
+import os
+import re
+import shutil
+import time
+
+RUN_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+class RunCheckpoint:
+    """
+    Persisted state of a single update run, stored under checkpoints/<run_id>/.
+    Whole stage outputs are saved as <stage>.json, per-item results are appended
+    to <name>.jsonl as they arrive so an interrupted stage can pick up where it stopped.
+    """
+    def __init__(self, run_dir: str, run_id: str):
+        self.run_id = run_id
+        self.run_dir = run_dir
+        self.manifest_file = os.path.join(run_dir, "manifest.json")
+
+    def _read_manifest(self) -> Dict:
+        with open(self.manifest_file, "r") as f:
+            return json.load(f)
+
+    def _write_json(self, path: str, data: Any):
+        """Write atomically so a crash never leaves a truncated checkpoint behind"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _update_manifest(self, **changes):
+        manifest = self._read_manifest()
+        manifest.update(changes)
+        manifest["updated"] = time.time()
+        self._write_json(self.manifest_file, manifest)
+
+    def has(self, stage: str) -> bool:
+        return stage in self._read_manifest()["stages"]
+
+    def load(self, stage: str) -> Any:
+        with open(os.path.join(self.run_dir, f"{stage}.json"), "r") as f:
+            return json.load(f)
+
+    def save(self, stage: str, output: Any):
+        """Persist a stage output; sets are stored as lists"""
+        if isinstance(output, set):
+            output = sorted(output)
+        self._write_json(os.path.join(self.run_dir, f"{stage}.json"), output)
+        manifest = self._read_manifest()
+        if stage not in manifest["stages"]:
+            self._update_manifest(stages=manifest["stages"] + [stage])
+
+    def load_results(self, name: str) -> List[Dict]:
+        """Load per-item results appended so far, ignoring a partially written last line"""
+        path = os.path.join(self.run_dir, f"{name}.jsonl")
+        results = []
+        if not os.path.exists(path):
+            return results
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    results.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        return results
+
+    def append_results(self, name: str, results: List[Dict]):
+        if not results:
+            return
+        path = os.path.join(self.run_dir, f"{name}.jsonl")
+        with open(path, "a") as f:
+            f.write("".join(json.dumps(result) + "\n" for result in results))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def complete(self):
+        self._update_manifest(status="complete", error=None)
+
+    def fail(self, error: str):
+        self._update_manifest(status="failed", error=error)
+
+class CheckpointService:
+    def __init__(self):
+        self.CHECKPOINT_DIR = "checkpoints"
+        self.RESUME_MAX_AGE = 24 * 60 * 60  # Don't auto-resume runs older than a day, their data is stale
+        self.KEEP_COMPLETED_RUNS = 3
+
+    def _run_dir(self, run_id: str) -> str:
+        return os.path.join(self.CHECKPOINT_DIR, run_id)
+
+    def list_runs(self) -> List[Dict]:
+        """Manifests of all stored runs, oldest first"""
+        if not os.path.isdir(self.CHECKPOINT_DIR):
+            return []
+        runs = []
+        for run_id in os.listdir(self.CHECKPOINT_DIR):
+            manifest_file = os.path.join(self._run_dir(run_id), "manifest.json")
+            try:
+                with open(manifest_file, "r") as f:
+                    runs.append(json.load(f))
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+        return sorted(runs, key=lambda run: run["created"])
+
+    def _find_resumable_run(self) -> Optional[str]:
+        for run in reversed(self.list_runs()):
+            if run["status"] == "complete":
+                return None
+            if time.time() - run["created"] <= self.RESUME_MAX_AGE:
+                return run["run_id"]
+        return None
+
+    def start_run(self, run_id: Optional[str] = None) -> RunCheckpoint:
+        """
+        Open the checkpoint for a run.
+        With an explicit run_id that run is resumed (or created). Otherwise the latest
+        unfinished run is resumed if it is recent enough, else a new run is started.
+        """
+        if run_id is not None and not RUN_ID_PATTERN.match(run_id):
+            raise ValueError(f"Invalid run id: {run_id!r}")
+        if run_id is None:
+            run_id = self._find_resumable_run()
+        if run_id is None:
+            base_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            run_id, suffix = base_id, 1
+            while os.path.exists(self._run_dir(run_id)):
+                suffix += 1
+                run_id = f"{base_id}-{suffix}"
+
+        run_dir = self._run_dir(run_id)
+        checkpoint = RunCheckpoint(run_dir, run_id)
+        if os.path.exists(checkpoint.manifest_file):
+            checkpoint._update_manifest(status="running")
+        else:
+            os.makedirs(run_dir, exist_ok=True)
+            now = time.time()
+            checkpoint._write_json(checkpoint.manifest_file, {
+                "run_id": run_id,
+                "created": now,
+                "updated": now,
+                "status": "running",
+                "error": None,
+                "stages": [],
+            })
+        return checkpoint
+
+    def cleanup(self):
+        """Remove completed runs beyond the most recent KEEP_COMPLETED_RUNS"""
+        completed = [run for run in self.list_runs() if run["status"] == "complete"]
+        for run in completed[:-self.KEEP_COMPLETED_RUNS]:
+            shutil.rmtree(self._run_dir(run["run_id"]), ignore_errors=True)
+
+# Create a singleton instance
+checkpoint_service = CheckpointService()
@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import gzip
+import zlib
+from .metrics import metrics_service
+from .singleflight import SingleFlight
+from .snapshot import snapshot_service
+
+try:
+    import brotli
+except ImportError:  # In requirements.txt; dev environments without it serve gzip only
+    brotli = None
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=9)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Preferred supported encoding from an Accept-Encoding header, or None for identity"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [(weights.get(name, weights.get("*", 0.0)), -i, name) for i, name in enumerate(supported)]
+    quality, _, name = max(candidates)
+    return name if quality > 0 else None
+
+class _Entry:
+    def __init__(self, route, media_type: bytes, body: bytes):
+        self.route = route
+        self.media_type = media_type
+        self.bodies: Dict[Optional[str], bytes] = {None: body}
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+class CompressionMiddleware:
+    """
+    ASGI middleware serving snapshot-backed GET responses from a per-version cache.
+    The first request for a URL renders it; gzip and brotli variants are compressed once
+    and reused until the next snapshot is published. Responses carry an ETag derived
+    from the snapshot version, so unchanged pages answer If-None-Match with a 304.
+    Concurrent misses for the same URL and version wait for one render and share it.
+    """
+    PATHS = ("/addresses", "/addresses/changes", "/search_position", "/ens")
+    MIN_SIZE = 1024  # Smaller bodies are sent as-is
+    MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, app):
+        self.app = app
+        self.version: Optional[int] = None
+        self.cache: "OrderedDict[Tuple[str, bytes], _Entry]" = OrderedDict()
+        self.cached_bytes = 0
+        self.flights = SingleFlight()
+
+    def _cacheable(self, scope) -> bool:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return False
+        path = scope["path"]
+        return path in self.PATHS or path.startswith("/ens/")
+
+    async def __call__(self, scope, receive, send):
+        if not self._cacheable(scope):
+            await self.app(scope, receive, send)
+            return
+        try:
+            version = snapshot_service.current().version
+        except FileNotFoundError:  # Nothing published yet
+            await self.app(scope, receive, send)
+            return
+        if version != self.version:
+            self.version = version
+            self.cache.clear()
+            self.cached_bytes = 0
+
+        headers = {name: value for name, value in scope["headers"]}
+        key = (scope["path"], scope["query_string"])
+        etag = f'W/"{version:x}-{zlib.crc32(key[0].encode() + b"?" + key[1]):x}"'.encode()
+        common = [(b"etag", etag), (b"vary", b"accept-encoding")]
+        if etag in [tag.strip() for tag in headers.get(b"if-none-match", b"").split(b",")]:
+            await send({"type": "http.response.start", "status": 304, "headers": common})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        entry = self.cache.get(key)
+        if entry is None:
+            flight = (version,) + key
+            outcome = "coalesced" if self.flights.waiting(flight) else "rendered"
+            entry = await self.flights.do(flight, lambda: self._render(scope, receive, send))
+            if entry is not None and outcome == "coalesced":
+                scope["route"] = entry.route
+            elif entry is None and outcome == "coalesced":
+                # The shared render was an error response sent to its own client
+                outcome = "rendered"
+                entry = await self._render(scope, receive, send)
+            metrics_service.response_cache_requests.inc(outcome)
+            if entry is None:
+                return
+        else:
+            metrics_service.response_cache_requests.inc("hit")
+            self.cache.move_to_end(key)
+            scope["route"] = entry.route
+
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if len(entry.bodies[None]) < self.MIN_SIZE:
+            encoding = None
+        if encoding not in entry.bodies:
+            entry.bodies[encoding] = _compress(entry.bodies[None], encoding)
+            if key in self.cache:
+                self.cached_bytes += len(entry.bodies[encoding])
+        if key not in self.cache and version == self.version:
+            self.cache[key] = entry
+            self.cached_bytes += entry.size
+        while self.cached_bytes > self.MAX_BYTES and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= evicted.size
+
+        body = entry.bodies[encoding]
+        response_headers = [(b"content-type", entry.media_type), (b"content-length", str(len(body)).encode())] + common
+        if encoding:
+            response_headers.append((b"content-encoding", encoding.encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _render(self, scope, receive, send) -> Optional[_Entry]:
+        """Run the route; returns its response to cache, or None once a non-200 response was passed on"""
+        messages: List[dict] = []
+
+        async def capture(message):
+            messages.append(message)
+
+        await self.app(scope, receive, capture)
+        start = messages[0]
+        if start["status"] != 200:
+            for message in messages:
+                await send(message)
+            return None
+        media_type = dict(start["headers"]).get(b"content-type", b"application/json")
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        return _Entry(scope.get("route"), media_type, body)
@@ -1,27 +1,39 @@
 from dotenv import load_dotenv
-from dune_client.client import DuneClient
 import os
 import asyncio
-from .stats import stats_service, CacheStats
+from datetime import datetime
+from .stats import stats_service
+from .metrics import metrics_service
+from .storage import storage_service
+from .tracing import tracer
+from ..constants import DUNE_API_URL
 
 load_dotenv()
 
 class DuneService:
     def __init__(self):
-        self.api_key = os.getenv("DUNE_API_KEY")
-        assert self.api_key, "Please set DUNE_API_KEY in your .env file."
-        self.dune = DuneClient(self.api_key)
+        self._dune = None
         # self.QUERY_ID = 4665548  # The query ID for prime caching data
         self.QUERY_ID = 4681874  # The query ID for prime caching data
         self._latest_result = None
-        self.cache_file = "dune_cache.json"
+        self.CACHE_KEY = "dune"  # Stored as dune_cache.json by the JSON storage
         self.cache_duration = 24 * 60 * 60 + 60  # 24 hours in seconds + 1 minute
 
+    @property
+    def dune(self):
+        """Dune client, created on first use; the cache file serves reads without a key"""
+        if self._dune is None:
+            from dune_client.client import DuneClient
+            api_key = os.getenv("DUNE_API_KEY")
+            assert api_key, "Please set DUNE_API_KEY in your .env file."
+            self._dune = DuneClient(api_key, base_url=DUNE_API_URL)
+        return self._dune
+
     async def get_latest_query_result(self):
         """
         Fetch the latest result from Dune Analytics query.
         Caches the result to avoid multiple API calls.
-        Cache persists in a JSON file and is valid for 24 hours.
+        Cache persists in storage and is valid for 24 hours.
         """
         if self._latest_result is None:
             # Try to load from cache file
@@ -32,8 +44,10 @@ class DuneService:
 
             try:
                 loop = asyncio.get_running_loop()
-                query_result = await loop.run_in_executor(None, self.dune.get_latest_result, self.QUERY_ID)
+                with metrics_service.track_upstream("dune"):
+                    query_result = await loop.run_in_executor(None, self.dune.get_latest_result, self.QUERY_ID)
                 self._latest_result = query_result.result.rows
+                tracer.add("dune_rows", len(self._latest_result))
                 # Save to cache file
                 self._save_cache(self._latest_result)
             except Exception as e:
@@ -43,40 +57,17 @@ class DuneService:
         return self._latest_result
 
     def _load_cache(self):
-        """Load cached data from JSON file if it exists and is not expired"""
-        import json
-        from datetime import datetime
-        import time
-        
+        """Load cached data from storage if it exists and is not expired"""
         try:
-            if not os.path.exists(self.cache_file):
-                return None
-                
-            with open(self.cache_file, 'r') as f:
-                cache_data = json.load(f)
-                
-            # Check if cache is expired
-            cache_time = cache_data.get('timestamp', 0)
-            if time.time() - cache_time > self.cache_duration:
-                return None
-                
-            return cache_data.get('data')
+            return storage_service.load_cache(self.CACHE_KEY, self.cache_duration)
         except Exception as e:
             print(f"Error loading cache: {str(e)}")
             return None
 
     def _save_cache(self, data):
-        """Save data to JSON cache file with timestamp"""
-        import json
-        import time
-        
+        """Save data to storage with timestamp"""
         try:
-            cache_data = {
-                'timestamp': time.time(),
-                'data': data
-            }
-            with open(self.cache_file, 'w') as f:
-                json.dump(cache_data, f)
+            storage_service.save_cache(self.CACHE_KEY, data)
         except Exception as e:
             print(f"Error saving cache: {str(e)}")
 
@@ -98,28 +89,25 @@ class DuneService:
 
     async def get_cache_stats(self):
         """
-        Get cache statistics from the cached data.
-        Returns None if no cached data is available.
+        Caching statistics computed from the Dune query's rows, to cross-check the ones
+        decoded from the chain. Returns None if no Dune data is available.
         """
         try:
-            cached_data = self._load_cache()
-            if cached_data is None:
-                # If no cache exists or it's expired, fetch new data
-                await self.get_latest_query_result()
-                cached_data = self._load_cache()
-                
-            if cached_data is None:
-                return None
-                
-            # Process the cached data into stats
-            return CacheStats(
-                total_cached=len(cached_data),
-                # Add other stats processing as needed based on your CacheStats model
-            )
+            rows = await self.get_latest_query_result()
+            return stats_service.calculate_stats([self._parse_row(row) for row in rows])
         except Exception as e:
             print(f"Error processing cache stats: {str(e)}")
             return None
 
+    @staticmethod
+    def _parse_row(row):
+        """Dune returns timestamps as strings like "2024-06-04 12:00:00.000 UTC" """
+        row = dict(row)
+        for key in ("deposited", "old_unlock"):
+            if isinstance(row.get(key), str):
+                row[key] = datetime.strptime(row[key][:19], "%Y-%m-%d %H:%M:%S")
+        return row
+
     def invalidate_cache(self):
         """Clear the cached query result"""
         self._latest_result = None
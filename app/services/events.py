@@ -0,0 +1,185 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Set, Tuple, Union
+from ..config import load_abi
+
+# The staking contract's deposit events, decoded from raw eth_getLogs results without
+# web3. Logs are dispatched on topic0; DepositCreated and DepositExtended have fixed
+# layouts, so each batch of them is decoded at once with numpy, imported on first use
+# like web3 so that read-only workers start without it.
+
+WEI = 10 ** 18
+DAY = 86400
+LIMB_SCALE = (2.0 ** 192, 2.0 ** 128, 2.0 ** 64, 1.0)  # uint256 as four big-endian uint64 limbs
+
+class DepositCreated(NamedTuple):
+    user: str
+    deposit_index: int
+    amount: float  # PRIME, normalized from wei
+    end_timestamp: int
+    created_timestamp: int
+
+class DepositExtended(NamedTuple):
+    user: str
+    deposit_index: int
+    end_timestamp: int
+    created_timestamp: int
+    updated_timestamp: int
+
+class DepositsWithdrawn(NamedTuple):
+    user: str
+    deposit_indexes: Tuple[int, ...]
+    total_amount: float
+    updated_timestamp: int
+    log_id: str  # transactionHash:logIndex, so a rescanned withdrawal counts once
+
+Event = Union[DepositCreated, DepositExtended, DepositsWithdrawn]
+EVENT_TYPES = {event_type.__name__: event_type for event_type in (DepositCreated, DepositExtended, DepositsWithdrawn)}
+
+# Per contract ABI, the events whose indexed address arguments are users. Other indexed
+# topics aren't addresses (SendToChain's chain id) or aren't users (the owner).
+USER_EVENTS = {
+    "staking_contract_abi": {"DepositCreated": ("user",), "DepositExtended": ("user",), "DepositsWithdrawn": ("user",)},
+    "staking_contract_base_abi": {
+        "Transfer": ("from",),
+        "Approval": ("owner",),
+        "EchelonInvoked": ("from",),
+        "SendToChain": ("_from",),
+        "ReceiveFromChain": ("_to",),
+    },
+}
+ZERO_ADDRESS = "0x" + "0" * 40
+
+def event_signature(event: Dict) -> str:
+    return f"{event['name']}({','.join(arg['type'] for arg in event['inputs'])})"
+
+@lru_cache(maxsize=None)
+def event_topics(abi_name: str = "staking_contract_abi") -> Dict[str, str]:
+    """
+    topic0 -> name of each decoded event, hashed once from a contract ABI. Empty for
+    contracts without deposit events, like the Base token contract.
+    """
+    from eth_hash.auto import keccak
+    return {
+        "0x" + keccak(event_signature(event).encode()).hex(): event["name"]
+        for event in load_abi(abi_name)
+        if event.get("type") == "event" and event["name"] in EVENT_TYPES
+    }
+
+@lru_cache(maxsize=None)
+def user_topics(abi_name: str) -> Dict[str, Tuple[int, ...]]:
+    """topic0 -> positions of the user topics, for each user-bearing event of a contract ABI"""
+    from eth_hash.auto import keccak
+    topics = {}
+    for event in load_abi(abi_name):
+        users = USER_EVENTS[abi_name].get(event.get("name")) if event.get("type") == "event" else None
+        if users:
+            indexed = [arg["name"] for arg in event["inputs"] if arg.get("indexed")]
+            topic = "0x" + keccak(event_signature(event).encode()).hex()
+            topics[topic] = tuple(indexed.index(name) + 1 for name in users)
+    return topics
+
+def _words(logs: List[Dict], count: int):
+    """The first `count` data words of each log as a (logs, count, 4) array of uint64 limbs"""
+    import numpy as np
+    raw = bytes.fromhex("".join(log["data"][2:2 + 64 * count] for log in logs))
+    return np.frombuffer(raw, dtype=">u8").reshape(len(logs), count, 4)
+
+def _user(log: Dict) -> str:
+    return "0x" + log["topics"][1][-40:].lower()
+
+def log_addresses(logs: List[Dict], abi_name: str = "staking_contract_abi") -> Set[str]:
+    """The lowercase user addresses in the logs of the contract's user-bearing events"""
+    topics = user_topics(abi_name)
+    addresses = set()
+    for log in logs:
+        positions = topics.get(log["topics"][0]) if log.get("topics") else None
+        for position in positions or ():
+            addresses.add("0x" + log["topics"][position][-40:].lower())
+    addresses.discard(ZERO_ADDRESS)  # Mints and burns
+    return addresses
+
+def _decode_created(logs: List[Dict]) -> List[DepositCreated]:
+    words = _words(logs, 4)
+    small = words[:, :, 3].tolist()  # Indexes and timestamps fit in the low limb
+    amounts = (words[:, 1].astype(float) @ LIMB_SCALE / WEI).tolist()
+    return [
+        DepositCreated(_user(log), row[0], amount, row[2], row[3])
+        for log, row, amount in zip(logs, small, amounts)
+    ]
+
+def _decode_extended(logs: List[Dict]) -> List[DepositExtended]:
+    small = _words(logs, 4)[:, :, 3].tolist()
+    return [DepositExtended(_user(log), *row) for log, row in zip(logs, small)]
+
+def _decode_withdrawn(logs: List[Dict]) -> List[DepositsWithdrawn]:
+    events = []
+    for log in logs:
+        data = bytes.fromhex(log["data"][2:])
+        word = lambda i: int.from_bytes(data[32 * i:32 * i + 32], "big")
+        offset = word(0) // 32
+        indexes = tuple(word(offset + 1 + i) for i in range(word(offset)))
+        log_id = f"{log.get('transactionHash')}:{int(str(log.get('logIndex', '0x0')), 16)}"
+        events.append(DepositsWithdrawn(_user(log), indexes, word(1) / WEI, word(2), log_id))
+    return events
+
+DECODERS = {"DepositCreated": _decode_created, "DepositExtended": _decode_extended, "DepositsWithdrawn": _decode_withdrawn}
+
+def decode_logs(logs: List[Dict], abi_name: str = "staking_contract_abi") -> List[Event]:
+    """Typed events for the staking logs among `logs`, in log order; other logs are skipped"""
+    topics = event_topics(abi_name)
+    positions: Dict[str, List[int]] = {}
+    for position, log in enumerate(logs):
+        name = topics.get(log["topics"][0]) if log.get("topics") else None
+        if name is not None:
+            positions.setdefault(name, []).append(position)
+    decoded = {}
+    for name, indexes in positions.items():
+        decoded.update(zip(indexes, DECODERS[name]([logs[i] for i in indexes])))
+    return [decoded[position] for position in sorted(decoded)]
+
+class DepositLedger:
+    """
+    Current state of every deposit on one chain, folded from its events in block order.
+    Applying the same events again leaves it unchanged, so rescanned blocks are harmless.
+    """
+    def __init__(self, deposits: Dict[str, List] = None, withdrawals: Dict[str, float] = None):
+        # "user:index" -> [amount, created, original end, current end]
+        self.deposits: Dict[str, List] = deposits or {}
+        self.withdrawals: Dict[str, float] = withdrawals or {}  # Log id -> amount withdrawn
+
+    def apply(self, events: List[Event]):
+        for event in events:
+            if isinstance(event, DepositCreated):
+                key = f"{event.user}:{event.deposit_index}"
+                self.deposits[key] = [event.amount, event.created_timestamp, event.end_timestamp, event.end_timestamp]
+            elif isinstance(event, DepositExtended):
+                deposit = self.deposits.get(f"{event.user}:{event.deposit_index}")
+                if deposit is not None:
+                    deposit[3] = event.end_timestamp
+            else:
+                self.withdrawals[event.log_id] = event.total_amount
+
+    @property
+    def withdrawn(self) -> float:
+        return sum(self.withdrawals.values())
+
+    def rows(self, chain: str) -> List[Dict]:
+        """Deposits shaped like the Dune query's rows, as StatsService.calculate_stats reads them"""
+        rows = []
+        for key, (amount, created, original_end, end) in self.deposits.items():
+            user, _, index = key.partition(":")
+            rows.append({
+                "user": user,
+                "chain": chain,
+                "norm_amt": amount,
+                "depositIndex": int(index),
+                "deposited": datetime.fromtimestamp(created, timezone.utc),
+                "old_unlock": datetime.fromtimestamp(original_end, timezone.utc),
+                "old_duration": (original_end - created) / DAY,
+                "new_duration": (end - created) / DAY,
+            })
+        return rows
+
+    def to_json(self) -> Dict:
+        return {"deposits": self.deposits, "withdrawals": self.withdrawals}
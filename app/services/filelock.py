@@ -0,0 +1,58 @@
+import os
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so every process acts as the only worker
+    fcntl = None
+
+class FileLock:
+    """
+    Advisory flock on a file, shared by all processes working in the same directory.
+    The lock is tied to the open file, so it is released if the holding process dies.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        """Whether this instance holds the lock"""
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                os.close(fd)
+                return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def held_elsewhere(self) -> bool:
+        """Whether another process (or another FileLock on the same path) holds the lock"""
+        if self._fd is not None:
+            return False
+        if not self.acquire(blocking=False):
+            return True
+        self.release()
+        return False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
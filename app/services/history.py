@@ -0,0 +1,279 @@
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+import heapq
+import json
+import mmap
+import os
+import time
+from .snapshot import _StringTable, _pad, _string_table
+
+# History is kept as immutable segment files under HISTORY_DIR, named
+# L<level>-<first run>-<last run>.seg. Each update run appends one level-0 segment;
+# FANOUT segments of a level are merged into one of the next level, so years of daily
+# runs stay at a few dozen files. A segment is address-major: a sorted address table
+# and, per address, a blob of chunks. A chunk packs the columns (run, rank, score,
+# cached) of consecutive points, each column stored as its first value followed by
+# deltas, zigzag varint encoded. Level-1 merges re-encode the single-run chunks into one
+# chunk per address; later merges concatenate blobs without decoding.
+MAGIC = b"LBHIST\x00\x01"
+HISTORY_FORMAT = 1
+SCORE_SCALE = 100  # Scores are stored in hundredths
+
+def _write_varint(out: bytearray, value: int):
+    # Zigzag for unbounded ints: cached amounts are in wei and exceed 64 bits
+    value = value << 1 if value >= 0 else (-value << 1) - 1
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1) ^ -(value & 1), pos
+
+def encode_chunk(points: List[Tuple[int, int, int, int]]) -> bytes:
+    """Column-pack and delta-encode (run, rank, score, cached) points"""
+    out = bytearray()
+    _write_varint(out, len(points))
+    for column in zip(*points):
+        previous = 0
+        for value in column:
+            _write_varint(out, value - previous)
+            previous = value
+    return bytes(out)
+
+def decode_blob(blob: bytes) -> List[Tuple[int, int, int, int]]:
+    """Points of all chunks in a blob"""
+    points = []
+    pos = 0
+    while pos < len(blob):
+        count, pos = _read_varint(blob, pos)
+        columns = []
+        for _ in range(4):
+            column, previous = [], 0
+            for _ in range(count):
+                delta, pos = _read_varint(blob, pos)
+                previous += delta
+                column.append(previous)
+            columns.append(column)
+        points.extend(zip(*columns))
+    return points
+
+def write_segment(path: str, first_run: int, last_run: int, blobs: Iterator[Tuple[bytes, bytes]]):
+    """Write a segment from (address key, blob) pairs in address order"""
+    keys = []
+    offsets = array("Q", [0])
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path + ".blobs", "wb+") as blob_file:
+        for key, blob in blobs:
+            keys.append(key)
+            blob_file.write(blob)
+            offsets.append(offsets[-1] + len(blob))
+        key_data, key_offsets = _string_table(keys)
+        sections = {"address_keys": key_data, "address_key_offsets": key_offsets, "blob_offsets": offsets.tobytes()}
+        layout = {}
+        offset = 0
+        for name, data in sections.items():
+            layout[name] = [offset, len(data)]
+            offset += len(data) + _pad(len(data))
+        layout["blobs"] = [offset, offsets[-1]]
+        header = json.dumps({
+            "format": HISTORY_FORMAT,
+            "first_run": first_run,
+            "last_run": last_run,
+            "count": len(keys),
+            "sections": layout,
+        }, separators=(",", ":")).encode()
+
+        with open(temp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(array("Q", [len(header)]).tobytes())
+            f.write(header)
+            f.write(b"\0" * _pad(len(MAGIC) + 8 + len(header)))
+            for data in sections.values():
+                f.write(data)
+                f.write(b"\0" * _pad(len(data)))
+            blob_file.seek(0)
+            while True:
+                data = blob_file.read(1 << 20)
+                if not data:
+                    break
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    os.remove(temp_path + ".blobs")
+    os.replace(temp_path, path)
+
+class Segment:
+    """Read-only, memory-mapped history segment"""
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a history segment")
+        header_length = view[len(MAGIC):len(MAGIC) + 8].cast("Q")[0]
+        header_end = len(MAGIC) + 8 + header_length
+        header = json.loads(bytes(view[len(MAGIC) + 8:header_end]))
+        base = header_end + _pad(header_end)
+
+        def section(name: str, fmt: Optional[str] = None) -> memoryview:
+            offset, length = header["sections"][name]
+            data = view[base + offset:base + offset + length]
+            return data.cast(fmt) if fmt else data
+
+        self.first_run: int = header["first_run"]
+        self.last_run: int = header["last_run"]
+        self.count: int = header["count"]
+        self._addresses = _StringTable(section("address_keys"), section("address_key_offsets", "Q"))
+        self._blobs = _StringTable(section("blobs"), section("blob_offsets", "Q"))
+
+    def blob(self, address: str) -> Optional[bytes]:
+        index = self._addresses.find(address.lower().encode())
+        return self._blobs[index] if index >= 0 else None
+
+    def items(self) -> Iterator[Tuple[bytes, bytes]]:
+        for index in range(self.count):
+            yield self._addresses[index], self._blobs[index]
+
+def _point(run: int, record: Dict) -> Tuple[int, int, int, int]:
+    data = record.get("data", {})
+    score = sum(data.get("merged_score_data", {}).values())
+    cached = data.get("prime_amount_cached", 0) + data.get("base_prime_amount_cached", 0)
+    return (run, data.get("leaderboard_rank") or 0, round(score * SCORE_SCALE), int(cached))
+
+class HistoryService:
+    def __init__(self):
+        self.HISTORY_DIR = "history"
+        self.RUNS_FILE = "runs.jsonl"
+        self.FANOUT = 8  # Segments of one level merged into one of the next
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.HISTORY_DIR, name)
+
+    def _segments(self) -> List[Tuple[int, int, int, str]]:
+        """(level, first_run, last_run, file name) of every segment"""
+        segments = []
+        try:
+            names = os.listdir(self.HISTORY_DIR)
+        except FileNotFoundError:
+            return segments
+        for name in names:
+            if name.startswith("L") and name.endswith(".seg"):
+                level, first_run, last_run = name[1:-len(".seg")].split("-")
+                segments.append((int(level), int(first_run), int(last_run), name))
+        return sorted(segments, key=lambda segment: segment[1])
+
+    def runs(self) -> Dict[int, Dict]:
+        """Run index -> run metadata"""
+        runs = {}
+        try:
+            with open(self._path(self.RUNS_FILE), "r") as f:
+                for line in f:
+                    if line.strip():
+                        run = json.loads(line)
+                        runs[run["run"]] = run
+        except FileNotFoundError:
+            pass
+        return runs
+
+    def append_run(self, addresses_data: List[Dict], version: Optional[int] = None) -> int:
+        """Record one point per address for a finished update run; returns the run index"""
+        os.makedirs(self.HISTORY_DIR, exist_ok=True)
+        runs = self.runs()
+        run = max(runs) + 1 if runs else 0
+        with open(self._path(self.RUNS_FILE), "a") as f:
+            f.write(json.dumps({"run": run, "timestamp": int(time.time()), "version": version}) + "\n")
+
+        points = {}
+        for record in addresses_data:
+            points.setdefault(record["address"].lower(), _point(run, record))
+        write_segment(
+            self._path(f"L0-{run:08d}-{run:08d}.seg"), run, run,
+            ((key.encode(), encode_chunk([points[key]])) for key in sorted(points))
+        )
+        self._compact()
+        return run
+
+    def _compact(self):
+        """Merge FANOUT segments of a level into one segment of the next, level by level"""
+        level = 0
+        while True:
+            same_level = [segment for segment in self._segments() if segment[0] == level]
+            if not same_level:
+                return
+            if len(same_level) >= self.FANOUT:
+                group = same_level[:self.FANOUT]
+                self._merge(level + 1, group)
+            level += 1
+
+    def _merge(self, level: int, group: List[Tuple[int, int, int, str]]):
+        segments = [Segment(self._path(name)) for _, _, _, name in group]
+
+        def merged() -> Iterator[Tuple[bytes, bytes]]:
+            # Segments are in run order, so concatenated blobs keep points in run order
+            streams = [((key, i, blob) for key, blob in segment.items()) for i, segment in enumerate(segments)]
+            current_key, parts = None, []
+            for key, _, blob in heapq.merge(*streams):
+                if key != current_key and parts:
+                    yield current_key, combine(parts)
+                    parts = []
+                current_key = key
+                parts.append(blob)
+            if parts:
+                yield current_key, combine(parts)
+
+        def combine(parts: List[bytes]) -> bytes:
+            # Single-run chunks are re-encoded as one delta chain, which is where most
+            # of the saving is; higher levels just concatenate
+            if level == 1:
+                return encode_chunk(decode_blob(b"".join(parts)))
+            return b"".join(parts)
+
+        first_run, last_run = group[0][1], group[-1][2]
+        write_segment(self._path(f"L{level}-{first_run:08d}-{last_run:08d}.seg"), first_run, last_run, merged())
+        for _, _, _, name in group:
+            os.remove(self._path(name))
+
+    def _points(self, address: str) -> Optional[Dict[int, Tuple[int, int, int, int]]]:
+        """Points by run, or None if a merge replaced a segment while reading"""
+        points = {}
+        for _, _, _, name in self._segments():
+            try:
+                blob = Segment(self._path(name)).blob(address)
+            except FileNotFoundError:
+                return None
+            if blob:
+                for point in decode_blob(blob):
+                    points[point[0]] = point
+        return points
+
+    def series(self, address: str) -> List[Dict]:
+        """One address's points in run order, read from each segment's index"""
+        for _ in range(3):
+            points = self._points(address)
+            if points is not None:
+                break
+        else:
+            points = {}
+        runs = self.runs()
+        history = []
+        for run, rank, score, cached in sorted(points.values()):
+            history.append({
+                "run": run,
+                "timestamp": runs.get(run, {}).get("timestamp"),
+                "leaderboard_rank": rank or None,
+                "score": score / SCORE_SCALE,
+                "prime_cached": cached,
+            })
+        return history
+
+# Create a singleton instance
+history_service = HistoryService()
@@ -0,0 +1,32 @@
+import aiohttp
+import asyncio
+
+class HttpService:
+    def __init__(self):
+        self.MAX_CONNECTIONS = 100  # Shared across all upstream APIs
+        self.DNS_CACHE_TTL = 300  # Seconds
+        self._session = None
+        self._loop = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the process-wide pooled session.
+        A new session is created if none exists yet, if it was closed, or if it
+        belongs to a different event loop (e.g. between test runs).
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.MAX_CONNECTIONS, ttl_dns_cache=self.DNS_CACHE_TTL)
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._loop = loop
+        return self._session
+
+    async def close(self):
+        """Close the pooled session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+# Create a singleton instance
+http_service = HttpService()
@@ -0,0 +1,209 @@
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import time
+from .blockchain import blockchain_service
+from .events import DepositLedger, decode_logs, event_topics, log_addresses
+from .logging_service import logging_service
+from .logstore import LogStore
+from .rpc import LogRangeTooLarge, RateLimiter, rpc_pool
+from .stats import CacheStats, stats_service
+from .tracing import tracer
+from ..constants import (
+    BASE_CREATION_BLOCK, CREATION_BLOCK, STAKING_CONTRACT_ADDRESS, STAKING_CONTRACT_ADDRESS_BASE
+)
+
+class Chain(NamedTuple):
+    """A staking contract deployment and the load its scan may put on the RPC pool"""
+    name: str
+    network: str  # Network of its RPC endpoints
+    contract: str
+    creation_block: int
+    batch_size: int  # Blocks per eth_getLogs call
+    max_concurrency: int
+    requests_per_second: float
+    reorg_depth: int  # Recent blocks scanned again on the next run
+    abi: str = "staking_contract_abi"  # Names the events its users are read from
+
+CHAINS = (
+    Chain("eth", "eth-mainnet", STAKING_CONTRACT_ADDRESS, CREATION_BLOCK, 100_000, 10, 25, 64),
+    Chain("base", "base-mainnet", STAKING_CONTRACT_ADDRESS_BASE, BASE_CREATION_BLOCK, 10_000_000, 10, 25, 300, "staking_contract_base_abi"),
+)
+
+class IndexerService:
+    """
+    Builds the address universe from the staking contracts' logs on every chain.
+    Chains are scanned concurrently, each with its own concurrency and rate limit, and
+    every call goes through the RPC pool, which retries and fails over between endpoints.
+    Each chain's checkpoint holds the scanned block, the addresses found so far and the
+    deposit ledger decoded from the logs, so a run only scans the blocks added since the
+    last one and the caching stats need no Dune query. The raw logs are kept in a LogStore
+    next to the checkpoint, and both are built by streaming over it.
+    """
+    STATE_FORMAT = 2
+    def __init__(self, chains: Tuple[Chain, ...] = CHAINS):
+        self.chains = chains
+        self.STATE_DIR = "indexer"
+        self.CHECKPOINT_INTERVAL = 5  # Seconds between checkpoint writes during a scan
+        self.semaphores = {chain.name: asyncio.Semaphore(chain.max_concurrency) for chain in chains}
+        self.limiters = {chain.name: RateLimiter(chain.requests_per_second) for chain in chains}
+        self._stats: Optional[CacheStats] = None
+        self._stats_key = None
+
+    def _state_file(self, chain: Chain) -> str:
+        return os.path.join(self.STATE_DIR, f"{chain.name}.json")
+
+    def load_state(self, chain: Chain) -> Dict:
+        """Last fully scanned block, the addresses seen up to it and the deposit ledger"""
+        empty = {"block": chain.creation_block - 1, "addresses": [], "deposits": {}, "withdrawals": {}}
+        try:
+            with open(self._state_file(chain), "r") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return empty
+        # Redeployed contracts and checkpoints from before the ledger start over
+        if state.get("contract", "").lower() != chain.contract.lower() or state.get("format") != self.STATE_FORMAT:
+            return empty
+        return state
+
+    def _save_state(self, chain: Chain, block: int, addresses: Set[str], ledger: DepositLedger):
+        os.makedirs(self.STATE_DIR, exist_ok=True)
+        path = self._state_file(chain)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({
+                "format": self.STATE_FORMAT,
+                "contract": chain.contract,
+                "block": block,
+                "addresses": sorted(addresses),
+                **ledger.to_json(),
+            }, f)
+        os.replace(f"{path}.tmp", path)
+
+    async def _get_logs(self, chain: Chain, from_block: int, to_block: int) -> List[Dict]:
+        """eth_getLogs for one block range on the healthiest of the chain's RPC endpoints"""
+        params = [{"fromBlock": hex(from_block), "toBlock": hex(to_block), "address": chain.contract}]
+        async with self.semaphores[chain.name]:
+            await self.limiters[chain.name].wait()
+            return await rpc_pool.request(chain.network, "eth_getLogs", params, blocks=to_block - from_block + 1)
+
+    async def _scan_range(self, chain: Chain, from_block: int, to_block: int) -> List[Dict]:
+        """Logs of a block range in order, splitting the range when the provider refuses its size"""
+        try:
+            logs = await self._get_logs(chain, from_block, to_block)
+        except LogRangeTooLarge:
+            if from_block == to_block:
+                raise
+            middle = (from_block + to_block) // 2
+            tracer.add("splits")
+            lower, upper = await asyncio.gather(
+                self._scan_range(chain, from_block, middle), self._scan_range(chain, middle + 1, to_block)
+            )
+            return lower + upper
+        tracer.add("logs", len(logs))
+        return logs
+
+    def log_store(self, chain: Chain) -> LogStore:
+        return LogStore(os.path.join(self.STATE_DIR, chain.name), chain.contract)
+
+    def _fold(self, chain: Chain, store: LogStore, from_block: int, to_block: int, addresses: Set[str], ledger: DepositLedger):
+        """Add the addresses and deposit events of stored blocks, reading one chunk at a time"""
+        for logs in store.read(from_block, to_block):
+            addresses.update(log_addresses(logs, chain.abi))
+            ledger.apply(decode_logs(logs, chain.abi))
+
+    @tracer.traced()
+    async def index_chain(self, chain: Chain) -> Set[str]:
+        """Scan one chain from its checkpoint to the latest block; returns all its addresses"""
+        span = tracer.current()
+        state = self.load_state(chain)
+        addresses = set(state["addresses"])
+        ledger = DepositLedger(state["deposits"], state["withdrawals"])
+        store = self.log_store(chain)
+        scanned_block = state["block"]
+        # Chunks stored past the checkpoint, by an interrupted run or before the checkpoint
+        # was reset, are folded in without fetching them again
+        stored_block = store.covered_until(scanned_block + 1)
+        if stored_block > scanned_block:
+            self._fold(chain, store, scanned_block + 1, stored_block, addresses, ledger)
+            scanned_block = stored_block
+        latest_block = await blockchain_service.get_latest_block_number(chain.network)
+        start_block = max(chain.creation_block, scanned_block + 1 - chain.reorg_depth)
+        chunks = [
+            (block, min(block + chain.batch_size - 1, latest_block))
+            for block in range(start_block, latest_block + 1, chain.batch_size)
+        ]
+        span.set(chain=chain.name, from_block=start_block, to_block=latest_block, chunks=len(chunks), replayed_to=stored_block)
+
+        # Chunks finish out of order and go straight to the log store; the checkpoint only
+        # advances past contiguous stored chunks, whose logs are then read back in block order
+        done: Set[int] = set()
+        frontier = 0
+        last_save = time.monotonic()
+
+        async def scan(index: int, from_block: int, to_block: int):
+            nonlocal frontier, scanned_block, last_save
+            logs = await self._scan_range(chain, from_block, to_block)
+            tracer.add("stored_bytes", store.append(from_block, to_block, logs))
+            done.add(index)
+            while frontier in done:
+                done.remove(frontier)
+                self._fold(chain, store, *chunks[frontier], addresses, ledger)
+                scanned_block = max(scanned_block, chunks[frontier][1])
+                frontier += 1
+            if time.monotonic() - last_save > self.CHECKPOINT_INTERVAL:
+                self._save_state(chain, scanned_block, addresses, ledger)
+                last_save = time.monotonic()
+
+        tasks = [asyncio.ensure_future(scan(i, *chunk)) for i, chunk in enumerate(chunks)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._save_state(chain, scanned_block, addresses, ledger)
+
+        span.set(
+            addresses=len(addresses),
+            new_addresses=len(addresses) - len(state["addresses"]),
+            deposits=len(ledger.deposits)
+        )
+        await logging_service.log(
+            f"[{chain.name}] Scanned blocks {start_block}-{latest_block} in {span.elapsed:.2f} seconds, "
+            f"{len(addresses)} addresses"
+        )
+        return addresses
+
+    @tracer.traced()
+    async def get_interacting_addresses(self) -> Set[str]:
+        """Union of the addresses that interacted with the staking contract on any chain"""
+        results = await asyncio.gather(*[self.index_chain(chain) for chain in self.chains])
+        addresses = set().union(*results)
+        tracer.current().set(addresses=len(addresses))
+        return addresses
+
+    def cache_stats(self) -> Optional[CacheStats]:
+        """
+        Caching stats of the deposits on every chain whose contract emits deposit events,
+        recomputed whenever a checkpoint changes. None until a scan has found deposits.
+        """
+        chains = [chain for chain in self.chains if event_topics(chain.abi)]
+        key = []
+        for chain in chains:
+            try:
+                key.append(os.stat(self._state_file(chain)).st_mtime_ns)
+            except FileNotFoundError:
+                key.append(None)
+        if key != self._stats_key:
+            rows, withdrawn = [], 0.0
+            for chain in chains:
+                state = self.load_state(chain)
+                ledger = DepositLedger(state["deposits"], state["withdrawals"])
+                rows.extend(ledger.rows(chain.name.upper()))
+                withdrawn += ledger.withdrawn
+            self._stats = stats_service.calculate_stats(rows, withdrawn)
+            self._stats_key = key
+        return self._stats
+
+# Create a singleton instance
+indexer_service = IndexerService()
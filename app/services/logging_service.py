@@ -1,24 +1,72 @@
-import aiohttp
+import asyncio
+import re
 import time
 import os
-from typing import Optional
+from typing import List, Optional
 from dotenv import load_dotenv
 from collections import defaultdict
+from .http import http_service
+from .metrics import metrics_service
+from ..constants import TELEGRAM_API_URL
 
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+TAG = re.compile(r"<(/?)([a-zA-Z-]+)[^>]*>")
+
+def truncate_html(text: str, limit: int) -> str:
+    """
+    Shorten Telegram HTML to at most `limit` characters without splitting a tag or an
+    entity, closing the tags left open; Telegram rejects the whole post otherwise.
+    """
+    if len(text) <= limit:
+        return text
+    suffix = "…"
+    cut = limit - len(suffix)
+    while True:
+        head = text[:cut]
+        # Step back out of a partial tag or entity
+        if head.rfind("<") > head.rfind(">"):
+            head = head[:head.rfind("<")]
+        amp = head.rfind("&")
+        if amp > head.rfind(";"):
+            head = head[:amp]
+        open_tags = []
+        for match in TAG.finditer(head):
+            if match.group(1):
+                if match.group(2) in open_tags:
+                    open_tags.remove(match.group(2))
+            else:
+                open_tags.append(match.group(2))
+        closing = "".join(f"</{tag}>" for tag in reversed(open_tags))
+        if len(head) + len(suffix) + len(closing) <= limit:
+            return head + suffix + closing
+        cut = max(0, limit - len(suffix) - len(closing))
+
 class LoggingService:
     def __init__(self):
         self.error_messages = defaultdict(list)
         self.error_count = 0
         self.ERROR_BATCH_SIZE = 10
         self.timers = {}
+        self.TELEGRAM_QUEUE_SIZE = 500  # Messages beyond this are dropped and reported as a count
+        self.TELEGRAM_COALESCE_WINDOW = 2.0  # Seconds to collect messages into one Telegram post
+        self.TELEGRAM_MIN_INTERVAL = 3.0  # Telegram allows ~20 messages per minute in a group
+        self.TELEGRAM_MAX_LENGTH = 4000  # Telegram has a 4096 char limit
+        self.TELEGRAM_MAX_POSTS_PER_BATCH = 3  # Longer batches are summarized
+        self.telegram_queue: Optional[asyncio.Queue] = None
+        self.dropped_messages = 0
+        self._sender_task: Optional[asyncio.Task] = None
+        self._sender_loop = None
+        self._last_sent = 0.0
 
     def start_timer(self, task_name: str):
-        """Start timing a task"""
+        """
+        Start timing a task.
+        Timers are keyed by name only; use tracer spans for work that may run concurrently.
+        """
         self.timers[task_name] = time.monotonic()
         return self.timers[task_name]
 
@@ -32,32 +80,129 @@ class LoggingService:
 
     def clean_message(self, text: str) -> str:
         """Clean and escape message for Telegram"""
-        text = text.replace('<', '&lt;').replace('>', '&gt;')
-        return text[:4000].strip()  # Telegram has a 4096 char limit
+        # Cut before escaping, so an entity is never split
+        text = text[:4000].strip()  # Telegram has a 4096 char limit
+        return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
 
     async def log(self, message: str, send_telegram: bool = True):
-        """Log a message to console and optionally to Telegram"""
+        """Log a message to console and optionally queue it for Telegram"""
         print(message)
         if send_telegram:
-            await self.send_telegram_message(message)
+            self.queue_telegram_message(message)
 
-    async def send_telegram_message(self, message: str):
-        """Send a message to Telegram channel"""
+    def queue_telegram_message(self, message: str):
+        """
+        Queue a message for the background Telegram sender without waiting for it.
+        When the queue is full the message is dropped and counted instead.
+        """
         if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
             return
+        self._ensure_sender()
+        try:
+            self.telegram_queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped_messages += 1
+
+    def _ensure_sender(self):
+        loop = asyncio.get_running_loop()
+        if self._sender_task is None or self._sender_task.done() or self._sender_loop is not loop:
+            self.telegram_queue = asyncio.Queue(maxsize=self.TELEGRAM_QUEUE_SIZE)
+            self._sender_loop = loop
+            self._sender_task = loop.create_task(self._telegram_sender())
+
+    async def _next_batch(self) -> List[str]:
+        """Wait for a message, then collect whatever else arrives within the coalesce window"""
+        batch = [await self.telegram_queue.get()]
+        deadline = time.monotonic() + self.TELEGRAM_COALESCE_WINDOW
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.telegram_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _pack_batch(self, batch: List[str]) -> List[str]:
+        """Join queued messages into as few posts as fit Telegram's length limit"""
+        if self.dropped_messages:
+            batch = batch + [f"⚠️ {self.dropped_messages} log messages dropped (Telegram queue full)"]
+            self.dropped_messages = 0
+
+        posts = []
+        current = ""
+        for message in batch:
+            message = truncate_html(message, self.TELEGRAM_MAX_LENGTH)
+            if current and len(current) + 2 + len(message) > self.TELEGRAM_MAX_LENGTH:
+                posts.append(current)
+                current = message
+            else:
+                current = f"{current}\n\n{message}" if current else message
+        if current:
+            posts.append(current)
+
+        if len(posts) > self.TELEGRAM_MAX_POSTS_PER_BATCH:
+            omitted = len(posts) - self.TELEGRAM_MAX_POSTS_PER_BATCH + 1
+            posts = posts[:self.TELEGRAM_MAX_POSTS_PER_BATCH - 1] + [
+                f"… {omitted} more posts of log messages omitted"
+            ]
+        return posts
+
+    async def _telegram_sender(self):
+        """Single consumer that posts coalesced batches while respecting Telegram rate limits"""
+        while True:
+            batch = await self._next_batch()
+            try:
+                for post in self._pack_batch(batch):
+                    wait = self._last_sent + self.TELEGRAM_MIN_INTERVAL - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    retry_after = await self.send_telegram_message(post)
+                    if retry_after:
+                        await asyncio.sleep(retry_after)
+                        await self.send_telegram_message(post)
+                    self._last_sent = time.monotonic()
+            finally:
+                for _ in batch:
+                    self.telegram_queue.task_done()
+
+    async def flush(self, timeout: float = 10.0):
+        """Wait for queued Telegram messages to be sent, then stop the sender"""
+        if self._sender_task is None:
+            return
+        try:
+            await asyncio.wait_for(self.telegram_queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Telegram queue not drained within {timeout} seconds, {self.telegram_queue.qsize()} messages lost")
+        self._sender_task.cancel()
+        self._sender_task = None
+
+    async def send_telegram_message(self, message: str) -> Optional[float]:
+        """
+        Send a message to Telegram channel right away.
+        Returns the number of seconds to wait if Telegram rate limited the request.
+        """
+        if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+            return None
             
         try:
-            telegram_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-            async with aiohttp.ClientSession() as session:
-                async with session.post(telegram_url, json={
+            telegram_url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+            with metrics_service.track_upstream("telegram") as call:
+                async with http_service.get_session().post(telegram_url, json={
                     "chat_id": TELEGRAM_CHAT_ID,
                     "text": message,
                     "parse_mode": "HTML"
                 }) as response:
+                    call.status = response.status
+                    if response.status == 429:
+                        data = await response.json(content_type=None)
+                        return float(data.get("parameters", {}).get("retry_after", self.TELEGRAM_MIN_INTERVAL))
                     if response.status != 200:
                         print(f"Failed to send Telegram message: {await response.text()}")
         except Exception as e:
             print(f"Error sending Telegram message: {str(e)}")
+        return None
 
     async def add_error(self, error_type: str, identifier: str, detail: str = ""):
         """Add an error and send report if batch size reached"""
@@ -82,7 +227,7 @@ class LoggingService:
                 message += f"  ... and {len(errors) - 5} more\n"
             message += "\n"
         
-        await self.send_telegram_message(message)
+        self.queue_telegram_message(message)
         self.error_messages.clear()
         self.error_count = 0
 
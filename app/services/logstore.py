@@ -0,0 +1,152 @@
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+import json
+import os
+import struct
+
+# Raw contract logs kept on disk in append-only segment files, so a scan never holds more
+# than one chunk of logs in memory and the history can be folded again without refetching.
+# A record is a fixed header followed by its topics and data:
+# block, logIndex, transactionHash, topic count, data length.
+HEADER = struct.Struct(">QI32sBI")
+
+class Chunk(NamedTuple):
+    """Where the logs of a block range were appended; a range is covered even with no logs"""
+    segment: str
+    offset: int
+    length: int
+    from_block: int
+    to_block: int
+
+def _to_bytes(value) -> bytes:
+    """Hex strings from JSON-RPC, or bytes from web3"""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+def _to_int(value) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+def encode_log(log: Dict) -> bytes:
+    topics = [_to_bytes(topic) for topic in log.get("topics", [])]
+    data = _to_bytes(log.get("data", "0x"))
+    return b"".join([
+        HEADER.pack(
+            _to_int(log["blockNumber"]), _to_int(log.get("logIndex", 0)),
+            _to_bytes(log["transactionHash"]), len(topics), len(data)
+        ),
+        *topics,
+        data,
+    ])
+
+def decode_records(buffer: bytes) -> Iterator[Tuple[int, Dict]]:
+    """(block, log) for each record in `buffer`, with the log shaped like eth_getLogs results"""
+    view = memoryview(buffer)
+    position = 0
+    while position < len(view):
+        block, log_index, tx_hash, topic_count, data_length = HEADER.unpack_from(view, position)
+        position += HEADER.size
+        topics = ["0x" + view[position + 32 * i:position + 32 * i + 32].hex() for i in range(topic_count)]
+        position += 32 * topic_count
+        data = "0x" + view[position:position + data_length].hex()
+        position += data_length
+        yield block, {
+            "blockNumber": hex(block),
+            "logIndex": hex(log_index),
+            "transactionHash": "0x" + tx_hash.hex(),
+            "topics": topics,
+            "data": data,
+        }
+
+class LogStore:
+    """
+    One contract's logs in rotating segment files with a block-range index.
+    Appending a block range that was stored before, as reorg rescans do, replaces it.
+    """
+    FORMAT = 1
+    def __init__(self, directory: str, source: str):
+        self.directory = directory
+        self.source = source  # The contract; a store for another one starts over
+        self.SEGMENT_BYTES = 64 * 1024 * 1024
+        self.chunks: List[Chunk] = self._load_index()
+
+    @property
+    def _index_file(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _load_index(self) -> List[Chunk]:
+        try:
+            with open(self._index_file, "r") as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return []
+        if index.get("format") != self.FORMAT or index.get("source", "").lower() != self.source.lower():
+            return []
+        return [Chunk(*chunk) for chunk in index["chunks"]]
+
+    def _save_index(self):
+        tmp_path = f"{self._index_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"format": self.FORMAT, "source": self.source, "chunks": [list(chunk) for chunk in self.chunks]}, f)
+        os.replace(tmp_path, self._index_file)
+
+    def _active_segment(self) -> str:
+        """The newest segment, or a new one once it is full"""
+        segments = sorted(name for name in os.listdir(self.directory) if name.endswith(".log"))
+        if segments and os.path.getsize(os.path.join(self.directory, segments[-1])) < self.SEGMENT_BYTES:
+            return segments[-1]
+        number = int(segments[-1].split(".")[0]) + 1 if segments else 0
+        return f"{number:06d}.log"
+
+    def append(self, from_block: int, to_block: int, logs: List[Dict]) -> int:
+        """Store the logs of a block range; returns the bytes written"""
+        os.makedirs(self.directory, exist_ok=True)
+        segment = self._active_segment()
+        records = b"".join(encode_log(log) for log in logs)
+        with open(os.path.join(self.directory, segment), "ab") as f:
+            offset = f.tell()
+            f.write(records)
+        # The records are on disk before the index points at them
+        chunks = []
+        for chunk in self.chunks:
+            if chunk.to_block < from_block or chunk.from_block > to_block:
+                chunks.append(chunk)
+                continue
+            if chunk.from_block < from_block:
+                chunks.append(chunk._replace(to_block=from_block - 1))
+            if chunk.to_block > to_block:
+                chunks.append(chunk._replace(from_block=to_block + 1))
+        chunks.append(Chunk(segment, offset, len(records), from_block, to_block))
+        self.chunks = sorted(chunks, key=lambda chunk: chunk.from_block)
+        self._save_index()
+        self._remove_unused_segments(segment)
+        return len(records)
+
+    def _remove_unused_segments(self, active: str):
+        used = {chunk.segment for chunk in self.chunks} | {active}
+        for name in os.listdir(self.directory):
+            if name.endswith(".log") and name not in used:
+                os.remove(os.path.join(self.directory, name))
+
+    def read(self, from_block: int, to_block: int) -> Iterator[List[Dict]]:
+        """The stored logs of a block range in block order, one stored chunk at a time"""
+        for chunk in self.chunks:
+            if chunk.to_block < from_block or chunk.from_block > to_block or not chunk.length:
+                continue
+            with open(os.path.join(self.directory, chunk.segment), "rb") as f:
+                f.seek(chunk.offset)
+                buffer = f.read(chunk.length)
+            low, high = max(from_block, chunk.from_block), min(to_block, chunk.to_block)
+            logs = [log for block, log in decode_records(buffer) if low <= block <= high]
+            if logs:
+                yield logs
+
+    def covered_until(self, from_block: int) -> int:
+        """Last block of the stored range that starts at from_block, from_block - 1 if none"""
+        covered = from_block - 1
+        for chunk in self.chunks:
+            if chunk.to_block <= covered:
+                continue
+            if chunk.from_block > covered + 1:
+                break
+            covered = chunk.to_block
+        return covered
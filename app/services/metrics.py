@@ -0,0 +1,210 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+import asyncio
+import os
+import time
+
+# All updates happen on the event loop thread, so plain dict and list arithmetic is
+# race-free without locks. Histograms store per-bucket counts and are only made
+# cumulative when rendered, so an observation costs one bisect and two additions.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, *label_values: str, value: float):
+        self.values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for label_values, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, *label_values: str, value: float):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, inf)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+class UpstreamCall:
+    """Handle yielded by track_upstream; set `status` to the HTTP status of the response"""
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status = None
+
+class MetricsService:
+    def __init__(self):
+        self.SNAPSHOT_FILE = "leaderboard.snapshot"
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "API request latency by route", ("method", "route", "status")
+        )
+        self.upstream_duration = Histogram(
+            "upstream_request_duration_seconds", "Upstream call latency", ("upstream",)
+        )
+        self.upstream_requests = Counter(
+            "upstream_requests_total", "Upstream calls by outcome", ("upstream", "status")
+        )
+        self.stage_duration = Gauge(
+            "pipeline_stage_duration_seconds", "Duration of each stage in the latest pipeline run", ("pipeline", "stage")
+        )
+        self.pipeline_duration = Gauge(
+            "pipeline_duration_seconds", "Wall time of the latest pipeline run", ("pipeline",)
+        )
+        self.response_cache_requests = Counter(
+            "response_cache_requests_total", "Cached read requests by outcome: hit, coalesced or rendered", ("outcome",)
+        )
+        self.stream_subscribers = Gauge("stream_subscribers", "Clients connected to /stream in this worker")
+        self.stream_events = Counter(
+            "stream_events_total", "Events pushed to /stream subscribers by event, and subscribers dropped for lagging", ("event",)
+        )
+        self.collectors: List[Callable[[], List[str]]] = [self._collect_snapshot]
+
+    def observe_upstream(self, upstream: str, status: str, duration: float):
+        self.upstream_duration.observe(upstream, value=duration)
+        self.upstream_requests.inc(upstream, status)
+
+    @contextmanager
+    def track_upstream(self, upstream: str):
+        """
+        Time an upstream call. The outcome is the status set on the yielded handle,
+        "timeout"/"error" if the block raises, or "ok".
+        """
+        call = UpstreamCall()
+        start = time.perf_counter()
+        try:
+            yield call
+        except asyncio.TimeoutError:
+            call.status = call.status or "timeout"
+            raise
+        except Exception:
+            call.status = call.status or "error"
+            raise
+        finally:
+            self.observe_upstream(upstream, str(call.status or "ok"), time.perf_counter() - start)
+
+    def observe_pipeline(self, pipeline: str, stage_durations: Dict[str, float], duration: float):
+        for stage, stage_duration in stage_durations.items():
+            self.stage_duration.set(pipeline, stage, value=stage_duration)
+        self.pipeline_duration.set(pipeline, value=duration)
+
+    def _collect_snapshot(self) -> List[str]:
+        try:
+            stat = os.stat(self.SNAPSHOT_FILE)
+        except FileNotFoundError:
+            return []
+        return [
+            "# HELP snapshot_age_seconds Seconds since the leaderboard snapshot was published",
+            "# TYPE snapshot_age_seconds gauge",
+            f"snapshot_age_seconds {time.time() - stat.st_mtime}",
+            "# HELP snapshot_size_bytes Size of the published leaderboard snapshot",
+            "# TYPE snapshot_size_bytes gauge",
+            f"snapshot_size_bytes {stat.st_size}",
+        ]
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in (
+            self.request_duration,
+            self.upstream_duration,
+            self.upstream_requests,
+            self.stage_duration,
+            self.pipeline_duration,
+            self.response_cache_requests,
+            self.stream_subscribers,
+            self.stream_events,
+        ):
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            metrics_service.request_duration.observe(
+                scope["method"], route_path, str(status), value=time.perf_counter() - start
+            )
+
+# Create a singleton instance
+metrics_service = MetricsService()
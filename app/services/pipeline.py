@@ -0,0 +1,123 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import inspect
+import time
+from .checkpoint import RunCheckpoint
+from .metrics import metrics_service
+from .tracing import tracer
+
+@dataclass
+class Stage:
+    """
+    A pipeline step. `func` is called with the outputs of the stages named in
+    `inputs`, in that order, and may be a plain function or a coroutine.
+    Stages marked `checkpoint` persist their output and are skipped when resuming a run.
+    """
+    name: str
+    func: Callable[..., Any]
+    inputs: List[str] = field(default_factory=list)
+    checkpoint: bool = False
+
+@dataclass
+class StageTiming:
+    started: float  # Seconds since the pipeline started
+    duration: float
+
+class Pipeline:
+    def __init__(self, name: str, stages: List[Stage], checkpoint: Optional[RunCheckpoint] = None):
+        self.name = name
+        self.checkpoint = checkpoint
+        self.resumed_stages: List[str] = []
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self.stages[stage.name] = stage
+        self.order = self._topological_order()
+        self.timings: Dict[str, StageTiming] = {}
+        self.duration = 0.0
+
+    def _topological_order(self) -> List[str]:
+        """Order stages so every stage comes after its inputs, rejecting unknown inputs and cycles"""
+        order = []
+        state = {}  # name -> "visiting" | "done"
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Cycle in pipeline {self.name}: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            for dep in self.stages[name].inputs:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+                visit(dep, path + [name])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every stage as soon as its inputs are available and return all stage outputs.
+        If a stage fails, the error is re-raised once every independent stage has finished.
+        """
+        self.timings = {}
+        self.resumed_stages = []
+        pipeline_start = time.monotonic()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: Stage):
+            if stage.checkpoint and self.checkpoint is not None and self.checkpoint.has(stage.name):
+                self.resumed_stages.append(stage.name)
+                return self.checkpoint.load(stage.name)
+
+            args = [await tasks[dep] for dep in stage.inputs]
+            stage_start = time.monotonic()
+            with tracer.span(stage.name, stage=True):
+                result = stage.func(*args)
+                if inspect.isawaitable(result):
+                    result = await result
+                if stage.checkpoint and self.checkpoint is not None:
+                    self.checkpoint.save(stage.name, result)
+            self.timings[stage.name] = StageTiming(
+                started=stage_start - pipeline_start,
+                duration=time.monotonic() - stage_start
+            )
+            return result
+
+        # Creating tasks in dependency order guarantees every input task exists
+        for name in self.order:
+            tasks[name] = asyncio.create_task(run_stage(self.stages[name]), name=f"{self.name}:{name}")
+
+        # Stages that don't depend on a failed stage still run to completion so their
+        # checkpoints are saved; stages downstream of it fail with the same error
+        try:
+            results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            self.duration = time.monotonic() - pipeline_start
+            metrics_service.observe_pipeline(
+                self.name,
+                {name: timing.duration for name, timing in self.timings.items()},
+                self.duration
+            )
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return dict(zip(tasks.keys(), results))
+
+    def timing_report(self) -> str:
+        """Human readable per-stage timing summary"""
+        lines = []
+        for name in sorted(self.timings, key=lambda n: self.timings[n].started):
+            timing = self.timings[name]
+            lines.append(f"- {name}: {timing.duration:.2f}s (started at +{timing.started:.2f}s)")
+        for name in self.resumed_stages:
+            lines.append(f"- {name}: restored from checkpoint")
+        total_stage_time = sum(t.duration for t in self.timings.values())
+        lines.append(f"Wall time: {self.duration:.2f}s (sum of stages: {total_stage_time:.2f}s)")
+        return "\n".join(lines)
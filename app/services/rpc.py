@@ -0,0 +1,347 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import asyncio
+import json
+import os
+import random
+import time
+import aiohttp
+from .http import http_service
+from .metrics import metrics_service
+from .tracing import tracer
+from ..constants import ALCHEMY_BASE_URL, PROVIDER_URL, PROVIDER_URL_BASE
+
+RPC_ENDPOINTS_FILE = os.getenv("RPC_ENDPOINTS_FILE")
+
+class Endpoint(NamedTuple):
+    """A JSON-RPC provider for one network and the capabilities it declares"""
+    name: str  # Upstream label in the metrics
+    network: str  # Alchemy network name, e.g. eth-mainnet
+    url: str  # {VARIABLE} placeholders are filled from the environment on first use
+    max_log_range: int = 0  # Blocks per eth_getLogs call, 0 for no limit
+    max_batch: int = 1  # Calls per JSON-RPC batch request, 1 without batch support
+    max_concurrency: int = 10
+    requests_per_second: float = 25
+
+def default_endpoints() -> Tuple[Endpoint, ...]:
+    """Alchemy first, then the public RPC provider, on both networks"""
+    def alchemy(network: str) -> str:
+        return f"{ALCHEMY_BASE_URL.format(network=network)}/v2/{{ALCHEMY_API_KEY}}"
+    return (
+        Endpoint("alchemy", "eth-mainnet", alchemy("eth-mainnet"), 0, 10, 10, 25),
+        Endpoint("rpc", "eth-mainnet", PROVIDER_URL, 50_000, 10, 10, 10),
+        Endpoint("alchemy", "base-mainnet", alchemy("base-mainnet"), 0, 10, 10, 25),
+        Endpoint("rpc", "base-mainnet", PROVIDER_URL_BASE, 50_000, 10, 10, 10),
+    )
+
+def load_endpoints(path: str) -> Tuple[Endpoint, ...]:
+    """Endpoints from a JSON list of objects with the Endpoint fields"""
+    with open(path, "r") as f:
+        return tuple(Endpoint(**entry) for entry in json.load(f))
+
+class LogRangeTooLarge(Exception):
+    """The provider refused a block range, usually because it holds too many logs"""
+
+class RpcError(Exception):
+    """A JSON-RPC error response"""
+    def __init__(self, error: Dict):
+        super().__init__(str(error.get("message", error)))
+        self.error = error
+
+class EndpointUnavailable(Exception):
+    """An endpoint failed, timed out or is rate limited; the call moves to another one"""
+
+class RateLimiter:
+    """Spaces out calls so that at most `rate` start per second"""
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_slot = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        delay = self.next_slot - now
+        self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class EndpointHealth:
+    """Moving averages of an endpoint's latency per method and failures, and its rate-limit state"""
+    ALPHA = 0.2  # Weight of the latest observation
+    INITIAL_LATENCY = 0.5  # Seconds, until an endpoint has answered a method
+
+    def __init__(self, endpoint: Endpoint):
+        self.endpoint = endpoint
+        self.latencies: Dict[str, float] = {}
+        self.error_rate = 0.0
+        self.limited_until = 0.0
+        self.in_flight = 0
+
+    def latency(self, method: str) -> float:
+        return self.latencies.get(method, self.INITIAL_LATENCY)
+
+    def observe(self, method: str, latency: float, ok: bool):
+        previous = self.latency(method)
+        if ok or latency > previous:
+            self.latencies[method] = previous + self.ALPHA * (latency - previous)
+        self.error_rate += self.ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def rate_limited(self, retry_after: float):
+        self.limited_until = max(self.limited_until, time.monotonic() + retry_after)
+
+    def available(self) -> bool:
+        return self.limited_until <= time.monotonic()
+
+    def score(self, method: str) -> float:
+        """Expected cost of one more call; lower is healthier"""
+        load = 1 + self.in_flight / self.endpoint.max_concurrency
+        return self.latency(method) * load * (1 + 10 * self.error_rate)
+
+def _rate_limit_error(error: Dict) -> bool:
+    message = str(error.get("message", "")).lower()
+    return error.get("code") == 429 or "rate limit" in message or "too many requests" in message
+
+def _range_error(error: Dict) -> bool:
+    message = str(error.get("message", error)).lower()
+    return any(word in message for word in ("range", "exceed", "limit", "too many", "size"))
+
+class RpcPool:
+    """
+    Routes JSON-RPC calls across the endpoints configured for each network.
+    Each call goes to the healthiest endpoint that can serve it. A call that is slow
+    compared to the endpoint's usual latency is hedged on the next one, and a failed or
+    rate-limited endpoint is skipped until it recovers. Calls issued together to an
+    endpoint that supports batches share one HTTP request, which is also how log ranges
+    wider than an endpoint's max_log_range are sent to it.
+    """
+    def __init__(self, endpoints: Optional[Iterable[Endpoint]] = None):
+        self._configured = tuple(endpoints) if endpoints is not None else None
+        self._endpoints: Optional[Dict[str, List[Endpoint]]] = None
+        self.MAX_RETRIES = 5
+        self.RETRY_DELAY = 1  # Seconds, doubled on every round in which every endpoint failed
+        self.RATE_LIMIT_BACKOFF = 1  # Seconds an endpoint is skipped after a 429 without Retry-After
+        self.HEDGE_FACTOR = 3  # Hedge once a call takes this many times the endpoint's average
+        self.HEDGE_MIN_DELAY = 0.2  # Seconds
+        self.TIMEOUT = aiohttp.ClientTimeout(total=30)
+        self.health: Dict[Endpoint, EndpointHealth] = {}
+        self._loop = None
+        self._semaphores: Dict[Endpoint, asyncio.Semaphore] = {}
+        self._limiters: Dict[Endpoint, RateLimiter] = {}
+        self._queues: Dict[Endpoint, List] = {}
+
+    def endpoints(self, network: str) -> List[Endpoint]:
+        """Endpoints of a network in configured order, skipping those whose URL needs an unset variable"""
+        if self._endpoints is None:
+            configured = self._configured
+            if configured is None:
+                configured = load_endpoints(RPC_ENDPOINTS_FILE) if RPC_ENDPOINTS_FILE else default_endpoints()
+            self._endpoints = {}
+            for endpoint in configured:
+                try:
+                    endpoint = endpoint._replace(url=endpoint.url.format_map(os.environ))
+                except KeyError:
+                    continue
+                self._endpoints.setdefault(endpoint.network, []).append(endpoint)
+                self.health[endpoint] = EndpointHealth(endpoint)
+        return self._endpoints.get(network, [])
+
+    def _bind_loop(self):
+        """Semaphores and pending batches belong to one event loop; health carries over"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphores = {endpoint: asyncio.Semaphore(endpoint.max_concurrency) for endpoint in self.health}
+            self._limiters = {endpoint: RateLimiter(endpoint.requests_per_second) for endpoint in self.health}
+            self._queues = {}
+
+    async def _post(self, endpoint: Endpoint, calls: List[Tuple[str, Any]]) -> List[Dict]:
+        """One HTTP request carrying the calls, as a batch when there are several"""
+        health = self.health[endpoint]
+        payload = [{"jsonrpc": "2.0", "id": i, "method": method, "params": params} for i, (method, params) in enumerate(calls)]
+        async with self._semaphores[endpoint]:
+            await self._limiters[endpoint].wait()
+            start = time.perf_counter()
+            try:
+                with metrics_service.track_upstream(endpoint.name) as call:
+                    try:
+                        async with http_service.get_session().post(
+                            endpoint.url, json=payload if len(calls) > 1 else payload[0], timeout=self.TIMEOUT
+                        ) as resp:
+                            call.status = resp.status
+                            if resp.status == 429:
+                                health.rate_limited(float(resp.headers.get("Retry-After", 0) or 0) or self.RATE_LIMIT_BACKOFF)
+                                raise EndpointUnavailable(f"{endpoint.name} rate limited")
+                            if resp.status != 200:
+                                raise EndpointUnavailable(f"{endpoint.name} answered {resp.status}")
+                            body = await resp.read()
+                    except asyncio.CancelledError:
+                        call.status = call.status or "cancelled"  # Lost a hedge race
+                        raise
+                data = json.loads(body)
+            except (EndpointUnavailable, aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                for method, _ in calls:
+                    health.observe(method, time.perf_counter() - start, ok=False)
+                if isinstance(e, EndpointUnavailable):
+                    raise
+                raise EndpointUnavailable(f"{endpoint.name}: {e!r}") from e
+        for method, _ in calls:
+            health.observe(method, time.perf_counter() - start, ok=True)
+        tracer.add("bytes", len(body))
+        if isinstance(data, dict):
+            if len(calls) > 1:
+                raise EndpointUnavailable(f"{endpoint.name} refused a batch: {data.get('error', data)}")
+            data = [data]
+        responses = {response.get("id"): response for response in data}
+        return [responses.get(i, {"error": {"message": "Missing from the batch response"}}) for i in range(len(calls))]
+
+    def _enqueue(self, endpoint: Endpoint, method: str, params: Any) -> asyncio.Future:
+        """Add a call to the endpoint's next batch, sent once the current event loop step ends"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.setdefault(endpoint, [])
+        queue.append((method, params, future))
+        if len(queue) == 1:
+            loop.call_soon(self._flush, endpoint)
+        return future
+
+    def _flush(self, endpoint: Endpoint):
+        queue = self._queues.pop(endpoint, [])
+        for start in range(0, len(queue), endpoint.max_batch):
+            entries = queue[start:start + endpoint.max_batch]
+            task = asyncio.ensure_future(self._send_batch(endpoint, entries))
+
+            def abandon(_, entries=entries, task=task):
+                # Nobody waits for this batch any more, e.g. every call in it lost a hedge race
+                if all(future.cancelled() for _, _, future in entries):
+                    task.cancel()
+
+            for _, _, future in entries:
+                future.add_done_callback(abandon)
+
+    async def _send_batch(self, endpoint: Endpoint, entries: List):
+        entries = [entry for entry in entries if not entry[2].done()]  # Drop cancelled hedges
+        if not entries:
+            return
+        try:
+            responses = await self._post(endpoint, [(method, params) for method, params, _ in entries])
+        except EndpointUnavailable as e:
+            for _, _, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), response in zip(entries, responses):
+            if not future.done():
+                future.set_result(response)
+
+    def _capable(self, endpoint: Endpoint, blocks: int) -> bool:
+        """Whether the endpoint serves a log range of this size, split into at most one batch"""
+        return not endpoint.max_log_range or -(-blocks // endpoint.max_log_range) <= endpoint.max_batch
+
+    def _split(self, endpoint: Endpoint, method: str, params: Any, blocks: int) -> List[Tuple[str, Any]]:
+        """The calls an endpoint needs for one call, splitting log ranges wider than it serves"""
+        if method != "eth_getLogs" or not endpoint.max_log_range or blocks <= endpoint.max_log_range:
+            return [(method, params)]
+        log_filter = params[0]
+        start, end = int(log_filter["fromBlock"], 16), int(log_filter["toBlock"], 16)
+        return [
+            (method, [dict(log_filter, fromBlock=hex(block), toBlock=hex(min(block + endpoint.max_log_range - 1, end)))])
+            for block in range(start, end + 1, endpoint.max_log_range)
+        ]
+
+    async def _attempt(self, endpoint: Endpoint, method: str, params: Any, blocks: int) -> Dict:
+        calls = self._split(endpoint, method, params, blocks)
+        health = self.health[endpoint]
+        health.in_flight += 1
+        try:
+            if endpoint.max_batch > 1:
+                responses = await asyncio.gather(*[self._enqueue(endpoint, *call) for call in calls])
+            else:
+                responses = await self._post(endpoint, calls)
+        finally:
+            health.in_flight -= 1
+        for response in responses:
+            if "error" in response:
+                if _rate_limit_error(response["error"]):
+                    health.rate_limited(self.RATE_LIMIT_BACKOFF)
+                    raise EndpointUnavailable(f"{endpoint.name} rate limited")
+                return response
+        if len(responses) == 1:
+            return responses[0]
+        return {"result": [log for response in responses for log in response.get("result") or []]}
+
+    async def _race(self, endpoints: List[Endpoint], method: str, params: Any, blocks: int) -> Optional[Dict]:
+        """
+        First response from the endpoints in order of health, moving on when one fails and
+        hedging once when the first is slow; None when every endpoint failed or is rate limited.
+        """
+        remaining = sorted(
+            (endpoint for endpoint in endpoints if self.health[endpoint].available()),
+            key=lambda endpoint: self.health[endpoint].score(method)
+        )
+        attempts: Dict[asyncio.Future, Endpoint] = {}
+        hedged = failed = False
+        try:
+            while remaining or attempts:
+                if not attempts:
+                    if failed:
+                        tracer.add("failovers")
+                    primary = remaining.pop(0)
+                    attempts[asyncio.ensure_future(self._attempt(primary, method, params, blocks))] = primary
+                hedge_delay = None
+                if not hedged and remaining:
+                    hedge_delay = max(self.HEDGE_MIN_DELAY, self.HEDGE_FACTOR * self.health[primary].latency(method))
+                done, _ = await asyncio.wait(attempts, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    tracer.add("hedges")
+                    endpoint = remaining.pop(0)
+                    attempts[asyncio.ensure_future(self._attempt(endpoint, method, params, blocks))] = endpoint
+                    continue
+                for task in done:
+                    del attempts[task]
+                    try:
+                        return task.result()
+                    except EndpointUnavailable:
+                        failed = True
+            return None
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def call(self, network: str, method: str, params: Any, blocks: int = 0) -> Dict:
+        """
+        The JSON-RPC response to one call. `blocks` is the size of an eth_getLogs range; an
+        endpoint with a smaller max_log_range gets it split into one batch of narrower calls.
+        """
+        endpoints = self.endpoints(network)
+        self._bind_loop()
+        if not endpoints:
+            raise RuntimeError(f"No RPC endpoints configured for {network}")
+        capable = [endpoint for endpoint in endpoints if self._capable(endpoint, blocks)]
+        if not capable:
+            raise LogRangeTooLarge(f"No {network} endpoint serves {blocks} blocks per call")
+        delay = self.RETRY_DELAY
+        for attempt in range(self.MAX_RETRIES + 1):
+            response = await self._race(capable, method, params, blocks)
+            if response is not None:
+                return response
+            # Endpoints with a smaller range limit can still take the range once it is split
+            if any(self.health[endpoint].available() for endpoint in endpoints if endpoint not in capable):
+                raise LogRangeTooLarge(f"No {network} endpoint available for {blocks} blocks per call")
+            if attempt == self.MAX_RETRIES:
+                break
+            tracer.add("retries")
+            limited_for = min(self.health[endpoint].limited_until for endpoint in capable) - time.monotonic()
+            await asyncio.sleep(max(limited_for, delay) * (1 + random.random() / 4))
+            delay *= 2
+        raise RuntimeError(f"{method} on {network} failed on every endpoint after {self.MAX_RETRIES} retries")
+
+    async def request(self, network: str, method: str, params: Any, blocks: int = 0) -> Any:
+        """The result of one call; JSON-RPC errors raise RpcError, or LogRangeTooLarge for refused log ranges"""
+        response = await self.call(network, method, params, blocks)
+        if "error" in response:
+            if method == "eth_getLogs" and _range_error(response["error"]):
+                raise LogRangeTooLarge(str(response["error"].get("message", response["error"])))
+            raise RpcError(response["error"])
+        return response.get("result")
+
+# Create a singleton instance
+rpc_pool = RpcPool()
@@ -2,86 +2,232 @@ from .blockchain import blockchain_service
 from .cache import cache_service
 from .logging_service import logging_service
 from .dune import dune_service
-from apscheduler.schedulers.background import BackgroundScheduler
+from .indexer import indexer_service
+from .pipeline import Pipeline, Stage
+from .checkpoint import checkpoint_service, RunCheckpoint
+from .filelock import FileLock
+from .snapshot import snapshot_service
+from .storage import storage_service
+from .history import history_service
+from .boosters import normalize_boosters
+from .tracing import tracer
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
-import json
+import asyncio
 import datetime
+import functools
+import os
+from typing import Optional
 
 load_dotenv()
 
+# Start the daily update job from the app lifespan unless disabled
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Where the address set comes from: "chain" scans the staking contracts' logs, "dune" uses the Dune query
+ADDRESS_SOURCE = os.getenv("ADDRESS_SOURCE", "chain").lower()
+
+UPDATE_JOB_ID = "update_interacting_addresses"
+LEADER_JOB_ID = "leader_election"
+
 class SchedulerService:
     def __init__(self):
-        self.scheduler = BackgroundScheduler()
+        self.MISFIRE_GRACE_TIME = 60 * 60  # Still run a missed job if we are less than 1 hour late
+        # Jobs run as coroutines on the server's event loop; missed runs are coalesced into one
+        self.scheduler = AsyncIOScheduler(job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": self.MISFIRE_GRACE_TIME,
+        })
         self.ETH_NETWORK = "eth-mainnet"
         self.BASE_NETWORK = "base-mainnet"
+        self.update_lock = asyncio.Lock()
+        # With several workers, only the holder of the leader lock schedules updates and
+        # the run lock keeps manual runs in different workers from overlapping
+        self.leader_lock = FileLock("scheduler.lock")
+        self.run_lock = FileLock("update.lock")
+        self.LEADER_RETRY_INTERVAL = 60  # Seconds between attempts to take over from a dead leader
+        self.last_run = None
+        self.current_run_id = None
 
-    async def update_interacting_addresses(self):
+    def is_update_running(self) -> bool:
+        """Whether an update run currently holds the job mutex, in this or another worker"""
+        return self.update_lock.locked() or self.run_lock.held_elsewhere()
+
+    async def run_update(self, trigger: str = "manual", run_id: Optional[str] = None) -> bool:
         """
-        1) Fetch interacting addresses from Dune.
-        2) Fetch cache data for the addresses.
-        3) Add avatar count to the data.
-        4) Save to JSON.
-        5) Recalculate percentages and sort
-        6) Update ENS names
+        Run update_interacting_addresses under the per-job mutex.
+        Pass run_id to retry a specific checkpointed run.
+        Returns False without doing anything if another run is already in progress.
         """
-        task_name = "update_interacting_addresses"
-        logging_service.start_timer(task_name)
-        
-        start_time = datetime.datetime.now()
-        await logging_service.log(f"🕒 Starting update at {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-        await logging_service.log("Step 1: Fetching interacting addresses from Dune...")
+        if self.update_lock.locked() or not self.run_lock.acquire(blocking=False):
+            await logging_service.log(f"⏭️ Skipping {trigger} update: another update is already running")
+            return False
+
+        async with self.update_lock:
+            self.current_run_id = None
+            run = {
+                "run_id": run_id,
+                "trigger": trigger,
+                "started": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "ended": None,
+                "status": "running",
+                "error": None,
+            }
+            self.last_run = run
+            try:
+                await self.update_interacting_addresses(run_id)
+                run["status"] = "success"
+            except Exception as e:
+                run["status"] = "failed"
+                run["error"] = str(e)
+                await logging_service.add_error("Update Run", trigger, str(e))
+                await logging_service.log(f"Critical error during {trigger} update: {e}")
+            finally:
+                self.run_lock.release()
+                run["run_id"] = self.current_run_id
+                run["ended"] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return True
 
-        # Fetch addresses from Dune
-        merged_addresses = await dune_service.get_interacting_addresses()
-            
-        await logging_service.log(f"Dune returned {len(merged_addresses)} addresses.")
+    async def _stage_addresses(self):
+        if ADDRESS_SOURCE == "chain":
+            try:
+                return await indexer_service.get_interacting_addresses()
+            except Exception as e:
+                await logging_service.add_error("Chain Indexer", "global", str(e))
+                await logging_service.log(f"Chain indexer failed, falling back to Dune: {e}")
+        return await dune_service.get_interacting_addresses()
 
-        # Step 3: Fetch wayfinder data for the merged addresses
+    async def _stage_wayfinder(self, addresses, checkpoint: Optional[RunCheckpoint] = None):
+        await logging_service.log(f"Found {len(addresses)} interacting addresses.")
         await logging_service.log("Fetching wayfinder data for addresses...")
-        wayfinder_data = await cache_service.fetch_wayfinder_data(list(merged_addresses))
+        wayfinder_data = await cache_service.fetch_wayfinder_data(list(addresses), checkpoint)
         valid_wayfinder_data = [item for item in wayfinder_data if item["data"] is not None]
+        tracer.current().set(addresses=len(addresses), valid=len(valid_wayfinder_data))
         await logging_service.log(f"Retrieved wayfinder data for {len(valid_wayfinder_data)} addresses (non-empty data).")
+        return valid_wayfinder_data
 
+    def _stage_save(self, addresses_data, ens_data):
+        written = storage_service.save_addresses(addresses_data)
+        tracer.current().set(records_written=written)
+        snapshot = snapshot_service.publish(addresses_data, ens_data or {})
+        history_service.append_run(addresses_data, snapshot.version)
 
-        # Step 4: Add avatar count to the data
-        await logging_service.log("Getting avatar count for addresses...")
-        valid_wayfinder_data = await blockchain_service.get_avatar_count(valid_wayfinder_data)
+    def build_update_pipeline(self, checkpoint: Optional[RunCheckpoint] = None) -> Pipeline:
+        """
+        Stages of an address update and the outputs each one needs.
+        The address set, the avatar NFT owners and the ENS cache are independent, so they load concurrently.
+        Upstream-bound stages are checkpointed so a retried run doesn't repeat them.
+        """
+        return Pipeline("update_interacting_addresses", [
+            Stage("addresses", self._stage_addresses, checkpoint=True),
+            Stage("avatar_balances", blockchain_service.fetch_avatar_balances, checkpoint=True),
+            Stage("ens_cache", blockchain_service.load_ens_cache),
+            Stage(
+                "wayfinder",
+                functools.partial(self._stage_wayfinder, checkpoint=checkpoint),
+                inputs=["addresses"],
+                checkpoint=True
+            ),
+            Stage("normalize", normalize_boosters, inputs=["wayfinder"]),
+            Stage("avatars", blockchain_service.apply_avatar_counts, inputs=["normalize", "avatar_balances"]),
+            Stage("scoring", blockchain_service.calculate_and_sort_addresses, inputs=["avatars"]),
+            Stage("ens", blockchain_service.add_ens_names, inputs=["scoring", "ens_cache"]),
+            Stage("save", self._stage_save, inputs=["ens", "ens_cache"]),
+        ], checkpoint=checkpoint)
 
-        # Step 5: Recalculate percentages and sort
-        valid_wayfinder_data = blockchain_service.calculate_and_sort_addresses(valid_wayfinder_data)
+    @tracer.traced()
+    async def update_interacting_addresses(self, run_id: Optional[str] = None):
+        """
+        Run the update pipeline, resuming the given or the latest unfinished run from its checkpoints:
+        1) Fetch interacting addresses from both chains (or Dune), avatar NFT owners and the ENS cache concurrently.
+        2) Fetch cache data for the addresses and parse their boosters once.
+        3) Add avatar count to the data.
+        4) Recalculate percentages and sort.
+        5) Add ENS names.
+        6) Save to storage, publish the snapshot and append the run to the history.
+        """
+        span = tracer.current()
+        checkpoint = checkpoint_service.start_run(run_id)
+        self.current_run_id = checkpoint.run_id
+        span.set(run_id=checkpoint.run_id)
 
+        start_time = datetime.datetime.now()
+        await logging_service.log(
+            f"🕒 Starting update {checkpoint.run_id} at {start_time.strftime('%Y-%m-%d %H:%M:%S')}"
+        )
 
-        # Step 6: Update ENS names and recalculate percentages
-        await logging_service.log("\nStarting ENS names update...")
-        wayfinder_data_with_ens = await blockchain_service.add_ens_names(valid_wayfinder_data)
-        
-		# Save sorted data
-        with open("interacting_addresses.json", "w") as f:
-            json.dump(wayfinder_data_with_ens, f, indent=4)
+        pipeline = self.build_update_pipeline(checkpoint)
+        try:
+            await pipeline.run()
+        except Exception as e:
+            checkpoint.fail(str(e))
+            raise
+        checkpoint.complete()
+        checkpoint_service.cleanup()
         
+        span.set(resumed_stages=pipeline.resumed_stages)
         end_time = datetime.datetime.now()
-        duration = logging_service.end_timer(task_name)
+        duration = span.elapsed
         await logging_service.log(
             f"🏁 Update Summary:\n"
             f"Started: {start_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
             f"Ended: {end_time.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            f"Duration: {duration:.2f} seconds"
+            f"Duration: {duration:.2f} seconds\n"
+            f"Stages:\n{pipeline.timing_report()}"
+        )
+
+    def _add_daily_job(self):
+        self.scheduler.add_job(
+            self.run_update,
+            'interval',
+            days=1,
+            args=["scheduled"],
+            id=UPDATE_JOB_ID,
+            replace_existing=True
         )
 
     def schedule_daily_update(self):
         """Schedule the update_interacting_addresses function to run once per day"""
-        self.scheduler.add_job(self.update_interacting_addresses, 'interval', days=1)
+        self._add_daily_job()
         self.scheduler.start()
 
+    def start_leader_election(self) -> bool:
+        """
+        Schedule the daily update in exactly one worker. The worker that gets the leader
+        lock schedules it; the others retry periodically and take over if the leader exits.
+        Returns whether this worker is the leader.
+        """
+        if self.leader_lock.acquire(blocking=False):
+            self.schedule_daily_update()
+            return True
+        self.scheduler.add_job(
+            self._try_become_leader,
+            'interval',
+            seconds=self.LEADER_RETRY_INTERVAL,
+            id=LEADER_JOB_ID,
+            replace_existing=True
+        )
+        self.scheduler.start()
+        return False
+
+    async def _try_become_leader(self):
+        if self.leader_lock.acquire(blocking=False):
+            self.scheduler.remove_job(LEADER_JOB_ID)
+            self._add_daily_job()
+            await logging_service.log(f"👑 Worker {os.getpid()} took over scheduling updates")
+
     def schedule_test_update(self, interval_seconds=300):
         """
         Schedule updates with a custom interval for testing purposes.
         Default is 5 minutes (300 seconds).
         """
         self.scheduler.add_job(
-            self.update_interacting_addresses, 
+            self.run_update, 
             'interval', 
             seconds=interval_seconds,
+            args=["scheduled"],
+            id=UPDATE_JOB_ID,
+            replace_existing=True,
             next_run_time=datetime.datetime.now()  # Run immediately
         )
         self.scheduler.start()
@@ -89,7 +235,8 @@ class SchedulerService:
 
     def stop_scheduler(self):
         """Stop the scheduler"""
-        self.scheduler.shutdown()
+        self.scheduler.shutdown(wait=False)
+        self.leader_lock.release()
         return "Scheduler stopped"
 
     def get_scheduler_status(self):
@@ -103,7 +250,11 @@ class SchedulerService:
                 "name": job.name,
                 "next_run": job.next_run_time.strftime('%Y-%m-%d %H:%M:%S') if job.next_run_time else None,
                 "interval": str(job.trigger),
-            } for job in jobs]
+            } for job in jobs],
+            "leader": self.leader_lock.locked,
+            "worker_pid": os.getpid(),
+            "update_running": self.is_update_running(),
+            "last_run": self.last_run,
         }
         return status
 
@@ -0,0 +1,44 @@
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+import asyncio
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function
+    and later callers await its result (or its exception) instead of running it again.
+    Keys are forgotten as soon as the call finishes, so nothing is cached.
+    """
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        while key in self.calls:
+            future = self.calls[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():  # This caller was cancelled, not the leader
+                    raise
+                # The leader was cancelled; the next waiter takes over
+
+        future = asyncio.get_running_loop().create_future()
+        self.calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved; the leader re-raises it
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self.calls.get(key) is future:
+                del self.calls[key]
+
+    def waiting(self, key: Hashable) -> bool:
+        return key in self.calls
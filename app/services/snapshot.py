@@ -0,0 +1,467 @@
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import math
+import mmap
+import os
+import sys
+import time
+from .filelock import FileLock
+from .boosters import BoosterTable, map_boosters
+from .storage import storage_service
+from ..models.record import RecordSummary
+
+# Snapshot file layout:
+#   MAGIC | u64 header length | JSON header | sections, each aligned to 8 bytes
+# The header lists each section's (offset, length) relative to the first section.
+# Records are stored as compact JSON in leaderboard_rank order so a page is one
+# contiguous slice; fixed-width arrays and sorted key tables index into them. A compact
+# RecordSummary of each record is stored the same way for summary responses. Boosters
+# in modifier_boost_by_badge are stored once in a table and referenced by id.
+MAGIC = b"LBSNAP\x00\x01"
+SNAPSHOT_FORMAT = 4
+MAX_SAFE_VERSION = 2 ** 53 - 1  # Versions above this lose precision as JavaScript numbers
+RANK_MISSING = 2 ** 62  # Sorts unranked records last, like float("inf") did
+# Recomputed for every record on each publish; diffs send them apart from content changes
+DERIVED_FIELDS = ("leaderboard_rank", "position", "percentage")
+
+def _score(record: Dict) -> float:
+    return sum(record.get("data", {}).get("merged_score_data", {}).values())
+
+def _pad(length: int) -> int:
+    return (8 - length % 8) % 8
+
+def _string_table(keys: List[bytes]) -> Tuple[bytes, bytes]:
+    """Concatenated strings plus u64 offsets (len + 1 entries)"""
+    offsets = array("Q", [0])
+    for key in keys:
+        offsets.append(offsets[-1] + len(key))
+    return b"".join(keys), offsets.tobytes()
+
+def _encode(value) -> bytes:
+    # Same separators as FastAPI's JSONResponse, so slices can be served as-is
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+def _encode_record(record: Dict, boosters: BoosterTable) -> Tuple[bytes, int]:
+    """
+    A record's JSON plus a hash of it without the derived fields, which tells content
+    changes from rank moves. The derived fields are appended to the encoded remainder
+    rather than encoding the record twice.
+    """
+    core_data = map_boosters(record.get("data", {}), boosters.references)
+    if core_data is record.get("data"):
+        core_data = dict(core_data)
+    derived = {k: core_data.pop(k) for k in DERIVED_FIELDS if k in core_data}
+    core = _encode(dict(record, data=core_data))
+    content_hash = int.from_bytes(hashlib.blake2b(core, digest_size=8).digest(), "little")
+    if not derived:
+        return core, content_hash
+    if core_data and next(reversed(record)) == "data":
+        # core ends with the closing braces of data and of the record
+        return core[:-2] + b"," + _encode(derived)[1:] + b"}", content_hash
+    return _encode(dict(record, data=dict(core_data, **derived))), content_hash
+
+def _optional(value, missing):
+    return missing if value is None else value
+
+def build_snapshot(path: str, addresses_data: List[Dict], ens_data: Dict[str, str], version: int) -> None:
+    """Write a snapshot of the published leaderboard and ENS map to `path`"""
+    count = len(addresses_data)
+    # Published data is in score order; reads are by leaderboard_rank, unranked last
+    ranks_in_file = []
+    for record in addresses_data:
+        rank = record.get("data", {}).get("leaderboard_rank")
+        ranks_in_file.append(rank if rank is not None else RANK_MISSING)
+    order = sorted(range(count), key=ranks_in_file.__getitem__)
+
+    boosters = BoosterTable()
+    records, content_hashes = zip(*[_encode_record(addresses_data[i], boosters) for i in order]) if count else ((), ())
+    record_data, record_offsets = _string_table(records)
+    summaries = [_encode(RecordSummary.from_record(addresses_data[i])._asdict()) for i in order]
+    scores = [_score(addresses_data[i]) for i in order]
+
+    # First occurrence in rank order wins, as in a linear search
+    rows = {}
+    for row, i in enumerate(order):
+        rows.setdefault(addresses_data[i]["address"].lower(), row)
+    address_keys = sorted(rows)
+
+    names = {address.lower(): name for address, name in ens_data.items() if isinstance(name, str)}
+    reverse = {name.lower(): address for address, name in ens_data.items() if isinstance(name, str)}
+    name_keys = sorted(names)
+    reverse_keys = sorted(reverse)
+
+    total_prime_cached = 0
+    for record in addresses_data:
+        data = record["data"]
+        total_prime_cached += data.get("prime_amount_cached", 0) + data.get("base_prime_amount_cached", 0)
+
+    sections = {}
+    sections["records"], sections["record_offsets"] = record_data, record_offsets
+    sections["summaries"], sections["summary_offsets"] = _string_table(summaries)
+    sections["ranks"] = array("q", [ranks_in_file[i] for i in order]).tobytes()
+    sections["scores"] = array("d", scores).tobytes()
+    sections["positions"] = array("I", order).tobytes()
+    sections["content_hashes"] = array("Q", content_hashes).tobytes()
+    sections["record_positions"] = array(
+        "q", [_optional(addresses_data[i]["data"].get("position"), RANK_MISSING) for i in order]
+    ).tobytes()
+    sections["percentages"] = array(
+        "d", [_optional(addresses_data[i]["data"].get("percentage"), math.nan) for i in order]
+    ).tobytes()
+    sections["sorted_scores"] = array("d", sorted(scores)).tobytes()
+    sections["address_keys"], sections["address_key_offsets"] = _string_table([k.encode() for k in address_keys])
+    sections["address_rows"] = array("I", [rows[k] for k in address_keys]).tobytes()
+    sections["ens_keys"], sections["ens_key_offsets"] = _string_table([k.encode() for k in name_keys])
+    sections["ens_values"], sections["ens_value_offsets"] = _string_table([names[k].encode() for k in name_keys])
+    sections["ens_reverse_keys"], sections["ens_reverse_key_offsets"] = _string_table([k.encode() for k in reverse_keys])
+    sections["ens_reverse_values"], sections["ens_reverse_value_offsets"] = _string_table(
+        [reverse[k].encode() for k in reverse_keys]
+    )
+    sections["ens_json"] = _encode(ens_data)
+    sections["boosters"] = _encode(boosters.boosters)
+
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        layout[name] = [offset, len(data)]
+        offset += len(data) + _pad(len(data))
+    header = _encode({
+        "format": SNAPSHOT_FORMAT,
+        "byteorder": sys.byteorder,
+        "version": version,
+        "count": count,
+        "meta": {
+            "total_score": sum(_score(record) for record in addresses_data),
+            "total_prime_cached": total_prime_cached,
+            "total_addresses": count,
+            "ens_records": len(ens_data),
+        },
+        "sections": layout,
+    })
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(array("Q", [len(header)]).tobytes())
+        f.write(header)
+        f.write(b"\0" * _pad(len(MAGIC) + 8 + len(header)))
+        for data in sections.values():
+            f.write(data)
+            f.write(b"\0" * _pad(len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+
+class _StringTable:
+    """Variable-length strings inside the snapshot; `find` binary searches sorted tables"""
+    def __init__(self, data: memoryview, offsets: memoryview):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]])
+
+    def find(self, key: bytes) -> int:
+        """Index of `key`, or -1"""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self[lo] == key else -1
+
+class Snapshot:
+    """Read-only view of a snapshot file; the mapping is shared by every process reading it"""
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a leaderboard snapshot")
+        header_length = view[len(MAGIC):len(MAGIC) + 8].cast("Q")[0]
+        header_end = len(MAGIC) + 8 + header_length
+        header = json.loads(bytes(view[len(MAGIC) + 8:header_end]))
+        if header["format"] != SNAPSHOT_FORMAT or header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written in an incompatible format")
+        base = header_end + _pad(header_end)
+
+        def section(name: str, fmt: Optional[str] = None) -> memoryview:
+            offset, length = header["sections"][name]
+            data = view[base + offset:base + offset + length]
+            return data.cast(fmt) if fmt else data
+
+        self.version: int = header["version"]
+        self.count: int = header["count"]
+        self.meta: Dict = header["meta"]
+        self._records = _StringTable(section("records"), section("record_offsets", "Q"))
+        self._summaries = _StringTable(section("summaries"), section("summary_offsets", "Q"))
+        self.ranks = section("ranks", "q")
+        self.scores = section("scores", "d")
+        self._positions = section("positions", "I")
+        self.content_hashes = section("content_hashes", "Q")
+        self.record_positions = section("record_positions", "q")
+        self.percentages = section("percentages", "d")
+        self._sorted_scores = section("sorted_scores", "d")
+        self._addresses = _StringTable(section("address_keys"), section("address_key_offsets", "Q"))
+        self._address_rows = section("address_rows", "I")
+        self._ens_keys = _StringTable(section("ens_keys"), section("ens_key_offsets", "Q"))
+        self._ens_values = _StringTable(section("ens_values"), section("ens_value_offsets", "Q"))
+        self._ens_reverse_keys = _StringTable(section("ens_reverse_keys"), section("ens_reverse_key_offsets", "Q"))
+        self._ens_reverse_values = _StringTable(section("ens_reverse_values"), section("ens_reverse_value_offsets", "Q"))
+        self.ens_json = bytes(section("ens_json"))
+        self.boosters: Dict[str, Dict] = json.loads(bytes(section("boosters")))
+
+    def record_json(self, row: int) -> bytes:
+        """Compact JSON of the record at `row` in leaderboard_rank order"""
+        return self._records[row]
+
+    def records_json(self, start: int, stop: int) -> List[bytes]:
+        return [self._records[row] for row in range(max(0, start), min(stop, self.count))]
+
+    def record(self, row: int) -> Dict:
+        return json.loads(self._records[row])
+
+    def summaries_json(self, start: int, stop: int) -> List[bytes]:
+        """Compact JSON of the RecordSummary of each row in [start, stop)"""
+        return [self._summaries[row] for row in range(max(0, start), min(stop, self.count))]
+
+    def find(self, address: str) -> Optional[int]:
+        """Row of an address (case-insensitive), or None"""
+        index = self._addresses.find(address.lower().encode())
+        return self._address_rows[index] if index >= 0 else None
+
+    def rank(self, row: int) -> Optional[int]:
+        rank = self.ranks[row]
+        return None if rank == RANK_MISSING else rank
+
+    def rows_up_to_rank(self, rank: int) -> int:
+        """Number of leading rows with a leaderboard_rank <= `rank`"""
+        return bisect_right(self.ranks, rank)
+
+    def position(self, addresses: List[str]) -> int:
+        """
+        Position of one address in the published (score) order, or of the combined score
+        of several addresses among all addresses.
+        """
+        if len(addresses) == 1:
+            row = self.find(addresses[0])
+            return self._positions[row] + 1 if row is not None else self.count
+        total_score = 0
+        for address in addresses:
+            row = self.find(address)
+            if row is not None:
+                total_score += self.scores[row]
+        higher_scores = self.count - bisect_right(self._sorted_scores, total_score)
+        return higher_scores + 1
+
+    def derived(self, row: int) -> Tuple:
+        """(leaderboard_rank, position, percentage) of a row, None where missing"""
+        position = self.record_positions[row]
+        percentage = self.percentages[row]
+        return (
+            self.rank(row),
+            None if position == RANK_MISSING else position,
+            None if math.isnan(percentage) else percentage,
+        )
+
+    def ens_name(self, address: str) -> Optional[str]:
+        index = self._ens_keys.find(address.lower().encode())
+        return self._ens_values[index].decode() if index >= 0 else None
+
+    def ens_address(self, name: str) -> Optional[str]:
+        index = self._ens_reverse_keys.find(name.lower().encode())
+        return self._ens_reverse_values[index].decode() if index >= 0 else None
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> Dict:
+    """
+    Changes from `old` to `new`, found by merging their sorted address tables:
+    added and changed records as stored JSON, removed (lowercase) addresses, and moves,
+    i.e. records whose only changes are in their derived fields.
+    """
+    added, removed, changed, moved = [], [], [], []
+    old_keys, new_keys = old._addresses, new._addresses
+    i = j = 0
+    while i < len(old_keys) or j < len(new_keys):
+        old_key = old_keys[i] if i < len(old_keys) else None
+        new_key = new_keys[j] if j < len(new_keys) else None
+        if new_key is None or (old_key is not None and old_key < new_key):
+            removed.append(old_key.decode())
+            i += 1
+            continue
+        if old_key is None or new_key < old_key:
+            added.append(new.record_json(new._address_rows[j]))
+            j += 1
+            continue
+        old_row, new_row = old._address_rows[i], new._address_rows[j]
+        i += 1
+        j += 1
+        if old.content_hashes[old_row] != new.content_hashes[new_row]:
+            changed.append(new.record_json(new_row))
+            continue
+        derived = new.derived(new_row)
+        if derived != old.derived(old_row):
+            moved.append(dict(zip(("address", "from_rank") + DERIVED_FIELDS, (new_key.decode(), old.rank(old_row)) + derived)))
+    return {"added": added, "removed": removed, "changed": changed, "moved": moved}
+
+def merge_changes(steps: List[Dict]) -> Dict:
+    """Fold consecutive diffs (records decoded) into one net delta"""
+    state: Dict[str, Tuple[str, Dict]] = {}
+    for step in steps:
+        for record in step["added"]:
+            key = record["address"].lower()
+            kind = "changed" if key in state and state[key][0] == "removed" else "added"
+            state[key] = (kind, record)
+        for key in step["removed"]:
+            if key in state and state[key][0] == "added":
+                del state[key]
+            else:
+                state[key] = ("removed", {})
+        for record in step["changed"]:
+            key = record["address"].lower()
+            kind = "added" if key in state and state[key][0] == "added" else "changed"
+            state[key] = (kind, record)
+        for move in step["moved"]:
+            key = move["address"]
+            kind, value = state.get(key, ("moved", None))
+            if kind == "moved":
+                first = value["from_rank"] if value else move["from_rank"]
+                state[key] = ("moved", dict(move, from_rank=first))
+            else:
+                # The record is sent whole, so patch its derived fields in place
+                value["data"].update({field: move[field] for field in DERIVED_FIELDS})
+    delta = {"added": [], "removed": [], "changed": [], "moved": []}
+    for key, (kind, value) in state.items():
+        delta[kind].append(key if kind == "removed" else value)
+    return delta
+
+class SnapshotService:
+    def __init__(self, storage=None):
+        self.storage = storage or storage_service
+        self.SNAPSHOT_FILE = "leaderboard.snapshot"
+        self.LOCK_FILE = "snapshot.lock"
+        self.CHANGES_DIR = "snapshot_changes"
+        self.CHANGES_RETAINED = 48  # Diffs kept for incremental sync; older clients resync fully
+        self._snapshot: Optional[Snapshot] = None
+
+    def publish(self, addresses_data: List[Dict], ens_data: Optional[Dict[str, str]] = None) -> Snapshot:
+        """
+        Write a new snapshot and atomically swap it in. Readers in every worker pick it
+        up on their next request; requests already running keep the old mapping.
+        """
+        if ens_data is None:
+            ens_data = self.storage.load_ens() or {}
+        temp_path = f"{self.SNAPSHOT_FILE}.{os.getpid()}.tmp"
+        try:
+            previous = Snapshot(self.SNAPSHOT_FILE)
+        except (FileNotFoundError, ValueError):
+            previous = None
+        build_snapshot(temp_path, addresses_data, ens_data, version=self._next_version(previous))
+        if previous is not None:
+            # Written before the swap, so any reader that sees the new version finds its diff
+            new = Snapshot(temp_path)
+            self._write_changes(previous.version, new.version, diff_snapshots(previous, new))
+        os.replace(temp_path, self.SNAPSHOT_FILE)
+        return self.current()
+
+    def _next_version(self, previous: Optional[Snapshot]) -> int:
+        """
+        Publish time in milliseconds, kept above the previous version so versions stay
+        unique and increasing. Milliseconds round-trip through a JavaScript number.
+        """
+        version = time.time_ns() // 1_000_000
+        if previous is not None and version <= previous.version <= MAX_SAFE_VERSION:
+            version = previous.version + 1
+        return version
+
+    def _write_changes(self, from_version: int, to_version: int, changes: Dict):
+        os.makedirs(self.CHANGES_DIR, exist_ok=True)
+        head = _encode({
+            "from_version": from_version,
+            "to_version": to_version,
+            "removed": changes["removed"],
+            "moved": changes["moved"],
+        })[:-1]
+        body = (
+            head + b',"added":[' + b",".join(changes["added"]) +
+            b'],"changed":[' + b",".join(changes["changed"]) + b"]}"
+        )
+        path = os.path.join(self.CHANGES_DIR, f"{from_version}-{to_version}.json")
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+
+        steps = sorted(self._change_steps().items(), key=lambda item: item[1])
+        for step_from, step_to in steps[:-self.CHANGES_RETAINED]:
+            os.remove(os.path.join(self.CHANGES_DIR, f"{step_from}-{step_to}.json"))
+
+    def _change_steps(self) -> Dict[int, int]:
+        """Retained diffs as from_version -> to_version"""
+        steps = {}
+        try:
+            names = os.listdir(self.CHANGES_DIR)
+        except FileNotFoundError:
+            return steps
+        for name in names:
+            if name.endswith(".json"):
+                from_version, _, to_version = name[:-len(".json")].partition("-")
+                steps[int(from_version)] = int(to_version)
+        return steps
+
+    def changes_since(self, version: int) -> Tuple[int, Optional[Dict]]:
+        """
+        Current version and the net delta from `version` to it, or None when `version` has
+        fallen out of the retained diffs and the client has to resync fully.
+        """
+        current = self.current().version
+        steps = self._change_steps()
+        chain = []
+        while version != current:
+            if version not in steps or len(chain) > len(steps):
+                return current, None
+            chain.append((version, steps[version]))
+            version = steps[version]
+        diffs = []
+        for step_from, step_to in chain:
+            try:
+                with open(os.path.join(self.CHANGES_DIR, f"{step_from}-{step_to}.json"), "r") as f:
+                    diffs.append(json.load(f))
+            except FileNotFoundError:  # Pruned while we were reading
+                return current, None
+        return current, merge_changes(diffs)
+
+    def is_stale(self) -> bool:
+        """Whether the snapshot is missing, in an old format or older than the stored data it is built from"""
+        try:
+            snapshot_mtime = Snapshot(self.SNAPSHOT_FILE).stat_key[1]
+        except (FileNotFoundError, ValueError):
+            return True
+        return self.storage.modified_ns() > snapshot_mtime
+
+    def ensure_current(self):
+        """Rebuild the snapshot from storage if needed; one worker builds, the rest wait"""
+        with FileLock(self.LOCK_FILE):
+            if not self.is_stale():
+                return
+            self.publish(self.storage.load_addresses())
+
+    def current(self) -> Snapshot:
+        """The latest published snapshot, re-attached whenever the file has been replaced"""
+        try:
+            stat = os.stat(self.SNAPSHOT_FILE)
+        except FileNotFoundError:
+            self.ensure_current()
+            stat = os.stat(self.SNAPSHOT_FILE)
+        if self._snapshot is None or self._snapshot.stat_key != (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            self._snapshot = Snapshot(self.SNAPSHOT_FILE)
+        return self._snapshot
+
+# Create a singleton instance
+snapshot_service = SnapshotService()
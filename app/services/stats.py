@@ -61,14 +61,16 @@ class StatsService:
                 monthly_unlocks[month_key] += float(row.get('norm_amt', 0))
         return dict(monthly_unlocks)
 
-    def calculate_stats(self, dune_rows: List[Dict]) -> CacheStats:
-        """Calculate all caching statistics from Dune query results"""
+    def calculate_stats(self, dune_rows: List[Dict], withdrawals: float = 0) -> CacheStats:
+        """
+        Calculate all caching statistics from deposit rows, decoded from the staking
+        contract's logs or returned by the Dune query, and the total $PRIME withdrawn
+        """
         if not dune_rows:
             return None
 
         # Calculate basic stats
         total_prime = sum(float(row.get('norm_amt', 0)) for row in dune_rows)
-        withdrawals = 0  # TODO: Add withdrawal calculation when available
         net_prime = total_prime - withdrawals
         
         # Calculate unique cachers
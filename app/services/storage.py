@@ -0,0 +1,259 @@
+from typing import Any, Dict, List, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+from ..models.record import RecordSummary
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+
+def _encode(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def _write_json(path: str, data: Any, **kwargs):
+    """Write atomically so readers never see a truncated file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
+def ens_changes(old: Dict[str, str], new: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """address -> new ENS name, or None where the name was removed"""
+    changes = {address: name for address, name in new.items() if old.get(address) != name}
+    changes.update({address: None for address in old.keys() - new.keys()})
+    return changes
+
+class JsonStorage:
+    """
+    The leaderboard, ENS names and upstream caches as JSON files in the working directory.
+    Every save rewrites the whole file.
+    """
+    def __init__(self):
+        self.ADDRESSES_FILE = "interacting_addresses.json"
+        self.ENS_FILE = "ens.json"
+        self.CACHE_FILE = "{key}_cache.json"
+
+    def load_addresses(self) -> List[Dict]:
+        """Records in leaderboard order; FileNotFoundError before the first save"""
+        with open(self.ADDRESSES_FILE, "r") as f:
+            return json.load(f)
+
+    def save_addresses(self, addresses_data: List[Dict]) -> int:
+        """Replace the stored records; returns the number of records written"""
+        _write_json(self.ADDRESSES_FILE, addresses_data, indent=4)
+        return len(addresses_data)
+
+    def load_ens(self) -> Optional[Dict[str, str]]:
+        """Lowercase address -> ENS name, or None before the first save"""
+        try:
+            with open(self.ENS_FILE, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_ens(self, ens_data: Dict[str, str]) -> int:
+        """Replace the ENS names and update them on the stored records"""
+        return self.update_ens(ens_changes(self.load_ens() or {}, ens_data))
+
+    def update_ens(self, changes: Dict[str, Optional[str]]) -> int:
+        """Set (or remove, for None) the ENS names of some addresses, also on their records"""
+        ens_data = self.load_ens() or {}
+        for address, name in changes.items():
+            if name is None:
+                ens_data.pop(address, None)
+            else:
+                ens_data[address] = name
+        _write_json(self.ENS_FILE, ens_data, indent=4)
+        try:
+            addresses_data = self.load_addresses()
+        except FileNotFoundError:
+            return len(changes)
+        for address_info in addresses_data:
+            address = address_info["address"].lower()
+            if address in changes:
+                if changes[address] is None:
+                    address_info["data"].pop("ens_name", None)
+                else:
+                    address_info["data"]["ens_name"] = changes[address]
+        self.save_addresses(addresses_data)
+        return len(changes)
+
+    def load_cache(self, key: str, max_age: float) -> Optional[Any]:
+        """Cached upstream data saved less than max_age seconds ago"""
+        try:
+            with open(self.CACHE_FILE.format(key=key), "r") as f:
+                cache_data = json.load(f)
+        except FileNotFoundError:
+            return None
+        if time.time() - cache_data.get("timestamp", 0) > max_age:
+            return None
+        return cache_data.get("data")
+
+    def save_cache(self, key: str, data: Any):
+        _write_json(self.CACHE_FILE.format(key=key), {"timestamp": time.time(), "data": data})
+
+    def modified_ns(self) -> int:
+        """When the leaderboard or ENS names last changed, 0 if never"""
+        modified = 0
+        for path in (self.ADDRESSES_FILE, self.ENS_FILE):
+            try:
+                modified = max(modified, os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                pass
+        return modified
+
+class SqliteStorage:
+    """
+    The same data in an embedded SQLite database in WAL mode, so every worker can read
+    while one writes. Records are indexed by address, rank, score and ENS name, and saves
+    are upserts that only write rows whose content changed.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS addresses (
+            address TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            leaderboard_rank INTEGER,
+            score REAL NOT NULL,
+            ens_name TEXT,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS addresses_position ON addresses (position);
+        CREATE INDEX IF NOT EXISTS addresses_rank ON addresses (leaderboard_rank);
+        CREATE INDEX IF NOT EXISTS addresses_score ON addresses (score);
+        CREATE INDEX IF NOT EXISTS addresses_ens_name ON addresses (ens_name);
+        CREATE TABLE IF NOT EXISTS ens (
+            address TEXT PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ens_name ON ens (name);
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            timestamp REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = "leaderboard.db"):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """One connection per thread, opened on first use"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(self.SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _touch(self, key: str):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, time.time_ns()))
+
+    def _saved(self, key: str) -> bool:
+        return self.db.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone() is not None
+
+    def _delete_missing(self, table: str, keep: List[str]) -> int:
+        """Delete the rows of `table` whose address is not in `keep`; returns the number deleted"""
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS keep (address TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM keep")
+        self.db.executemany("INSERT OR IGNORE INTO keep (address) VALUES (?)", ((address,) for address in keep))
+        deleted = self.db.execute(f"DELETE FROM {table} WHERE address NOT IN (SELECT address FROM keep)").rowcount
+        self.db.execute("DELETE FROM keep")
+        return deleted
+
+    def load_addresses(self) -> List[Dict]:
+        if not self._saved("addresses"):
+            raise FileNotFoundError(f"No addresses stored in {self.path} yet")
+        return [json.loads(record) for record, in self.db.execute("SELECT record FROM addresses ORDER BY position")]
+
+    def save_addresses(self, addresses_data: List[Dict]) -> int:
+        rows = []
+        for position, address_info in enumerate(addresses_data):
+            summary = RecordSummary.from_record(address_info)
+            rows.append((
+                address_info["address"].lower(), position, summary.leaderboard_rank,
+                summary.score, summary.ens_name, _encode(address_info)
+            ))
+        with self.db:
+            written = self.db.executemany(
+                """
+                INSERT INTO addresses (address, position, leaderboard_rank, score, ens_name, record)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (address) DO UPDATE SET
+                    position = excluded.position,
+                    leaderboard_rank = excluded.leaderboard_rank,
+                    score = excluded.score,
+                    ens_name = excluded.ens_name,
+                    record = excluded.record
+                WHERE record != excluded.record OR position != excluded.position
+                """,
+                rows
+            ).rowcount
+            written += self._delete_missing("addresses", [row[0] for row in rows])
+            if written or not self._saved("addresses"):
+                self._touch("addresses")
+        return written
+
+    def load_ens(self) -> Optional[Dict[str, str]]:
+        if not self._saved("ens"):
+            return None
+        return dict(self.db.execute("SELECT address, name FROM ens"))
+
+    def save_ens(self, ens_data: Dict[str, str]) -> int:
+        return self.update_ens(ens_changes(self.load_ens() or {}, ens_data))
+
+    def update_ens(self, changes: Dict[str, Optional[str]]) -> int:
+        with self.db:
+            for address, name in changes.items():
+                if name is None:
+                    self.db.execute("DELETE FROM ens WHERE address = ?", (address,))
+                    self.db.execute(
+                        "UPDATE addresses SET ens_name = NULL, record = json_remove(record, '$.data.ens_name') "
+                        "WHERE address = ?",
+                        (address,)
+                    )
+                else:
+                    self.db.execute("INSERT OR REPLACE INTO ens (address, name) VALUES (?, ?)", (address, name))
+                    self.db.execute(
+                        "UPDATE addresses SET ens_name = ?1, record = json_set(record, '$.data.ens_name', ?1) "
+                        "WHERE address = ?2",
+                        (name, address)
+                    )
+            self._touch("ens")
+        return len(changes)
+
+    def load_cache(self, key: str, max_age: float) -> Optional[Any]:
+        row = self.db.execute("SELECT timestamp, data FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[0] > max_age:
+            return None
+        return json.loads(row[1])
+
+    def save_cache(self, key: str, data: Any):
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO cache (key, timestamp, data) VALUES (?, ?, ?)",
+                (key, time.time(), _encode(data))
+            )
+
+    def modified_ns(self) -> int:
+        row = self.db.execute("SELECT MAX(value) FROM meta WHERE key IN ('addresses', 'ens')").fetchone()
+        return row[0] or 0
+
+def create_storage(backend: str):
+    """Storage for a STORAGE_BACKEND value: "json" (default) or "sqlite" """
+    if backend == "json":
+        return JsonStorage()
+    if backend == "sqlite":
+        return SqliteStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected 'json' or 'sqlite'")
+
+# Create a singleton instance
+storage_service = create_storage(STORAGE_BACKEND)
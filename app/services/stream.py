@@ -0,0 +1,162 @@
+from typing import Dict, FrozenSet, List, Optional, Set
+import asyncio
+import json
+from .metrics import metrics_service
+from .snapshot import snapshot_service
+
+GLOBAL_FIELDS = ("total_score", "total_prime_cached", "total_addresses")  # As /get_global_data returns them
+CHANGE_KINDS = ("added", "changed", "removed", "moved")
+
+def format_event(event: str, data: Dict, event_id: Optional[int] = None) -> bytes:
+    """One server-sent event; the id lets a reconnecting client resume with Last-Event-ID"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'), ensure_ascii=False)}\n\n".encode()
+
+def global_data(snapshot) -> Dict:
+    return {field: snapshot.meta[field] for field in GLOBAL_FIELDS}
+
+def filter_changes(changes: Dict, addresses: FrozenSet[str]) -> Dict:
+    """The part of a delta that concerns some (lowercase) addresses"""
+    def address(entry) -> str:
+        return entry.lower() if isinstance(entry, str) else entry["address"].lower()
+    return {kind: [entry for entry in changes[kind] if address(entry) in addresses] for kind in CHANGE_KINDS}
+
+class Subscription:
+    """One connected client: the events it asked for and its queue of encoded events"""
+    __slots__ = ("changes", "addresses", "queue")
+
+    def __init__(self, changes: bool = False, addresses: Optional[FrozenSet[str]] = None, size: int = 16):
+        self.changes = changes  # Whole deltas
+        self.addresses = addresses  # Deltas of these addresses only
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+class StreamService:
+    """
+    Pushes snapshot updates to server-sent event subscribers. One task per worker watches
+    the published snapshot; when a new version appears it encodes each event once and
+    hands the same bytes to every subscriber's queue, so an idle connection costs a queue.
+    A subscriber that falls too far behind is disconnected and resumes with Last-Event-ID.
+    """
+    def __init__(self, snapshots=None):
+        self.snapshots = snapshots or snapshot_service
+        self.POLL_INTERVAL = 1  # Seconds between checks of the published snapshot
+        self.HEARTBEAT_INTERVAL = 15  # Seconds of silence before a keep-alive comment
+        self.QUEUE_SIZE = 16  # Events buffered per subscriber
+        self.subscribers: Set[Subscription] = set()
+        self.version: Optional[int] = None
+        self._global: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._idle = 0.0
+
+    def subscribe(self, changes: bool = False, addresses: Optional[FrozenSet[str]] = None) -> Subscription:
+        subscription = Subscription(changes, addresses, self.QUEUE_SIZE)
+        self.subscribers.add(subscription)
+        metrics_service.stream_subscribers.set(value=len(self.subscribers))
+        if self._task is None or self._task.done():
+            self._reset()
+            self._task = asyncio.ensure_future(self._watch())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        metrics_service.stream_subscribers.set(value=len(self.subscribers))
+
+    def initial_events(self, subscription: Subscription, since: Optional[int] = None) -> List[bytes]:
+        """The current version and totals, and the changes a reconnecting client missed"""
+        try:
+            snapshot = self.snapshots.current()
+        except FileNotFoundError:  # Nothing published yet; the first publish is pushed
+            return []
+        events = [
+            format_event("version", {"version": snapshot.version}, snapshot.version),
+            format_event("global", global_data(snapshot)),
+        ]
+        if since is not None and since != snapshot.version and (subscription.changes or subscription.addresses):
+            events.extend(self._change_events(since, [subscription]).values())
+        return events
+
+    def _change_events(self, since: int, subscribers: List[Subscription]) -> Dict[Subscription, bytes]:
+        """The delta since a version for each subscriber, encoded once for all whole-delta subscribers"""
+        version, changes = self.snapshots.changes_since(since)
+        if changes is None:
+            event = format_event("resync", {"version": version, "since": since}, version)
+            return {subscriber: event for subscriber in subscribers}
+        boosters = self.snapshots.current().boosters
+        whole = None
+        events = {}
+        for subscriber in subscribers:
+            if subscriber.changes:
+                if whole is None:
+                    whole = format_event("changes", {"version": version, "since": since, "boosters": boosters, **changes}, version)
+                events[subscriber] = whole
+            else:
+                delta = filter_changes(changes, subscriber.addresses)
+                if any(delta.values()):
+                    events[subscriber] = format_event("changes", {"version": version, "since": since, "boosters": boosters, **delta}, version)
+        return events
+
+    def _offer(self, subscriber: Subscription, event: bytes):
+        try:
+            subscriber.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up; end its stream, and it catches up on reconnect
+            self.unsubscribe(subscriber)
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(None)
+            metrics_service.stream_events.inc("dropped")
+
+    def _broadcast(self, name: str, event: bytes, subscribers=None):
+        subscribers = list(self.subscribers if subscribers is None else subscribers)
+        for subscriber in subscribers:
+            self._offer(subscriber, event)
+        metrics_service.stream_events.inc(name, amount=len(subscribers))
+
+    def check(self) -> bool:
+        """Push the events of a newly published snapshot; returns whether there was one"""
+        try:
+            snapshot = self.snapshots.current()
+        except FileNotFoundError:  # Nothing published yet
+            return False
+        previous = self.version
+        if snapshot.version == previous:
+            return False
+        self.version = snapshot.version
+        self._broadcast("version", format_event("version", {"version": snapshot.version, "previous": previous}, snapshot.version))
+        totals = global_data(snapshot)
+        if totals != self._global:
+            self._global = totals
+            self._broadcast("global", format_event("global", totals))
+        interested = [subscriber for subscriber in self.subscribers if subscriber.changes or subscriber.addresses]
+        if interested:
+            if previous is None:  # The first snapshot; there is nothing to diff against
+                events = dict.fromkeys(interested, format_event("resync", {"version": snapshot.version, "since": None}, snapshot.version))
+            else:
+                events = self._change_events(previous, interested)
+            for subscriber, event in events.items():
+                self._offer(subscriber, event)
+            metrics_service.stream_events.inc("changes", amount=len(events))
+        return True
+
+    def _reset(self):
+        """Start from the published snapshot, which new subscribers were sent on connect"""
+        try:
+            snapshot = self.snapshots.current()
+            self.version, self._global = snapshot.version, global_data(snapshot)
+        except FileNotFoundError:
+            self.version, self._global = None, None
+
+    async def _watch(self):
+        """The worker's fan-out task; it ends with the last subscriber"""
+        self._idle = 0.0
+        while self.subscribers:
+            if self.check():
+                self._idle = 0.0
+            elif self._idle >= self.HEARTBEAT_INTERVAL:
+                self._broadcast("heartbeat", b": ping\n\n")
+                self._idle = 0.0
+            await asyncio.sleep(self.POLL_INTERVAL)
+            self._idle += self.POLL_INTERVAL
+
+# Create a singleton instance
+stream_service = StreamService()
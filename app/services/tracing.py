@@ -0,0 +1,128 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import functools
+import inspect
+import itertools
+import time
+
+class Span:
+    """
+    A timed unit of work. Spans nest through a context variable, so spans opened in
+    tasks created by asyncio.gather or create_task become children of the span that
+    was current when the task was created.
+    """
+    MAX_CHILDREN = 1000  # Keep traces bounded when a span fans out over many items
+
+    def __init__(self, name: str, trace_id: int, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.parent = parent
+        self.attributes = attributes
+        self.children: List["Span"] = []
+        self.dropped_children = 0
+        self.status = "ok"
+        self.error = None
+        self.start_time = time.time()
+        self._start = time.monotonic()
+        self._end = None
+
+    @property
+    def elapsed(self) -> float:
+        """Duration so far, or the final duration once the span has ended"""
+        end = self._end if self._end is not None else time.monotonic()
+        return end - self._start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: float = 1):
+        """Increment a numeric attribute such as bytes or retries"""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def _add_child(self, span: "Span"):
+        if len(self.children) < self.MAX_CHILDREN:
+            self.children.append(span)
+        else:
+            self.dropped_children += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "start": self.start_time,
+            "duration": self.elapsed,
+            "running": self._end is None,
+            "status": self.status,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.dropped_children:
+            data["dropped_children"] = self.dropped_children
+        return data
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+class Tracer:
+    def __init__(self):
+        self.MAX_TRACES = 20
+        self.traces = deque(maxlen=self.MAX_TRACES)
+        self._trace_ids = itertools.count(1)
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Open a span as a child of the current one; a span without a parent starts a new trace"""
+        parent = _current_span.get()
+        trace_id = parent.trace_id if parent is not None else next(self._trace_ids)
+        span = Span(name, trace_id, parent, attributes)
+        if parent is not None:
+            parent._add_child(span)
+        else:
+            self.traces.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = str(e) or type(e).__name__
+            raise
+        finally:
+            span._end = time.monotonic()
+            _current_span.reset(token)
+
+    def traced(self, name: Optional[str] = None):
+        """Decorator running a function or coroutine inside a span named after it"""
+        def decorator(func):
+            span_name = name or func.__name__
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add(self, key: str, amount: float = 1):
+        """Increment an attribute on the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.add(key, amount)
+
+    def get_traces(self, name: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Most recent traces first, optionally filtered by root span name"""
+        traces = [span for span in reversed(self.traces) if name is None or span.name == name]
+        return [dict(span.to_dict(), trace_id=span.trace_id) for span in traces[:limit]]
+
+# Create a singleton instance
+tracer = Tracer()
@@ -0,0 +1,17 @@
+from typing import Any
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+from .rpc import RpcPool, rpc_pool
+
+# Imported on first use by app.config.get_async_web3, like web3 itself
+
+class PoolProvider(AsyncJSONBaseProvider):
+    """Async web3 provider that sends every call through the RPC pool for one network"""
+    def __init__(self, network: str, pool: RpcPool = rpc_pool):
+        super().__init__()
+        self.network = network
+        self.pool = pool
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        response = await self.pool.call(self.network, method, list(params or []))
+        return {"jsonrpc": "2.0", "id": next(self.request_counter), **response}
@@ -0,0 +1 @@
+"""Offline benchmarks and synthetic data generators."""
@@ -0,0 +1,197 @@
+"""
+Synthetic leaderboard generator.
+
+Produces interacting_addresses.json, ens.json and dune_cache.json files that follow
+the real record schema (merged_score_data, modifier_boost_by_badge as JSON strings,
+secondary address badges, base chain fields) at any size.
+
+Usage:
+    python -m benchmarks.generate --size 100000 --out /tmp/leaderboard-100k
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import time
+from typing import Dict, Iterator, List
+
+BADGES = [
+    "prime_sunk",
+    "users_referred",
+    "governance_vote_2",
+    "governance_vote_3",
+    "prime_held_duration",
+    "held_prime_before_unlock",
+    "participated_in_prime_unlock_vote",
+]
+
+# (prime_booster, community_booster) pairs seen in production, most common first
+HELD_DURATION_BOOSTERS = [(1.2, 1.1), (1.5, 1.3), (2.25, 2)]
+NEUTRAL_BOOSTER = {"prime_booster": 1, "initial_booster": 1, "community_booster": 1}
+
+ENS_WORDS = [
+    "prime", "maxi", "paragon", "echelon", "cache", "wayfinder", "parallel", "colony",
+    "avatar", "earth", "shroud", "kathari", "marcolian", "augencore", "catalyst", "frame",
+]
+
+def random_address(rng: random.Random) -> str:
+    return "0x" + "".join(rng.choices("0123456789abcdef", k=40))
+
+def checksum_like(rng: random.Random, address: str) -> str:
+    """Mixed-case version of an address, like the API returns (not a real EIP-55 checksum)"""
+    return "0x" + "".join(c.upper() if c.isalpha() and rng.random() < 0.5 else c for c in address[2:])
+
+def _scores(rng: random.Random, scale: float) -> Dict[str, float]:
+    prime = rng.lognormvariate(0, 1.2) * scale
+    return {
+        "prime_score": prime,
+        "community_score": prime * 0.3077,
+        "initialization_score": prime * 0.2308,
+    }
+
+def badge_record(rng: random.Random, address: str, scale: float) -> Dict:
+    held_prime, held_community = rng.choices(HELD_DURATION_BOOSTERS, weights=[70, 20, 10])[0]
+    boosters = {badge: json.dumps(NEUTRAL_BOOSTER) for badge in BADGES}
+    boosters["prime_held_duration"] = json.dumps(
+        {"prime_booster": held_prime, "initial_booster": 1, "community_booster": held_community}
+    )
+    return {
+        "extra": {"inactive_referrals": int(rng.expovariate(1.5))},
+        "scores": _scores(rng, scale),
+        "address": checksum_like(rng, address),
+        "prime_sunk": 0,
+        "users_referred": int(rng.expovariate(0.8)),
+        "governance_vote_2": rng.random() < 0.1,
+        "governance_vote_3": rng.random() < 0.2,
+        "prime_amount_cached": rng.randint(1, 5_000_000) * 10**18,
+        "prime_held_duration": float(rng.randint(0, 50_000_000)),
+        "secondary_addresses": [],
+        "longest_caching_time": rng.choice([0, 90, 180, 365, 906, 1080, 1095]),
+        "total_prime_multiplier": held_prime,
+        "modifier_boost_by_badge": boosters,
+        "held_prime_before_unlock": rng.random() < 0.3,
+        "total_initial_multiplier": 1,
+        "total_community_multiplier": held_community,
+        "echelon_governance_participation": int(rng.random() < 0.2),
+        "participated_in_prime_unlock_vote": rng.random() < 0.1,
+    }
+
+def generate_records(count: int, seed: int = 0) -> List[Dict]:
+    """Generate `count` leaderboard records, ranked and with percentages like the pipeline output"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        address = random_address(rng)
+        data = badge_record(rng, address, scale=1e7)
+        data["merged_score_data"] = dict(data["scores"])
+        if rng.random() < 0.05:
+            data["base_scores"] = _scores(rng, scale=1e5)
+            data["base_prime_amount_cached"] = rng.randint(1, 500) * 10**18
+            data["base_longest_caching_time"] = rng.choice([886, 1084])
+            for key, value in data["base_scores"].items():
+                data["merged_score_data"][key] += value
+        if rng.random() < 0.01:
+            secondaries = [random_address(rng) for _ in range(rng.randint(1, 12))]
+            data["secondary_addresses"] = [checksum_like(rng, a) for a in secondaries]
+            data["extra"]["secondary_address_badges"] = [
+                badge_record(rng, a, scale=1e6) for a in secondaries
+            ]
+            data["extra"]["primary_address_badge_data"] = badge_record(rng, address, scale=1e7)
+        data["avatar_count"] = int(rng.random() < 0.1) * rng.randint(1, 5)
+        records.append({"address": address, "data": data})
+
+    # Rank by merged score, as calculate_and_sort_addresses does
+    total = sum(sum(r["data"]["merged_score_data"].values()) for r in records)
+    records.sort(key=lambda r: sum(r["data"]["merged_score_data"].values()), reverse=True)
+    for index, record in enumerate(records):
+        score = sum(record["data"]["merged_score_data"].values())
+        record["data"]["percentage"] = score / total * 100 if total else 0
+        record["data"]["position"] = index + 1
+        # A few records come back from wayfinder without a rank
+        if rng.random() > 0.002:
+            record["data"]["leaderboard_rank"] = index + 1
+    return records
+
+def generate_ens(records: List[Dict], seed: int = 0, share: float = 0.3) -> Dict[str, str]:
+    """Give roughly `share` of the addresses a unique ENS name"""
+    rng = random.Random(seed + 1)
+    ens = {}
+    for index, record in enumerate(records):
+        if rng.random() < share:
+            name = f"{rng.choice(ENS_WORDS)}{rng.choice(ENS_WORDS)}{index}.eth"
+            ens[record["address"]] = name
+            record["data"]["ens_name"] = name
+    return ens
+
+def generate_dune_rows(records: List[Dict], seed: int = 0) -> Iterator[Dict]:
+    """Deposit rows with the fields StatsService.calculate_stats reads"""
+    rng = random.Random(seed + 2)
+    start = datetime.datetime(2024, 6, 4)
+    for record in records:
+        for _ in range(1 + int(rng.expovariate(1.0))):
+            deposited = start + datetime.timedelta(seconds=rng.randint(0, 300 * 86400))
+            old_duration = rng.choice([30, 90, 180, 365, 730, 1095])
+            new_duration = old_duration + rng.choice([0, 0, 0, 90, 365])
+            yield {
+                "user": record["address"],
+                "chain": "ETH" if rng.random() < 0.9 else "BASE",
+                "norm_amt": rng.lognormvariate(7, 2),
+                "depositIndex": rng.randint(0, 20),
+                "deposited": deposited,
+                "old_unlock": deposited + datetime.timedelta(days=old_duration),
+                "old_duration": old_duration,
+                "new_duration": new_duration,
+            }
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S.000 UTC")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def write_records(path: str, records: List[Dict]):
+    """Stream records one by one so large datasets don't need a second in-memory copy"""
+    with open(path, "w") as f:
+        f.write("[\n")
+        for index, record in enumerate(records):
+            if index:
+                f.write(",\n")
+            f.write(json.dumps(record))
+        f.write("\n]")
+
+def write_dataset(directory: str, count: int, seed: int = 0) -> Dict[str, int]:
+    """Write the three data files into `directory` and return their sizes in bytes"""
+    os.makedirs(directory, exist_ok=True)
+    records = generate_records(count, seed)
+    ens = generate_ens(records, seed)
+
+    paths = {
+        "interacting_addresses.json": os.path.join(directory, "interacting_addresses.json"),
+        "ens.json": os.path.join(directory, "ens.json"),
+        "dune_cache.json": os.path.join(directory, "dune_cache.json"),
+    }
+    write_records(paths["interacting_addresses.json"], records)
+    with open(paths["ens.json"], "w") as f:
+        json.dump(ens, f)
+    with open(paths["dune_cache.json"], "w") as f:
+        f.write('{"timestamp": %r, "data": [' % time.time())
+        for index, row in enumerate(generate_dune_rows(records, seed)):
+            if index:
+                f.write(", ")
+            f.write(json.dumps(row, default=_json_default))
+        f.write("]}")
+    return {name: os.path.getsize(path) for name, path in paths.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic leaderboard dataset")
+    parser.add_argument("--size", type=int, default=1000, help="Number of addresses")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="Output directory")
+    args = parser.parse_args()
+
+    sizes = write_dataset(args.out, args.size, args.seed)
+    for name, size in sizes.items():
+        print(f"{name}: {size / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+HTTP load test for the API.
+
+Drives the FastAPI app in-process over httpx's ASGI transport (or a running server with
+--url) with a weighted mix of read requests from concurrent clients, and reports
+throughput and latency percentiles per route. With --update-at, an update run against
+the upstream simulator is started mid-test so read latency during publishing shows up
+as its own phase. Requires httpx (pip install httpx).
+
+Usage:
+    python -m benchmarks.load_api --size 100000 --concurrency 20 --duration 30
+    python -m benchmarks.load_api --size 10000 --duration 60 --update-at 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .run import RESULTS_DIR, dataset_dir, load_app, use_dataset
+
+# A request is (route label, method, path, json body)
+Request = Tuple[str, str, str, Optional[dict]]
+
+DEFAULT_MIX = "addresses=4,addresses_post=2,search_position=2,ens=2,stats=1"
+
+def request_factories(records: List[dict], ens_data: Dict[str, str]) -> Dict[str, Callable[[random.Random], Request]]:
+    addresses = [record["address"] for record in records]
+    ens_items = list(ens_data.items()) or [(addresses[0], "missing.eth")]
+    pages = max(1, len(addresses) // 10)
+
+    def ens(rng):
+        address, name = rng.choice(ens_items)
+        if rng.random() < 0.5:
+            return ("GET /ens/{address}", "GET", f"/ens/{address}", None)
+        return ("GET /ens/reverse/{ens_name}", "GET", f"/ens/reverse/{name}", None)
+
+    return {
+        # Most visitors look at the first pages of the leaderboard
+        "addresses": lambda rng: (
+            "GET /addresses", "GET", f"/addresses?page={min(pages, int(rng.expovariate(0.2)) + 1)}&page_size=10", None
+        ),
+        "addresses_post": lambda rng: (
+            "POST /addresses", "POST", "/addresses", {"addresses": rng.sample(addresses, min(len(addresses), rng.randint(1, 3)))}
+        ),
+        "search_position": lambda rng: (
+            "GET /search_position", "GET", f"/search_position?query={rng.choice(addresses)}", None
+        ),
+        "ens": ens,
+        "stats": lambda rng: ("GET /stats", "GET", "/stats", None),
+    }
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(samples: List[Tuple[str, str, float, int]], durations: Dict[str, float]) -> Dict:
+    """Per phase and route: throughput, latency percentiles and status counts"""
+    grouped = defaultdict(lambda: defaultdict(list))
+    statuses = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    for phase, route, latency, status in samples:
+        grouped[phase][route].append(latency)
+        statuses[phase][route][str(status)] += 1
+
+    report = {}
+    for phase in [phase for phase in durations if phase in grouped]:
+        routes = grouped[phase]
+        report[phase] = {"duration": durations.get(phase, 0.0), "routes": {}}
+        for route, latencies in sorted(routes.items()):
+            latencies.sort()
+            report[phase]["routes"][route] = {
+                "requests": len(latencies),
+                "rps": len(latencies) / durations[phase] if durations.get(phase) else 0.0,
+                "p50": percentile(latencies, 0.50),
+                "p90": percentile(latencies, 0.90),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1],
+                "statuses": dict(statuses[phase][route]),
+            }
+    return report
+
+class PhaseClock:
+    """Labels each sample with the phase it started in: steady, or during/after an update run"""
+    def __init__(self):
+        self.phase = "steady"
+        self.started = {"steady": time.perf_counter()}
+        self.durations: Dict[str, float] = {}
+
+    def switch(self, phase: str):
+        now = time.perf_counter()
+        self.durations[self.phase] = self.durations.get(self.phase, 0.0) + now - self.started[self.phase]
+        self.phase = phase
+        self.started[phase] = now
+
+    def finish(self):
+        self.switch(self.phase)
+
+async def run_load(client, factories, weights, concurrency: int, duration: float, seed: int,
+                   clock: PhaseClock, update: Optional[Callable] = None, update_at: float = 0.0):
+    names = [name for name in weights if name in factories]
+    unknown = set(weights) - set(factories)
+    if unknown:
+        raise SystemExit(f"Unknown request types in --mix: {', '.join(sorted(unknown))}")
+    name_weights = [weights[name] for name in names]
+    samples = []
+    deadline = time.perf_counter() + duration
+    update_finished = asyncio.Event()
+    if update is None:
+        update_finished.set()
+
+    async def worker(index: int):
+        rng = random.Random(seed + index)
+        # Keep the load on until the update run has finished, even past the deadline
+        while time.perf_counter() < deadline or not update_finished.is_set():
+            route, method, path, body = factories[rng.choices(names, name_weights)[0]](rng)
+            phase = clock.phase
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            samples.append((phase, route, time.perf_counter() - start, status))
+            # An in-process request may complete without ever suspending; yield so the
+            # other clients and the update run get their turn, as a server's loop would
+            await asyncio.sleep(0)
+
+    async def updater():
+        await asyncio.sleep(update_at)
+        clock.switch("during_update")
+        try:
+            await update()
+        finally:
+            clock.switch("after_update")
+            update_finished.set()
+
+    tasks = [asyncio.create_task(worker(i)) for i in range(concurrency)]
+    if update is not None:
+        tasks.append(asyncio.create_task(updater()))
+    await asyncio.gather(*tasks)
+    clock.finish()
+    return samples
+
+async def main_async(args) -> Dict:
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("The load test needs httpx: pip install httpx")
+    # httpx logs every request at INFO once anything configures the root logger
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.update_at is not None and args.url:
+        raise SystemExit("--update-at drives the update in-process and can't be combined with --url")
+
+    source = dataset_dir(args.size, args.seed)
+    with open(os.path.join(source, "interacting_addresses.json"), "r") as f:
+        records = json.load(f)
+    with open(os.path.join(source, "ens.json"), "r") as f:
+        ens_data = json.load(f)
+    factories = request_factories(records, ens_data)
+
+    simulator = None
+    if args.update_at is not None:
+        from .simulator import UpstreamSimulator
+        # Serve the dataset's own addresses so the update republishes the same leaderboard
+        simulator = UpstreamSimulator([record["address"] for record in records], args.seed)
+        await simulator.start()
+        os.environ.update(simulator.env())
+    del records
+
+    os.environ.setdefault("SCHEDULER_ENABLED", "false")
+    app = load_app()
+
+    # Work on a copy so an update run can publish without touching the cached dataset
+    workdir = tempfile.mkdtemp(prefix="api-load-")
+    for name in ("interacting_addresses.json", "ens.json", "dune_cache.json"):
+        shutil.copy(os.path.join(source, name), workdir)
+    cwd = os.getcwd()
+    use_dataset(workdir)
+    try:
+        update = None
+        if simulator is not None:
+            from app.services.cache import cache_service
+            from app.services.scheduler import scheduler_service
+            cache_service.BATCH_DELAY = 0
+
+            async def update():
+                await scheduler_service.run_update("load-test")
+
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        else:
+            client = httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout
+            )
+        clock = PhaseClock()
+        async with client:
+            samples = await run_load(
+                client, factories, parse_mix(args.mix), args.concurrency, args.duration, args.seed,
+                clock, update, args.update_at or 0.0
+            )
+    finally:
+        os.chdir(cwd)
+        if simulator is not None:
+            from app.services.http import http_service
+            await http_service.close()
+            await simulator.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "timestamp": time.time(),
+        "target": args.url or "asgi",
+        "size": args.size,
+        "concurrency": args.concurrency,
+        "mix": parse_mix(args.mix),
+        "phases": summarize(samples, clock.durations),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API with a mix of read requests")
+    parser.add_argument("--size", type=int, default=10000, help="Dataset size in addresses")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted request mix (default: {DEFAULT_MIX})")
+    parser.add_argument("--url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--update-at", type=float, help="Start an update run (against the simulator) after this many seconds")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    for phase, data in results["phases"].items():
+        print(f"{phase} ({data['duration']:.1f} s)")
+        for route, stats in data["routes"].items():
+            print(
+                f"  {route:<30} {stats['rps']:8.1f} req/s  p50 {stats['p50'] * 1000:8.1f} ms  "
+                f"p99 {stats['p99'] * 1000:8.1f} ms  {stats['statuses']}"
+            )
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("load-%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Pipeline load runner.
+
+Starts the upstream simulator in-process, points the app at it through the base-URL
+settings and runs update_interacting_addresses end to end in a scratch directory.
+Reports wall time, per-stage durations and upstream call outcomes as JSON.
+
+Usage:
+    python -m benchmarks.load_pipeline --addresses 10000 --latency 0.1 --rate-limit 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from .run import RESULTS_DIR, load_app
+from .simulator import UpstreamSimulator, add_profile_arguments, profiles_from_args
+
+async def run_pipeline(args) -> dict:
+    simulator = UpstreamSimulator(args.addresses, args.seed, profiles_from_args(args))
+    await simulator.start()
+    # Base URLs are read when app.constants is imported, so set them first
+    os.environ.update(simulator.env())
+    if args.telegram:
+        os.environ["TELEGRAM_BOT_TOKEN"] = "simulator"
+        os.environ["TELEGRAM_CHAT_ID"] = "simulator"
+    load_app()
+
+    from app.services.cache import cache_service
+    from app.services.http import http_service
+    from app.services.indexer import indexer_service
+    from app.services.logging_service import logging_service
+    from app.services.metrics import metrics_service
+    from app.services.scheduler import scheduler_service
+    from app.services.storage import storage_service
+
+    cache_service.BATCH_SIZE = args.batch_size
+    cache_service.BATCH_DELAY = args.batch_delay
+    cache_service.MAX_CONCURRENT_REQUESTS = args.concurrency
+    cache_service.semaphore = asyncio.Semaphore(args.concurrency)
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="pipeline-load-")
+    os.chdir(workdir)
+    log_scan = None
+    try:
+        if args.logs:
+            start = time.perf_counter()
+            # A cold scan of the mainnet contract, which the update's own scan then resumes from
+            found = await indexer_service.index_chain(indexer_service.chains[0])
+            log_scan = {"duration": time.perf_counter() - start, "addresses": len(found)}
+
+        start = time.perf_counter()
+        await scheduler_service.update_interacting_addresses()
+        duration = time.perf_counter() - start
+        saved = len(storage_service.load_addresses())
+        await logging_service.flush()
+    finally:
+        os.chdir(cwd)
+        await http_service.close()
+        await simulator.stop()
+
+    return {
+        "timestamp": time.time(),
+        "addresses": args.addresses,
+        "saved": saved,
+        "duration": duration,
+        "settings": {
+            key: getattr(args, key)
+            for key in ("latency", "sigma", "rate_limit", "error_rate", "timeout_rate",
+                        "batch_size", "batch_delay", "concurrency", "telegram", "logs")
+        },
+        "log_scan": log_scan,
+        "stages": {stage: value for (_, stage), value in metrics_service.stage_duration.values.items()},
+        "upstream_calls": {f"{upstream} {status}": count for (upstream, status), count in metrics_service.upstream_requests.values.items()},
+        "simulator": simulator.stats,
+        "workdir": workdir,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the update pipeline against the upstream simulator")
+    parser.add_argument("--addresses", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=25, help="CacheService.BATCH_SIZE")
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="CacheService.BATCH_DELAY (production uses 1s)")
+    parser.add_argument("--concurrency", type=int, default=50, help="CacheService.MAX_CONCURRENT_REQUESTS")
+    parser.add_argument("--telegram", action="store_true", help="Send Telegram logs to the simulator")
+    parser.add_argument("--logs", action="store_true", help="Also time an eth_getLogs address scan")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/pipeline-<timestamp>.json)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SCHEDULER_ENABLED", "false")
+    results = asyncio.run(run_pipeline(args))
+
+    if results["log_scan"]:
+        print(f"Log scan found {results['log_scan']['addresses']} addresses in {results['log_scan']['duration']:.2f} seconds")
+    print(f"{results['saved']} of {args.addresses} addresses saved in {results['duration']:.2f} seconds")
+    for stage, duration in results["stages"].items():
+        print(f"  {stage:<20} {duration:8.2f} s")
+    for call, count in sorted(results["upstream_calls"].items()):
+        print(f"  {call:<20} {count:8.0f}")
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("pipeline-%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Offline benchmark suite.
+
+Generates (or reuses) synthetic datasets, then times every API route handler and the
+scoring/stats hot paths against them. Results are saved as JSON so runs can be compared.
+
+Usage:
+    python -m benchmarks.run --sizes 1000 100000
+    python -m benchmarks.run --sizes 1000 --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import calendar
+import datetime
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .generate import write_dataset, write_records
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, "benchmarks", "data")
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Upstream calls need API keys; benchmarks only ever reach the simulator, which takes any
+os.environ.setdefault("ALCHEMY_API_KEY", "benchmark")
+os.environ.setdefault("DUNE_API_KEY", "benchmark")
+os.environ.setdefault("SCHEDULER_ENABLED", "false")
+
+# Update runs of history per dataset, enough for a level-1 merge
+HISTORY_RUNS = 10
+
+# (label, zero-argument callable returning a value or an awaitable)
+Case = Tuple[str, Callable[[], object]]
+
+def dataset_dir(size: int, seed: int) -> str:
+    """Generate the dataset for `size` once and reuse it on later runs"""
+    directory = os.path.join(DATA_DIR, f"{size}-{seed}")
+    if not os.path.exists(os.path.join(directory, "dune_cache.json")):
+        print(f"Generating {size} addresses into {directory}")
+        write_dataset(directory, size, seed)
+    else:
+        # Keep the Dune cache fresh so the stats route doesn't try to refetch it
+        with open(os.path.join(directory, "dune_cache.json"), "r+") as f:
+            cache = json.load(f)
+            cache["timestamp"] = time.time()
+            f.seek(0)
+            json.dump(cache, f)
+            f.truncate()
+    return directory
+
+def load_app():
+    """Import the app from this checkout, whichever directory the benchmark runs in"""
+    sys.path.insert(0, REPO_ROOT)
+    from app import app
+    return app
+
+def use_dataset(directory: str):
+    """Point the app at a dataset; files are opened relative to the working directory"""
+    from app.services.dune import dune_service
+    from app.services.snapshot import snapshot_service
+
+    os.chdir(directory)
+    snapshot_service.ensure_current()
+    dune_service.invalidate_cache()
+
+def seed_history(records: List[Dict], runs: int):
+    """Give the dataset `runs` update runs of history, once per cached dataset"""
+    from app.services.history import history_service
+    for _ in range(runs - len(history_service.runs())):
+        history_service.append_run(records)
+
+def deposit_logs(dune_rows: List[Dict]) -> Dict[str, List[Dict]]:
+    """Raw DepositCreated/DepositExtended logs per chain that decode back to the Dune rows"""
+    from app.services.events import DAY, WEI, event_topics
+    topics = {name: topic for topic, name in event_topics().items()}
+
+    def log(name: str, user: str, words: List[int], block: int) -> Dict:
+        return {
+            "topics": [topics[name], "0x" + "0" * 24 + user[2:].lower()],
+            "data": "0x" + "".join(format(word, "064x") for word in words),
+            "blockNumber": hex(block),
+            "transactionHash": "0x" + format(block, "064x"),
+            "logIndex": "0x0",
+        }
+
+    logs = {}
+    for block, row in enumerate(dune_rows):
+        created = calendar.timegm(row["deposited"].timetuple())
+        end = created + int(row["old_duration"] * DAY)
+        chain_logs = logs.setdefault(row.get("chain", "ETH").lower(), [])
+        chain_logs.append(log("DepositCreated", row["user"], [row["depositIndex"], int(row["norm_amt"] * WEI), end, created], block))
+        if row["new_duration"] != row["old_duration"]:
+            new_end = created + int(row["new_duration"] * DAY)
+            chain_logs.append(log("DepositExtended", row["user"], [row["depositIndex"], new_end, created, created], block))
+    return logs
+
+def seed_indexer(logs: Dict[str, List[Dict]]):
+    """Write indexer checkpoints whose deposit ledgers hold the decoded logs, and store the logs"""
+    from app.services.events import DepositLedger, decode_logs
+    from app.services.indexer import indexer_service
+    for chain in indexer_service.chains:
+        chain_logs = logs.get(chain.name, [])
+        ledger = DepositLedger()
+        ledger.apply(decode_logs(chain_logs, chain.abi))
+        indexer_service._save_state(chain, chain.creation_block, set(), ledger)
+        store, from_block = indexer_service.log_store(chain), 0
+        for start in range(0, len(chain_logs), 1000):
+            batch = chain_logs[start:start + 1000]
+            to_block = int(batch[-1]["blockNumber"], 16)
+            store.append(from_block, to_block, batch)
+            from_block = to_block + 1
+
+def _parse_dune_rows(rows: List[Dict]) -> List[Dict]:
+    """Convert Dune timestamp strings to datetimes, as calculate_stats expects"""
+    parsed = []
+    for row in rows:
+        row = dict(row)
+        for key in ("deposited", "old_unlock"):
+            if isinstance(row.get(key), str):
+                row[key] = datetime.datetime.strptime(row[key][:19], "%Y-%m-%d %H:%M:%S")
+        parsed.append(row)
+    return parsed
+
+def route_cases(records: List[Dict], ens_data: Dict[str, str]) -> Dict[str, List[Case]]:
+    """One or more calls per route, keyed by "METHOD path" like app.routes"""
+    from fastapi import BackgroundTasks
+    from app.models.request import AddressRequest, PositionBatchRequest
+    from app.routes import addresses, update, ens, stats, metrics, debug, stream
+    from app.services.snapshot import snapshot_service
+
+    middle = records[len(records) // 2]["address"]
+    last = records[-1]["address"]
+    spread = [records[i]["address"] for i in range(0, len(records), max(1, len(records) // 5))][:5]
+    ens_address, ens_name = next(iter(ens_data.items()))
+    # Addresses spread over the leaderboard plus ENS names, as an integrator would send
+    batch = [records[i]["address"] for i in range(0, len(records), max(1, len(records) // 90))][:90]
+    batch += list(ens_data.values())[:10]
+
+    async def open_stream():
+        # Connect and read the current version and totals, as a dashboard does on load
+        response = await stream.get_stream(changes=False, addresses=None, since=None, last_event_id=None)
+        body = response.body_iterator
+        await body.__anext__()
+        await body.__anext__()
+        await body.aclose()
+
+    return {
+        "GET /get_global_data": [("", lambda: addresses.get_total_score())],
+        "GET /addresses": [
+            ("first_page", lambda: addresses.get_addresses(page=1, page_size=100, fields=None)),
+            ("last_page", lambda: addresses.get_addresses(page=max(1, len(records) // 100), page_size=100, fields=None)),
+            ("first_page_summary", lambda: addresses.get_addresses(page=1, page_size=100, fields="summary")),
+            ("first_page_fields", lambda: addresses.get_addresses(page=1, page_size=100, fields="leaderboard_rank,percentage")),
+        ],
+        "GET /addresses/changes": [
+            ("up_to_date", lambda: addresses.get_address_changes(since=snapshot_service.current().version)),
+            ("full_resync", lambda: addresses.get_address_changes(since=0)),
+        ],
+        "GET /addresses/{address}/history": [("", lambda: addresses.get_address_history(middle))],
+        "POST /addresses": [
+            ("single", lambda: addresses.get_address_info(AddressRequest(addresses=[middle]), fields=None)),
+            ("multi", lambda: addresses.get_address_info(AddressRequest(addresses=spread), fields=None)),
+        ],
+        "GET /search_position": [
+            ("address", lambda: addresses.search_position(query=last, fields=None)),
+            ("ens", lambda: addresses.search_position(query=ens_name, fields=None)),
+            ("address_summary", lambda: addresses.search_position(query=last, fields="summary")),
+        ],
+        "POST /search_position/batch": [
+            ("100", lambda: addresses.search_positions(PositionBatchRequest(queries=batch))),
+            ("100_window", lambda: addresses.search_positions(PositionBatchRequest(queries=batch, window=2))),
+        ],
+        "GET /ens/{address}": [("", lambda: ens.get_ens(ens_address))],
+        "GET /ens": [("", lambda: ens.get_all_ens())],
+        "GET /ens/reverse/{ens_name}": [("", lambda: ens.get_address_by_ens(ens_name))],
+        "GET /stats": [
+            ("chain", lambda: stats.get_cache_stats(source="chain")),
+            ("dune", lambda: stats.get_cache_stats(source="dune")),
+        ],
+        "POST /update_addresses": [("", lambda: update.trigger_update_addresses(BackgroundTasks(), run_id=None))],
+        "GET /update_runs": [("", lambda: update.get_update_runs())],
+        "GET /update_status": [("", lambda: update.get_update_status())],
+        "GET /update_ens": [("", lambda: update.trigger_update_ens(BackgroundTasks()))],
+        "GET /metrics": [("", lambda: metrics.get_metrics())],
+        "GET /debug/traces": [("", lambda: debug.get_traces(name=None, limit=10))],
+        "GET /stream": [("", open_stream)],
+        # Rewrites the snapshot, so it runs last
+        "POST /recalculate_percentages": [("", lambda: update.recalculate_percentages())],
+    }
+
+def service_cases(records: List[Dict], dune_rows: List[Dict], logs: Dict[str, List[Dict]]) -> Dict[str, List[Case]]:
+    from app.services.blockchain import blockchain_service
+    from app.services.events import DepositLedger, decode_logs
+    from app.services.indexer import indexer_service
+    from app.services.stats import stats_service
+    from app.services.stream import StreamService
+
+    middle = records[len(records) // 2]["address"]
+    spread = [records[i]["address"] for i in range(0, len(records), max(1, len(records) // 5))][:5]
+
+    # Idle dashboards, a tenth of them watching a few addresses; the benchmark calls check() itself
+    streams = StreamService()
+    streams.POLL_INTERVAL = 3600
+    subscribers = [
+        streams.subscribe(addresses=frozenset(address.lower() for address in spread) if i % 10 == 0 else None)
+        for i in range(1000)
+    ]
+
+    def push_snapshot():
+        streams.version = 0  # Pretend a new version was published since the last check
+        streams.check()
+        for subscriber in subscribers:
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+
+    return {
+        "calculate_and_sort_addresses": [
+            # The function mutates and re-sorts its input, so give it a fresh list each run
+            ("", lambda: blockchain_service.calculate_and_sort_addresses(list(records))),
+        ],
+        "calculate_addresses_position": [
+            ("single", lambda: blockchain_service.calculate_addresses_position([middle])),
+            ("multi", lambda: blockchain_service.calculate_addresses_position(spread)),
+        ],
+        "calculate_stats": [("", lambda: stats_service.calculate_stats(dune_rows))],
+        "decode_logs": [("", lambda: decode_logs(logs["eth"]))],
+        "fold_stored_logs": [("", lambda: indexer_service._fold(
+            indexer_service.chains[0], indexer_service.log_store(indexer_service.chains[0]), 0, len(dune_rows), set(), DepositLedger()
+        ))],
+        "stream_fan_out": [("1000_subscribers", push_snapshot)],
+    }
+
+def check_route_coverage(app, cases: Dict[str, List[Case]]):
+    """Fail loudly when a route is added without a benchmark"""
+    from fastapi.routing import APIRoute
+    routes = {
+        f"{method} {route.path}"
+        for route in app.routes if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+    missing = routes - set(cases)
+    if missing:
+        raise SystemExit(f"Routes without a benchmark: {', '.join(sorted(missing))}")
+
+async def measure(factory: Callable[[], object], repeat: int, max_seconds: float) -> Dict[str, float]:
+    """Run the call `repeat` times, stopping early once `max_seconds` is spent"""
+    durations = []
+    budget_end = time.perf_counter() + max_seconds
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = factory()
+        if inspect.isawaitable(result):
+            await result
+        durations.append(time.perf_counter() - start)
+        if time.perf_counter() > budget_end:
+            break
+    return {
+        "runs": len(durations),
+        "min": min(durations),
+        "median": statistics.median(durations),
+        "mean": statistics.fmean(durations),
+        "max": max(durations),
+    }
+
+async def run_size(app, size: int, seed: int, repeat: int, max_seconds: float) -> Dict[str, Dict[str, float]]:
+    directory = dataset_dir(size, seed)
+    use_dataset(directory)
+    with open("interacting_addresses.json", "r") as f:
+        records = json.load(f)
+    with open("ens.json", "r") as f:
+        ens_data = json.load(f)
+    with open("dune_cache.json", "r") as f:
+        dune_rows = _parse_dune_rows(json.load(f)["data"])
+    seed_history(records, HISTORY_RUNS)
+    logs = deposit_logs(dune_rows)
+    seed_indexer(logs)
+
+    routes = route_cases(records, ens_data)
+    check_route_coverage(app, routes)
+    cases = dict(service_cases(records, dune_rows, logs), **routes)
+
+    results = {}
+    for name, calls in cases.items():
+        for label, factory in calls:
+            key = f"{name} [{label}]" if label else name
+            results[key] = await measure(factory, repeat, max_seconds)
+            print(f"  {key:<55} median {results[key]['median'] * 1000:10.2f} ms  ({results[key]['runs']} runs)")
+
+    # /recalculate_percentages rewrote the snapshot with indentation; restore the generated layout
+    write_records("interacting_addresses.json", records)
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Benchmarks whose median got slower than the baseline by more than `threshold` (0.2 = 20%)"""
+    regressions = []
+    for size, cases in results["sizes"].items():
+        for name, stats in cases.items():
+            before = baseline.get("sizes", {}).get(size, {}).get(name)
+            if before and stats["median"] > before["median"] * (1 + threshold):
+                regressions.append(
+                    f"{size} {name}: {before['median'] * 1000:.2f} ms -> {stats['median'] * 1000:.2f} ms"
+                )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000],
+                        help="Dataset sizes in addresses (1000000 is supported but slow)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Time budget per benchmark")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Baseline results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown vs the baseline")
+    args = parser.parse_args()
+
+    app = load_app()
+    results = {
+        "timestamp": time.time(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "sizes": {},
+    }
+    cwd = os.getcwd()
+    try:
+        for size in args.sizes:
+            print(f"{size} addresses")
+            results["sizes"][str(size)] = asyncio.run(
+                run_size(app, size, args.seed, args.repeat, args.max_seconds)
+            )
+    finally:
+        os.chdir(cwd)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Local stand-in for the upstream APIs used by the update pipeline.
+
+Serves JSON-RPC (eth_blockNumber, eth_getBlockByNumber, eth_getLogs, eth_call, eth_chainId), the Alchemy NFT
+owners endpoint, wayfinder walletstats, Dune latest results and Telegram sendMessage from
+one aiohttp server, with per-endpoint latency, rate limits and error injection.
+
+Point the app at it with the base-URL settings in app/constants.py (see `env()`):
+    python -m benchmarks.simulator --addresses 10000 --port 8545
+"""
+import argparse
+import asyncio
+import bisect
+import datetime
+import random
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+from aiohttp import web
+
+from .generate import badge_record, generate_dune_rows, random_address
+
+# First block of the simulated chain; logs are spread evenly after it
+START_BLOCK = 20019797
+BLOCK_SPAN = 2_000_000
+# keccak("DepositCreated(address,uint256,uint256,uint256,uint256)"), the staking contract's deposit event
+DEPOSIT_TOPIC = "0x554f20505671494900b631b0e443e9e7a59743ec9889b05e28d8ac9ea158266b"
+
+@dataclass
+class Latency:
+    """Log-normal latency, which matches the long tail of real APIs better than a constant"""
+    median: float = 0.05  # seconds
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        return rng.lognormvariate(0, self.sigma) * self.median
+
+@dataclass
+class EndpointProfile:
+    latency: Latency = field(default_factory=Latency)
+    rate_limit: Optional[float] = None  # Requests per second before answering 429
+    error_rate: float = 0.0  # Share of requests answered with a 500
+    timeout_rate: float = 0.0  # Share of requests that hang for `hang_seconds`
+    hang_seconds: float = 60.0
+
+class _RateLimiter:
+    """Token bucket allowing `rate` requests per second with a one-second burst"""
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+ENDPOINTS = ("rpc", "alchemy", "nft_owners", "wayfinder", "dune", "telegram")
+
+class UpstreamSimulator:
+    def __init__(self, addresses: Union[int, List[str]] = 1000, seed: int = 0,
+                 profiles: Optional[Dict[str, EndpointProfile]] = None):
+        """`addresses` is either a count of random addresses or the exact addresses to serve"""
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.profiles = {name: EndpointProfile() for name in ENDPOINTS}
+        self.profiles.update(profiles or {})
+        self.limiters = {
+            name: _RateLimiter(profile.rate_limit)
+            for name, profile in self.profiles.items() if profile.rate_limit
+        }
+        self.stats = {name: {"requests": 0, "rate_limited": 0, "errors": 0, "hangs": 0} for name in ENDPOINTS}
+
+        if isinstance(addresses, int):
+            addresses = [random_address(self.rng) for _ in range(addresses)]
+        self.addresses = [address.lower() for address in addresses]
+        self.latest_block = START_BLOCK + BLOCK_SPAN
+        step = BLOCK_SPAN / max(1, len(self.addresses))
+        # One deposit log per address, sorted by block for range queries
+        self.log_blocks = [START_BLOCK + int(i * step) for i in range(len(self.addresses))]
+        self.dune_rows = list(generate_dune_rows([{"address": a} for a in self.addresses], seed))
+        self.avatar_owners = [a for a in self.addresses if self.rng.random() < 0.1]
+        self.runner: Optional[web.AppRunner] = None
+        self.url = None
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point the app at this simulator"""
+        return {
+            "PROVIDER_URL": f"{self.url}/rpc",
+            "PROVIDER_URL_BASE": f"{self.url}/rpc",
+            "ALCHEMY_BASE_URL": f"{self.url}/alchemy/{{network}}",
+            "WAYFINDER_API_URL": f"{self.url}/wayfinder",
+            "DUNE_API_URL": self.url,
+            "TELEGRAM_API_URL": f"{self.url}/telegram",
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/rpc", self._rpc)
+        app.router.add_post("/alchemy/{network}/v2/{key}", self._alchemy_rpc)
+        app.router.add_get("/alchemy/{network}/nft/v3/{key}/getOwnersForContract", self._nft_owners)
+        app.router.add_get("/wayfinder/walletstats/{address}", self._walletstats)
+        app.router.add_get("/api/v1/query/{query_id}/results", self._dune_results)
+        app.router.add_post("/telegram/{bot}/sendMessage", self._telegram)
+        app.router.add_get("/_simulator/stats", self._stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def _simulate(self, endpoint: str) -> Optional[web.Response]:
+        """Apply latency and injected failures; returns a response to send instead of the real one"""
+        profile = self.profiles[endpoint]
+        stats = self.stats[endpoint]
+        stats["requests"] += 1
+        limiter = self.limiters.get(endpoint)
+        if limiter is not None and not limiter.allow():
+            stats["rate_limited"] += 1
+            if endpoint == "telegram":
+                body = {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}
+                return web.json_response(body, status=429)
+            return web.json_response({"error": "Too Many Requests"}, status=429, headers={"Retry-After": "1"})
+        await asyncio.sleep(profile.latency.sample(self.rng))
+        if profile.timeout_rate and self.rng.random() < profile.timeout_rate:
+            stats["hangs"] += 1
+            await asyncio.sleep(profile.hang_seconds)
+        if profile.error_rate and self.rng.random() < profile.error_rate:
+            stats["errors"] += 1
+            return web.json_response({"error": "Internal Server Error"}, status=500)
+        return None
+
+    async def _rpc(self, request: web.Request, endpoint: str = "rpc") -> web.Response:
+        failure = await self._simulate(endpoint)
+        if failure is not None:
+            return failure
+        payload = await request.json()
+        if isinstance(payload, list):
+            return web.json_response([self._rpc_call(call) for call in payload])
+        return web.json_response(self._rpc_call(payload))
+
+    async def _alchemy_rpc(self, request: web.Request) -> web.Response:
+        return await self._rpc(request, "alchemy")
+
+    def _rpc_call(self, call: Dict) -> Dict:
+        method = call.get("method")
+        params = call.get("params") or []
+        if method == "eth_blockNumber":
+            result = hex(self.latest_block)
+        elif method == "eth_chainId":
+            result = "0x1"
+        elif method == "eth_getBlockByNumber":
+            # web3's ENS module checks that the node is in sync before resolving
+            result = {
+                "number": hex(self.latest_block),
+                "hash": "0x" + format(self.latest_block, "064x"),
+                "parentHash": "0x" + format(self.latest_block - 1, "064x"),
+                "timestamp": hex(int(time.time())),
+                "gasLimit": hex(30_000_000),
+                "gasUsed": "0x0",
+                "transactions": [],
+            }
+        elif method == "eth_getLogs":
+            result = self._logs(params[0])
+        elif method == "eth_call":
+            # Every ENS registry lookup resolves to the zero address, i.e. no name
+            result = "0x" + "0" * 64
+        else:
+            return {"jsonrpc": "2.0", "id": call.get("id"), "error": {"code": -32601, "message": f"{method} not supported"}}
+        return {"jsonrpc": "2.0", "id": call.get("id"), "result": result}
+
+    def _logs(self, filter_params: Dict) -> List[Dict]:
+        def block(value, default):
+            if value is None or value == "latest":
+                return default
+            return int(value, 16) if isinstance(value, str) else int(value)
+
+        from_block = block(filter_params.get("fromBlock"), self.latest_block)
+        to_block = block(filter_params.get("toBlock"), self.latest_block)
+        start = bisect.bisect_left(self.log_blocks, from_block)
+        end = bisect.bisect_right(self.log_blocks, to_block)
+        return [
+            {
+                "address": filter_params.get("address"),
+                "blockNumber": hex(self.log_blocks[i]),
+                "blockHash": "0x" + "0" * 64,
+                "transactionHash": "0x" + format(i, "064x"),
+                "transactionIndex": "0x0",
+                "logIndex": "0x0",
+                "removed": False,
+                "topics": [DEPOSIT_TOPIC, "0x" + "0" * 24 + self.addresses[i][2:]],
+                # depositIndex, amount, endTimestamp, createdTimestamp
+                "data": "0x" + "".join(format(word, "064x") for word in (0, 10**18, 1_800_000_000, 1_700_000_000)),
+            }
+            for i in range(start, end)
+        ]
+
+    async def _nft_owners(self, request: web.Request) -> web.Response:
+        failure = await self._simulate("nft_owners")
+        if failure is not None:
+            return failure
+        owners = [
+            {"ownerAddress": address, "tokenBalances": [{"tokenId": hex(index), "balance": "1"}]}
+            for index, address in enumerate(self.avatar_owners)
+        ]
+        return web.json_response({"owners": owners, "pageKey": None})
+
+    async def _walletstats(self, request: web.Request) -> web.Response:
+        failure = await self._simulate("wayfinder")
+        if failure is not None:
+            return failure
+        address = request.match_info["address"]
+        # Seed by address so every fetch of the same wallet returns the same stats
+        rng = random.Random(zlib.crc32(address.lower().encode()) ^ self.seed)
+        data = badge_record(rng, address, scale=1e7)
+        data["merged_score_data"] = dict(data["scores"])
+        data["leaderboard_rank"] = rng.randint(1, len(self.addresses))
+        return web.json_response(data)
+
+    async def _dune_results(self, request: web.Request) -> web.Response:
+        failure = await self._simulate("dune")
+        if failure is not None:
+            return failure
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        rows = [
+            {key: value.strftime("%Y-%m-%d %H:%M:%S.000 UTC") if isinstance(value, datetime.datetime) else value
+             for key, value in row.items()}
+            for row in self.dune_rows
+        ]
+        return web.json_response({
+            "execution_id": "01SIMULATED",
+            "query_id": int(request.match_info["query_id"]),
+            "state": "QUERY_STATE_COMPLETED",
+            "submitted_at": now,
+            "execution_started_at": now,
+            "execution_ended_at": now,
+            "expires_at": now,
+            "result": {
+                "rows": rows,
+                "metadata": {
+                    "column_names": list(rows[0]) if rows else [],
+                    "result_set_bytes": 0,
+                    "total_row_count": len(rows),
+                    "datapoint_count": len(rows) * len(rows[0]) if rows else 0,
+                    "pending_time_millis": 0,
+                    "execution_time_millis": 0,
+                },
+            },
+        })
+
+    async def _telegram(self, request: web.Request) -> web.Response:
+        failure = await self._simulate("telegram")
+        if failure is not None:
+            return failure
+        return web.json_response({"ok": True, "result": {"message_id": self.stats["telegram"]["requests"]}})
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+def profiles_from_args(args) -> Dict[str, EndpointProfile]:
+    """Apply the shared CLI latency/failure options to every endpoint, then the per-endpoint latencies"""
+    latencies = dict(option.split("=", 1) for option in args.endpoint_latency or [])
+    return {
+        name: EndpointProfile(
+            latency=Latency(median=float(latencies.get(name, args.latency)), sigma=args.sigma),
+            rate_limit=args.rate_limit,
+            error_rate=args.error_rate,
+            timeout_rate=args.timeout_rate,
+        )
+        for name in ENDPOINTS
+    }
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.05, help="Median upstream latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Log-normal spread of the latency")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests per second per endpoint before 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests that hang")
+    parser.add_argument("--endpoint-latency", action="append", metavar="ENDPOINT=SECONDS",
+                        help=f"Median latency of one endpoint ({', '.join(ENDPOINTS)}), e.g. alchemy=2")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the upstream simulator")
+    parser.add_argument("--addresses", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8545)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    async def serve():
+        simulator = UpstreamSimulator(args.addresses, args.seed, profiles_from_args(args))
+        await simulator.start(port=args.port)
+        for key, value in simulator.env().items():
+            print(f"{key}={value}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await simulator.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
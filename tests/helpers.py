@@ -0,0 +1,15 @@
+"""
+Shared test data, imported by the test modules.
+
+`record` builds a leaderboard record with the fields the snapshot, storage and history
+read; `RECORDS` is a small leaderboard with an unranked record and mixed-case addresses.
+"""
+
+def record(address, rank, points, **data):
+    return {"address": address, "data": {"leaderboard_rank": rank, "merged_score_data": {"points": points}, **data}}
+
+RECORDS = [
+    record("0xAAA", 2, 30.0),
+    record("0xbbb", None, 20.0),
+    record("0xccc", 1, 10.0),
+]
@@ -0,0 +1,51 @@
+"""
+Tests for booster normalization.
+
+This module contains tests for the booster table, including:
+- Parsing each booster string once and sharing identical boosters
+- Boosters nested under primary and secondary address badges
+- Snapshot records referencing the published booster table
+"""
+import json
+from app.services.boosters import BoosterTable, booster_id, normalize_boosters
+from app.services.snapshot import Snapshot, build_snapshot
+
+BOOSTER = {"modifier": 1.5, "name": "Prime Holder"}
+
+def record(address, rank):
+    boosters = {"prime_holder": json.dumps(BOOSTER)}
+    return {"address": address, "data": {
+        "leaderboard_rank": rank,
+        "modifier_boost_by_badge": dict(boosters),
+        "extra": {
+            "primary_address_badge_data": {"modifier_boost_by_badge": dict(boosters)},
+            "secondary_address_badges": [{"modifier_boost_by_badge": dict(boosters)}],
+        },
+    }}
+
+def test_intern_shares_boosters():
+    table = BoosterTable()
+    ref = table.intern(json.dumps(BOOSTER))
+    assert ref == booster_id(BOOSTER) == table.intern(dict(BOOSTER))
+    assert table.boosters == {ref: BOOSTER}
+
+def test_normalize_nested_boosters():
+    records = normalize_boosters([record("0xaaa", 1), record("0xbbb", 2)])
+    data, other = records[0]["data"], records[1]["data"]
+    shared = data["modifier_boost_by_badge"]["prime_holder"]
+    assert shared == BOOSTER
+    assert other["modifier_boost_by_badge"]["prime_holder"] is shared
+    assert data["extra"]["primary_address_badge_data"]["modifier_boost_by_badge"]["prime_holder"] is shared
+    assert data["extra"]["secondary_address_badges"][0]["modifier_boost_by_badge"]["prime_holder"] is shared
+
+def test_snapshot_references_booster_table(tmp_path):
+    records = [record("0xaaa", 1)]
+    path = str(tmp_path / "leaderboard.snapshot")
+    build_snapshot(path, records, {}, version=1)
+    snapshot = Snapshot(path)
+    ref = booster_id(BOOSTER)
+    assert snapshot.boosters == {ref: BOOSTER}
+    data = json.loads(snapshot.record_json(0))["data"]
+    assert data["modifier_boost_by_badge"] == {"prime_holder": ref}
+    assert data["extra"]["secondary_address_badges"][0]["modifier_boost_by_badge"] == {"prime_holder": ref}
+    assert records[0]["data"]["modifier_boost_by_badge"]["prime_holder"] == json.dumps(BOOSTER)  # Input untouched
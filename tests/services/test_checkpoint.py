@@ -0,0 +1,68 @@
+"""
+Tests for checkpointed update runs.
+
+This module contains tests for run checkpoints, including:
+- Resuming the latest unfinished run
+- Skipping checkpointed pipeline stages on retry
+- Per-item results surviving a truncated write
+"""
+import pytest
+from app.services.checkpoint import CheckpointService
+from app.services.pipeline import Pipeline, Stage
+
+@pytest.fixture
+def checkpoints(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return CheckpointService()
+
+@pytest.mark.asyncio
+async def test_retry_resumes_checkpointed_stages(checkpoints):
+    """A failed run is resumed and its completed stages are not repeated"""
+    calls = {"fetch": 0, "process": 0}
+
+    def fetch():
+        calls["fetch"] += 1
+        return {"0xa", "0xb"}
+
+    def process(addresses):
+        calls["process"] += 1
+        if calls["process"] == 1:
+            raise RuntimeError("wayfinder down")
+        return len(addresses)
+
+    def build(checkpoint):
+        return Pipeline("test", [
+            Stage("addresses", fetch, checkpoint=True),
+            Stage("process", process, inputs=["addresses"], checkpoint=True),
+        ], checkpoint=checkpoint)
+
+    first = checkpoints.start_run()
+    with pytest.raises(RuntimeError):
+        await build(first).run()
+    first.fail("wayfinder down")
+
+    second = checkpoints.start_run()
+    assert second.run_id == first.run_id
+    pipeline = build(second)
+    results = await pipeline.run()
+    second.complete()
+
+    assert results["process"] == 2
+    assert calls == {"fetch": 1, "process": 2}
+    assert pipeline.resumed_stages == ["addresses"]
+
+    # A completed run is not resumed
+    assert checkpoints.start_run().run_id != first.run_id
+
+def test_results_ignore_truncated_last_line(checkpoints):
+    """Results appended before a crash are kept, a half-written line is dropped"""
+    checkpoint = checkpoints.start_run("run-1")
+    checkpoint.append_results("wayfinder", [{"address": "0xa", "data": {}}])
+    with open(f"{checkpoint.run_dir}/wayfinder.jsonl", "a") as f:
+        f.write('{"address": "0xb", "da')
+
+    assert checkpoint.load_results("wayfinder") == [{"address": "0xa", "data": {}}]
+
+def test_invalid_run_id_is_rejected(checkpoints):
+    with pytest.raises(ValueError):
+        checkpoints.start_run("../etc")
@@ -0,0 +1,110 @@
+"""
+Tests for precompressed, per-version cached responses.
+
+This module contains tests for the compression middleware, including:
+- Accept-Encoding negotiation, with and without brotli
+- Serving the cached brotli variant
+- Rendering a URL once per snapshot version and serving gzip from the cache
+- ETag revalidation and invalidation when a new snapshot is published
+- Concurrent misses for the same URL sharing one render
+"""
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+from app.services import compression
+from app.services.compression import CompressionMiddleware, negotiate
+from app.services.snapshot import snapshot_service
+from tests.helpers import RECORDS
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    snapshot_service.publish(RECORDS, {})
+    calls = []
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/ens")
+    async def get_all_ens():
+        calls.append(1)
+        return Response(content=b'{"names":"' + b"x" * 4096 + b'"}', media_type="application/json")
+
+    with TestClient(app) as test_client:
+        yield test_client, calls
+
+def test_negotiate():
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("gzip;q=0, identity") is None
+    assert negotiate("") is None
+
+def test_negotiate_brotli(monkeypatch):
+    """br is preferred when brotli is installed, and gzip is served without it"""
+    pytest.importorskip("brotli")
+    assert negotiate("br, gzip") == "br"
+    assert negotiate("*") == "br"
+    assert negotiate("br;q=0.5, gzip") == "gzip"
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate("br, gzip") == "gzip"
+    assert negotiate("br") is None
+
+def test_rendered_once_per_version(client):
+    """Repeat requests are served from the cache, compressed once"""
+    test_client, calls = client
+    plain = test_client.get("/ens", headers={"Accept-Encoding": "identity"})
+    compressed = test_client.get("/ens", headers={"Accept-Encoding": "gzip"})
+    assert len(calls) == 1
+    assert plain.headers.get("content-encoding") is None
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "accept-encoding"
+    assert int(compressed.headers["content-length"]) < len(plain.content)
+    assert compressed.content == plain.content  # httpx decodes gzip transparently
+
+def test_brotli_variant(client):
+    """br requests get the cached brotli body, which decompresses to the rendered one"""
+    brotli = pytest.importorskip("brotli")
+    test_client, calls = client
+    plain = test_client.get("/ens", headers={"Accept-Encoding": "identity"}).content
+    with test_client.stream("GET", "/ens", headers={"Accept-Encoding": "br"}) as response:
+        assert response.headers["content-encoding"] == "br"
+        body = b"".join(response.iter_raw())
+    assert int(response.headers["content-length"]) == len(body) < len(plain)
+    assert brotli.decompress(body) == plain
+    assert len(calls) == 1
+
+def test_etag_revalidation_and_new_version(client):
+    """Unchanged responses answer 304; publishing invalidates the cache and the ETag"""
+    test_client, calls = client
+    etag = test_client.get("/ens").headers["etag"]
+    assert test_client.get("/ens", headers={"If-None-Match": etag}).status_code == 304
+
+    snapshot_service.publish(RECORDS, {})
+    response = test_client.get("/ens", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_render_once(tmp_path, monkeypatch):
+    """A burst of identical requests on a cold cache costs one render"""
+    monkeypatch.chdir(tmp_path)
+    snapshot_service.publish(RECORDS, {})
+    calls = []
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/addresses")
+    async def get_addresses(page: int = 1):
+        calls.append(page)
+        await asyncio.sleep(0.05)
+        return {"page": page}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *[client.get("/addresses?page=1") for _ in range(10)], client.get("/addresses?page=2")
+        )
+    assert sorted(calls) == [1, 2]
+    assert [response.json()["page"] for response in responses] == [1] * 10 + [2]
@@ -0,0 +1,71 @@
+"""
+Tests for local staking event decoding.
+
+This module contains tests for the event decoder, including:
+- Dispatching logs on topic0 and skipping unrelated ones
+- Reading user addresses only from each contract's user-bearing events
+- Decoding amounts above 64 bits and dynamic index arrays
+- Folding events into a deposit ledger and Dune-shaped rows for the stats
+"""
+from app.services.events import (
+    DAY, WEI, DepositCreated, DepositExtended, DepositLedger, DepositsWithdrawn, decode_logs, event_topics,
+    log_addresses, user_topics
+)
+from app.services.stats import stats_service
+
+USER = "0x" + "ab" * 20
+TOPICS = {name: topic for topic, name in event_topics().items()}
+
+def log(name, words, log_index=0):
+    return {
+        "topics": [TOPICS[name], "0x" + "0" * 24 + USER[2:]],
+        "data": "0x" + "".join(format(word, "064x") for word in words),
+        "transactionHash": "0x" + "11" * 32,
+        "logIndex": hex(log_index),
+    }
+
+CREATED = 1_717_500_000
+LOGS = [
+    log("DepositCreated", [0, 1_500_000 * WEI, CREATED + 30 * DAY, CREATED]),
+    {"topics": ["0x" + "ff" * 32], "data": "0x"},  # Some other event
+    log("DepositExtended", [0, CREATED + 90 * DAY, CREATED, CREATED + DAY]),
+    log("DepositsWithdrawn", [96, 500 * WEI, CREATED + 2 * DAY, 2, 0, 3], log_index=1),
+]
+
+def test_decode_logs():
+    assert len(TOPICS) == 3
+    created, extended, withdrawn = decode_logs(LOGS)
+    assert created == DepositCreated(USER, 0, 1_500_000.0, CREATED + 30 * DAY, CREATED)
+    assert extended == DepositExtended(USER, 0, CREATED + 90 * DAY, CREATED, CREATED + DAY)
+    assert withdrawn.deposit_indexes == (0, 3)
+    assert withdrawn.total_amount == 500.0
+    assert isinstance(withdrawn, DepositsWithdrawn)
+
+def test_ledger_rows_and_stats():
+    ledger = DepositLedger()
+    ledger.apply(decode_logs(LOGS))
+    ledger.apply(decode_logs(LOGS))  # Rescanned blocks change nothing
+    row, = ledger.rows("ETH")
+    assert (row["user"], row["norm_amt"], row["old_duration"], row["new_duration"]) == (USER, 1_500_000.0, 30, 90)
+    assert ledger.withdrawn == 500.0
+
+    stats = stats_service.calculate_stats(ledger.rows("ETH"), ledger.withdrawn)
+    assert stats.net_prime_cached == 1_499_500.0
+    assert stats.unique_cachers == 1
+    assert stats.monthly_stats == {"2024-06": 1_500_000.0}
+
+def test_log_addresses():
+    """Only user-bearing events count; mints and chain ids add no addresses"""
+    from eth_hash.auto import keccak
+    topic = lambda signature: "0x" + keccak(signature.encode()).hex()
+    word = lambda address: "0x" + "0" * 24 + address[2:]
+    other = "0x" + "cd" * 20
+    base_logs = [
+        {"topics": [topic("Transfer(address,address,uint256)"), word("0x" + "0" * 40), word(other)], "data": "0x"},  # Mint
+        {"topics": [topic("SendToChain(uint16,address,bytes,uint256)"), "0x%064x" % 101, word(USER)], "data": "0x"},
+        {"topics": [topic("OwnershipTransferred(address,address)"), word(other), word(other)], "data": "0x"},
+    ]
+    assert log_addresses(LOGS) == {USER}
+    assert log_addresses(base_logs, "staking_contract_base_abi") == {USER}
+    assert log_addresses(base_logs) == set()
+    assert set(user_topics("staking_contract_base_abi").values()) == {(1,), (2,)}
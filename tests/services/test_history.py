@@ -0,0 +1,51 @@
+"""
+Tests for the rank and score history store.
+
+This module contains tests for history segments, including:
+- Delta-encoded chunks round-tripping large and negative values
+- Appending runs and reading one address's series
+- Merging segments across levels without losing or reordering points
+"""
+import os
+import pytest
+from app.services.history import HistoryService, decode_blob, encode_chunk
+from tests.helpers import record
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = HistoryService()
+    service.FANOUT = 2
+    return service
+
+def test_chunk_round_trip():
+    """Columns survive delta encoding, including wei amounts beyond 64 bits"""
+    points = [(0, 5, 100, 393104 * 10 ** 18), (1, 3, 90, 0), (4, 0, -10, 2 ** 80)]
+    assert decode_blob(encode_chunk(points)) == points
+    assert decode_blob(encode_chunk(points[:1]) + encode_chunk(points[1:])) == points
+
+def test_series_for_one_address(history):
+    """Each run adds a point per address; unknown addresses have no history"""
+    history.append_run([record("0xAAA", 1, 10.5, prime_amount_cached=7), record("0xbbb", 2, 5.0)])
+    history.append_run([record("0xaaa", 2, 11.25, prime_amount_cached=9), record("0xbbb", None, 12.0)])
+
+    series = history.series("0xAaA")
+    assert [(p["run"], p["leaderboard_rank"], p["score"], p["prime_cached"]) for p in series] == [
+        (0, 1, 10.5, 7), (1, 2, 11.25, 9)
+    ]
+    assert all(p["timestamp"] for p in series)
+    assert history.series("0xbbb")[1]["leaderboard_rank"] is None
+    assert history.series("0xccc") == []
+
+def test_merges_keep_every_point(history):
+    """Segments merge level by level and series stay complete and in run order"""
+    for run in range(5):
+        data = [record("0xaaa", run + 1, float(run))]
+        if run % 2:
+            data.append(record("0xbbb", 1, 100.0))
+        history.append_run(data)
+
+    levels = sorted(name.split("-")[0] for name in os.listdir(history.HISTORY_DIR) if name.endswith(".seg"))
+    assert levels == ["L0", "L2"]
+    assert [p["leaderboard_rank"] for p in history.series("0xaaa")] == [1, 2, 3, 4, 5]
+    assert [p["run"] for p in history.series("0xbbb")] == [1, 3]
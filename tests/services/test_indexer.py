@@ -0,0 +1,111 @@
+"""
+Tests for the multi-chain address indexer.
+
+This module contains tests for IndexerService, including:
+- Scanning every chain and merging the addresses without duplicates
+- Reading addresses only from user-bearing events
+- Resuming from each chain's checkpoint on the next run
+- Splitting block ranges the provider refuses
+- Rebuilding a lost checkpoint from the stored logs without fetching them again
+- Caching stats from chains with deposit events, and from Dune before any scan
+"""
+import os
+import pytest
+from app.routes import stats
+from app.services import indexer
+from app.services.events import event_topics
+from app.services.indexer import Chain, IndexerService, LogRangeTooLarge
+
+CHAINS = (
+    Chain("eth", "eth-mainnet", "0xeth", 100, 10, 4, 1000, 0),
+    Chain("base", "base-mainnet", "0xbase", 50, 25, 4, 1000, 0),
+)
+
+DEPOSIT_CREATED = {name: topic for topic, name in event_topics().items()}["DepositCreated"]
+OTHER_EVENT = "0x" + "ab" * 32
+
+def log(block, topic=DEPOSIT_CREATED, user=None, index=0):
+    return {
+        "blockNumber": hex(block),
+        "logIndex": hex(index),
+        "transactionHash": "0x%064x" % block,
+        "topics": [topic, "0x%064x" % (block if user is None else user)],
+        "data": "0x" + "".join(format(word, "064x") for word in (0, 10 ** 18, 1_800_000_000, 1_700_000_000)),
+    }
+
+def block_logs(block):
+    """A deposit, and an event the indexer doesn't know whose first topic isn't a user"""
+    return [log(block), log(block, OTHER_EVENT, user=10 ** 6 + block, index=1)]
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """Every block holds one deposit by the address numbered like the block, on either chain"""
+    monkeypatch.chdir(tmp_path)
+    latest = {"eth-mainnet": 149, "base-mainnet": 109}
+    calls = []
+
+    async def get_latest_block_number(network):
+        return latest[network]
+
+    async def get_logs(chain, from_block, to_block):
+        calls.append((chain.name, from_block, to_block))
+        if to_block - from_block >= 20:
+            raise LogRangeTooLarge("Log response size exceeded")
+        return [entry for block in range(from_block, to_block + 1) for entry in block_logs(block)]
+
+    monkeypatch.setattr(indexer.blockchain_service, "get_latest_block_number", get_latest_block_number)
+    service = IndexerService(CHAINS)
+    monkeypatch.setattr(service, "_get_logs", get_logs)
+    return service, latest, calls
+
+@pytest.mark.asyncio
+async def test_scans_and_merges_chains(service):
+    service, latest, calls = service
+    addresses = await service.get_interacting_addresses()
+    # Blocks 100-109 are on both chains; the unknown events add no addresses
+    assert addresses == {"0x%040x" % block for block in range(50, 150)}
+    assert any(chain == "base" and to_block - from_block < 20 for chain, from_block, to_block in calls)
+    assert service.load_state(CHAINS[0])["block"] == 149
+
+@pytest.mark.asyncio
+async def test_resumes_from_checkpoint(service):
+    service, latest, calls = service
+    await service.get_interacting_addresses()
+    calls.clear()
+    latest["eth-mainnet"] = 159
+    addresses = await service.get_interacting_addresses()
+    assert calls == [("eth", 150, 159)]
+    assert len(addresses) == 110
+
+
+@pytest.mark.asyncio
+async def test_rebuilds_checkpoint_from_log_store(service):
+    service, latest, calls = service
+    expected = await service.get_interacting_addresses()
+    os.remove(service._state_file(CHAINS[0]))
+    calls.clear()
+    assert await service.get_interacting_addresses() == expected
+    assert calls == []
+    assert service.load_state(CHAINS[0])["block"] == 149
+
+@pytest.mark.asyncio
+async def test_stats_from_chains_with_deposit_events(service):
+    service, latest, calls = service
+    service.chains = (CHAINS[0], CHAINS[1]._replace(abi="staking_contract_base_abi"))
+    await service.get_interacting_addresses()
+    # The Base contract emits no deposit events, so its logs add neither deposits nor users
+    assert service.load_state(service.chains[1])["deposits"] == {}
+    assert service.load_state(service.chains[1])["addresses"] == []
+    assert service.cache_stats().unique_cachers == 50
+
+@pytest.mark.asyncio
+async def test_stats_fall_back_to_dune(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dune_stats = object()
+
+    async def get_cache_stats():
+        return dune_stats
+
+    monkeypatch.setattr(stats.dune_service, "get_cache_stats", get_cache_stats)
+    assert stats.indexer_service.cache_stats() is None
+    assert await stats.get_cache_stats(source="chain") is dune_stats
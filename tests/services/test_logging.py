@@ -0,0 +1,100 @@
+"""
+Tests for the background Telegram sender.
+
+This module contains tests for LoggingService, including:
+- Coalescing queued messages into one post
+- Spacing posts by TELEGRAM_MIN_INTERVAL
+- Waiting out a 429's retry_after and resending
+- Reporting messages dropped while the queue was full
+- Truncating HTML without splitting a tag or an entity
+"""
+import contextlib
+import time
+import pytest
+from app.services import logging_service as logging_module
+from app.services.logging_service import LoggingService, truncate_html
+
+class Response:
+    def __init__(self, status, body=None):
+        self.status = status
+        self.body = body or {}
+
+    async def json(self, content_type=None):
+        return self.body
+
+    async def text(self):
+        return str(self.body)
+
+class Session:
+    """Stands in for the pooled aiohttp session, answering posts with the queued statuses"""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = []  # (time, text)
+
+    @contextlib.asynccontextmanager
+    async def post(self, url, json):
+        self.posts.append((time.monotonic(), json["text"]))
+        yield self.responses.pop(0) if self.responses else Response(200)
+
+@pytest.fixture
+def telegram(monkeypatch):
+    """A sender with short windows, posting to a stub session"""
+    session = Session()
+    monkeypatch.setattr(logging_module, "TELEGRAM_BOT_TOKEN", "token")
+    monkeypatch.setattr(logging_module, "TELEGRAM_CHAT_ID", "chat")
+    monkeypatch.setattr(logging_module.http_service, "get_session", lambda: session)
+    service = LoggingService()
+    service.TELEGRAM_COALESCE_WINDOW = 0.05
+    service.TELEGRAM_MIN_INTERVAL = 0.0
+    return service, session
+
+@pytest.mark.asyncio
+async def test_coalesces_messages(telegram):
+    service, session = telegram
+    for i in range(3):
+        service.queue_telegram_message(f"message {i}")
+    await service.flush()
+    assert [text for _, text in session.posts] == ["message 0\n\nmessage 1\n\nmessage 2"]
+
+@pytest.mark.asyncio
+async def test_spaces_posts_by_min_interval(telegram):
+    service, session = telegram
+    service.TELEGRAM_MIN_INTERVAL = 0.2
+    service.TELEGRAM_MAX_LENGTH = 10  # One message per post
+    for i in range(3):
+        service.queue_telegram_message(f"message {i}")
+    await service.flush()
+    times = [sent for sent, _ in session.posts]
+    assert len(times) == 3
+    assert all(later - earlier >= 0.19 for earlier, later in zip(times, times[1:]))
+
+@pytest.mark.asyncio
+async def test_retries_after_rate_limit(telegram):
+    service, session = telegram
+    session.responses = [Response(429, {"parameters": {"retry_after": 0.2}})]
+    service.queue_telegram_message("hello")
+    await service.flush()
+    (first, text), (second, retried) = session.posts
+    assert text == retried == "hello"
+    assert second - first >= 0.19
+
+@pytest.mark.asyncio
+async def test_reports_dropped_messages(telegram):
+    service, session = telegram
+    service.TELEGRAM_QUEUE_SIZE = 2
+    for i in range(5):
+        service.queue_telegram_message(f"message {i}")
+    assert service.dropped_messages == 3
+    await service.flush()
+    assert session.posts[0][1].endswith("⚠️ 3 log messages dropped (Telegram queue full)")
+    assert service.dropped_messages == 0
+
+def test_truncate_html_keeps_markup_valid():
+    text = "<b>" + "x" * 20 + "</b> <code>" + "&lt;" * 10 + "</code>"
+    for limit in range(5, len(text)):
+        cut = truncate_html(text, limit)
+        assert len(cut) <= limit
+        assert cut.count("<code>") == cut.count("</code>") and cut.count("<b>") == cut.count("</b>")
+        body = cut.replace("&lt;", "")
+        assert "&" not in body and body.count("<") == body.count(">")
+    assert truncate_html(text, len(text)) == text
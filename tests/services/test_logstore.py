@@ -0,0 +1,69 @@
+"""
+Tests for the on-disk log store.
+
+This module contains tests for LogStore, including:
+- Reading stored logs back in block order, in the shape eth_getLogs returns
+- Replacing a stored block range when it is appended again
+- Rotating segments and removing the ones no chunk uses
+- Tracking which block ranges are covered, including ranges without logs
+"""
+import os
+import pytest
+from app.services.logstore import LogStore
+
+def log(block, index=0, data="0x"):
+    return {
+        "blockNumber": hex(block),
+        "logIndex": hex(index),
+        "transactionHash": "0x%064x" % block,
+        "topics": ["0x" + "ab" * 32, "0x%064x" % (block * 10 + index)],
+        "data": data,
+    }
+
+@pytest.fixture
+def store(tmp_path):
+    return LogStore(str(tmp_path / "eth"), "0xContract")
+
+def test_round_trip(store):
+    logs = [log(10, 0, "0x" + "01" * 64), log(10, 1), log(12)]
+    store.append(10, 12, logs)
+    assert [list(chunk) for chunk in store.read(0, 100)] == [logs]
+    assert list(store.read(11, 12)) == [[logs[2]]]
+    assert list(store.read(13, 20)) == []
+
+def test_append_replaces_stored_range(store):
+    store.append(0, 9, [log(block) for block in range(10)])
+    store.append(4, 5, [log(5, 1)])
+    stored = [entry for chunk in store.read(0, 9) for entry in chunk]
+    assert [(int(entry["blockNumber"], 16), int(entry["logIndex"], 16)) for entry in stored] == [
+        (0, 0), (1, 0), (2, 0), (3, 0), (5, 1), (6, 0), (7, 0), (8, 0), (9, 0)
+    ]
+    # The index survives a reload
+    reloaded = LogStore(store.directory, "0xcontract")
+    assert [entry for chunk in reloaded.read(0, 9) for entry in chunk] == stored
+
+def test_rotates_and_removes_unused_segments(store):
+    store.SEGMENT_BYTES = 1
+    store.append(0, 4, [log(block) for block in range(5)])
+    store.append(5, 9, [log(block) for block in range(5, 10)])
+    assert len([name for name in os.listdir(store.directory) if name.endswith(".log")]) == 2
+    store.append(0, 4, [log(1)])
+    segments = sorted(name for name in os.listdir(store.directory) if name.endswith(".log"))
+    assert segments == ["000001.log", "000002.log"]
+    assert [len(chunk) for chunk in store.read(0, 9)] == [1, 5]
+
+def test_covered_until(store):
+    assert store.covered_until(100) == 99
+    store.append(100, 109, [])
+    store.append(110, 119, [log(115)])
+    store.append(130, 139, [])
+    assert store.covered_until(100) == 119
+    assert store.covered_until(105) == 119
+    assert store.covered_until(120) == 119
+    assert store.covered_until(130) == 139
+
+def test_other_contract_starts_over(store):
+    store.append(0, 9, [log(1)])
+    other = LogStore(store.directory, "0xOther")
+    assert other.chunks == []
+    assert other.covered_until(0) == -1
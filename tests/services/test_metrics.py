@@ -0,0 +1,57 @@
+"""
+Tests for the Prometheus metrics.
+
+This module contains tests for the metric types and MetricsMiddleware, including:
+- Cumulative histogram buckets, the +Inf bucket, _sum and _count
+- Escaping label values
+- Labelling requests by route template rather than raw path
+"""
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from app.services import metrics
+from app.services.metrics import Counter, Histogram, MetricsMiddleware, MetricsService
+
+def test_histogram_exposition():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe("/a", value=value)
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 2.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+def test_label_escaping():
+    counter = Counter("calls_total", "Calls", ("detail",))
+    counter.inc('say "hi"\\\nbye', amount=2)
+    assert counter.render()[-1] == 'calls_total{detail="say \\"hi\\"\\\\\\nbye"} 2'
+
+def test_middleware_labels_route_templates(monkeypatch):
+    service = MetricsService()
+    monkeypatch.setattr(metrics, "metrics_service", service)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/addresses/{address}/history")
+    async def get_address_history(address: str):
+        if address == "0xmissing":
+            raise HTTPException(status_code=404)
+        return {"address": address}
+
+    with TestClient(app) as client:
+        for address in ("0xaaa", "0xbbb", "0xmissing"):
+            client.get(f"/addresses/{address}/history")
+        client.get("/nowhere/1")
+        client.get("/nowhere/2")
+
+    # Each series holds the bucket counts, the +Inf count and the sum
+    counts = {labels: sum(series[:-1]) for labels, series in service.request_duration.values.items()}
+    assert counts == {
+        ("GET", "/addresses/{address}/history", "200"): 2,
+        ("GET", "/addresses/{address}/history", "404"): 1,
+        ("GET", "unmatched", "404"): 2,
+    }
@@ -0,0 +1,79 @@
+"""
+Tests for the update pipeline runner.
+
+This module contains tests for the DAG pipeline, including:
+- Input wiring between stages
+- Concurrent execution of independent stages
+- Per-stage timings
+- Validation of unknown inputs and cycles
+- Failure propagation
+"""
+import asyncio
+import time
+import pytest
+from app.services.pipeline import Pipeline, Stage
+
+@pytest.mark.asyncio
+async def test_pipeline_wires_inputs_in_order():
+    """Stage outputs are passed positionally in the order of `inputs`"""
+    pipeline = Pipeline("test", [
+        Stage("a", lambda: 2),
+        Stage("b", lambda: 3),
+        Stage("diff", lambda b, a: b - a, inputs=["b", "a"]),
+    ])
+    results = await pipeline.run()
+    assert results == {"a": 2, "b": 3, "diff": 1}
+    assert set(pipeline.timings) == {"a", "b", "diff"}
+
+@pytest.mark.asyncio
+async def test_independent_stages_overlap():
+    """Wall time approaches the longest path instead of the sum of stages"""
+    async def slow(value):
+        await asyncio.sleep(0.2)
+        return value
+
+    pipeline = Pipeline("test", [
+        Stage("x", lambda: slow(1)),
+        Stage("y", lambda: slow(2)),
+        Stage("z", lambda: slow(3)),
+        Stage("sum", lambda x, y, z: x + y + z, inputs=["x", "y", "z"]),
+    ])
+    start = time.monotonic()
+    results = await pipeline.run()
+    elapsed = time.monotonic() - start
+
+    assert results["sum"] == 6
+    assert elapsed < 0.5
+    assert pipeline.timings["sum"].started >= 0.2
+
+def test_pipeline_rejects_unknown_inputs_and_cycles():
+    """Invalid graphs are rejected when the pipeline is built"""
+    with pytest.raises(ValueError):
+        Pipeline("test", [Stage("a", lambda missing: missing, inputs=["missing"])])
+    with pytest.raises(ValueError):
+        Pipeline("test", [
+            Stage("a", lambda b: b, inputs=["b"]),
+            Stage("b", lambda a: a, inputs=["a"]),
+        ])
+
+@pytest.mark.asyncio
+async def test_failing_stage_lets_independent_stages_finish():
+    """A failing stage aborts its dependents, independent stages still complete"""
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        finished.append("slow")
+        return 1
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    pipeline = Pipeline("test", [
+        Stage("slow", slow),
+        Stage("broken", fail),
+        Stage("downstream", lambda broken: finished.append("downstream"), inputs=["broken"]),
+    ])
+    with pytest.raises(RuntimeError):
+        await pipeline.run()
+    assert finished == ["slow"]
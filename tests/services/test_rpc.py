@@ -0,0 +1,140 @@
+"""
+Tests for the RPC provider pool.
+
+This module contains tests for RpcPool and PoolProvider, including:
+- Failing over when an endpoint errors and preferring healthy endpoints afterwards
+- Skipping rate-limited endpoints until their Retry-After has passed
+- Hedging slow calls on another endpoint
+- Routing log ranges by each endpoint's declared max_log_range, splitting them into batches
+- Sending concurrent calls to batch-capable endpoints in one HTTP request
+- Serving AsyncWeb3 calls, many at once, without a thread pool
+"""
+import asyncio
+import contextlib
+import time
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from web3 import AsyncWeb3
+from app.services.http import http_service
+from app.services.rpc import Endpoint, LogRangeTooLarge, RpcPool
+from app.services.web3_provider import PoolProvider
+
+class Node:
+    """A JSON-RPC node answering eth_blockNumber with its own block number, and eth_getLogs with the range start"""
+    def __init__(self, block: int, delay: float = 0.0, status: int = 200):
+        self.block = block
+        self.delay = delay
+        self.status = status
+        self.requests = []  # Calls per HTTP request
+        self.in_flight = self.peak = 0
+
+    async def handle(self, request):
+        payload = await request.json()
+        calls = payload if isinstance(payload, list) else [payload]
+        self.requests.append(len(calls))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        if self.status != 200:
+            return web.json_response({"error": "unavailable"}, status=self.status, headers={"Retry-After": "60"})
+        responses = [
+            {"jsonrpc": "2.0", "id": call["id"], "result": [call["params"][0]["fromBlock"]] if call["method"] == "eth_getLogs" else hex(self.block)}
+            for call in calls
+        ]
+        return web.json_response(responses if isinstance(payload, list) else responses[0])
+
+@contextlib.asynccontextmanager
+async def serve(*nodes):
+    """Start the nodes and yield their URLs"""
+    servers = []
+    try:
+        for node in nodes:
+            app = web.Application()
+            app.router.add_post("/", node.handle)
+            server = TestServer(app)
+            await server.start_server()
+            servers.append(server)
+        yield [str(server.make_url("/")) for server in servers]
+    finally:
+        for server in servers:
+            await server.close()
+        await http_service.close()
+
+def make_pool(urls, **capabilities):
+    pool = RpcPool([
+        Endpoint(f"node{i}", "testnet", url, **capabilities.get(f"node{i}", {}))
+        for i, url in enumerate(urls)
+    ])
+    pool.RETRY_DELAY = 0.01
+    pool.HEDGE_MIN_DELAY = 0.05
+    return pool
+
+@pytest.mark.asyncio
+async def test_fails_over_and_prefers_healthy_endpoint():
+    failing, healthy = Node(1, status=500), Node(2)
+    async with serve(failing, healthy) as urls:
+        pool = make_pool(urls)
+        assert await pool.request("testnet", "eth_blockNumber", []) == hex(2)
+        assert await pool.request("testnet", "eth_blockNumber", []) == hex(2)
+        assert failing.requests == [1]
+        assert healthy.requests == [1, 1]
+
+@pytest.mark.asyncio
+async def test_skips_rate_limited_endpoint():
+    limited, other = Node(1, status=429), Node(2)
+    async with serve(limited, other) as urls:
+        pool = make_pool(urls)
+        for _ in range(3):
+            assert await pool.request("testnet", "eth_blockNumber", []) == hex(2)
+        assert len(limited.requests) == 1
+        assert not pool.health[pool.endpoints("testnet")[0]].available()
+
+@pytest.mark.asyncio
+async def test_hedges_slow_calls():
+    slow, fast = Node(1), Node(2)
+    async with serve(slow, fast) as urls:
+        pool = make_pool(urls)
+        for _ in range(10):  # Learn the first endpoint's usual latency
+            await pool.request("testnet", "eth_blockNumber", [])
+        slow.delay = 2
+        start = time.perf_counter()
+        assert await pool.request("testnet", "eth_blockNumber", []) == hex(2)
+        assert time.perf_counter() - start < 1
+        assert len(slow.requests) == 11
+
+@pytest.mark.asyncio
+async def test_routes_log_ranges_by_capability():
+    narrow, wide = Node(1), Node(2)
+    async with serve(narrow, wide) as urls:
+        pool = make_pool(urls, node0={"max_log_range": 10})
+        assert await pool.request("testnet", "eth_blockNumber", [], blocks=100) == hex(2)
+        assert narrow.requests == []
+        log_filter = {"fromBlock": hex(0), "toBlock": hex(99)}
+        with pytest.raises(LogRangeTooLarge):
+            await make_pool(urls[:1], node0={"max_log_range": 10}).request("testnet", "eth_getLogs", [log_filter], blocks=100)
+        # With batch support, the narrow endpoint takes the range as one batch of smaller ranges
+        batching = make_pool(urls[:1], node0={"max_log_range": 10, "max_batch": 10})
+        logs = await batching.request("testnet", "eth_getLogs", [log_filter], blocks=100)
+        assert logs == [hex(block) for block in range(0, 100, 10)]
+        assert narrow.requests == [10]
+
+@pytest.mark.asyncio
+async def test_batches_concurrent_calls():
+    node = Node(7)
+    async with serve(node) as urls:
+        pool = make_pool(urls, node0={"max_batch": 4})
+        results = await asyncio.gather(*[pool.request("testnet", "eth_blockNumber", []) for _ in range(6)])
+        assert results == [hex(7)] * 6
+        assert sorted(node.requests) == [2, 4]
+
+@pytest.mark.asyncio
+async def test_web3_calls_are_not_capped_by_threads():
+    node = Node(1234, delay=0.05)
+    async with serve(node) as urls:
+        pool = make_pool(urls, node0={"max_concurrency": 100, "requests_per_second": 10_000})
+        web3 = AsyncWeb3(PoolProvider("testnet", pool))
+        results = await asyncio.gather(*[web3.eth.block_number for _ in range(60)])
+        assert results == [1234] * 60
+        assert node.peak > 40
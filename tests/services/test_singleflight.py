@@ -0,0 +1,45 @@
+"""
+Tests for single-flight call coalescing.
+
+This module contains tests for SingleFlight, including:
+- Concurrent callers sharing one call's result or exception
+- A waiter taking over when the leading caller is cancelled
+"""
+import asyncio
+import pytest
+from app.services.singleflight import SingleFlight
+
+@pytest.mark.asyncio
+async def test_shares_result_and_exception():
+    flights = SingleFlight()
+    calls = []
+
+    async def work(fail=False):
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if fail:
+            raise ValueError("upstream failed")
+        return len(calls)
+
+    assert await asyncio.gather(*[flights.do("key", work) for _ in range(5)]) == [1] * 5
+    results = await asyncio.gather(*[flights.do("key", lambda: work(fail=True)) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(calls) == 2
+    assert not flights.calls
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_from_cancelled_leader():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    leader = asyncio.create_task(flights.do("key", work))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flights.do("key", work))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await waiter == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await leader
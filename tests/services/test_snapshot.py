@@ -0,0 +1,166 @@
+"""
+Tests for the shared leaderboard snapshot.
+
+This module contains tests for the snapshot file, including:
+- Records paged in leaderboard_rank order with unranked records last
+- Address positions and ENS lookups served from the snapshot indexes
+- Publishing a new version and rebuilding from stale JSON files
+- Diffs between consecutive versions and the full-resync signal
+- Versions that round-trip through a float
+- Batch position lookups by address and ENS name
+- Summary and field projections of leaderboard records
+- File locks excluding other holders
+"""
+import json
+import os
+import pytest
+from app.models.request import AddressRequest, PositionBatchRequest
+from app.routes import addresses
+from app.services.filelock import FileLock
+from app.services.snapshot import Snapshot, SnapshotService, build_snapshot, merge_changes, snapshot_service
+from app.services.storage import JsonStorage
+from tests.helpers import RECORDS, record
+
+ENS = {"0xAAA": "alice.eth", "0xccc": "carol.eth"}
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / "leaderboard.snapshot"
+    build_snapshot(str(path), RECORDS, ENS, version=1)
+    return Snapshot(str(path))
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return SnapshotService(JsonStorage())
+
+def test_records_in_rank_order(snapshot):
+    """Rows follow leaderboard_rank and unranked records come last"""
+    rows = [json.loads(raw)["address"] for raw in snapshot.records_json(0, snapshot.count)]
+    assert rows == ["0xccc", "0xAAA", "0xbbb"]
+    assert snapshot.rows_up_to_rank(1) == 1
+    assert snapshot.rank(2) is None
+    assert snapshot.meta["total_score"] == 60.0
+
+def test_positions_and_ens(snapshot):
+    """Lookups are case-insensitive and match the published score order"""
+    assert snapshot.find("0xaaa") == 1
+    assert snapshot.find("0xddd") is None
+    assert snapshot.position(["0xaaa"]) == 1
+    assert snapshot.position(["0xccc"]) == 3
+    assert snapshot.position(["0xbbb", "0xccc"]) == 1
+    assert snapshot.ens_name("0xaaa") == "alice.eth"
+    assert snapshot.ens_address("CAROL.eth") == "0xccc"
+    assert json.loads(snapshot.ens_json) == ENS
+
+def test_publish_and_rebuild(service):
+    """Readers see a published version, and stale JSON sources trigger a rebuild"""
+    first = service.publish(RECORDS, ENS)
+    assert service.current() is first
+
+    second = service.publish(RECORDS[:1], {})
+    assert second.version != first.version
+    assert service.current().count == 1
+
+    with open(service.storage.ADDRESSES_FILE, "w") as f:
+        json.dump(RECORDS, f)
+    os.utime(service.storage.ADDRESSES_FILE, ns=(second.stat_key[1] + 1, second.stat_key[1] + 1))
+    assert service.is_stale()
+    service.ensure_current()
+    assert not service.is_stale()
+    assert service.current().count == 3
+
+def test_changes_since(service):
+    """Consecutive diffs fold into one delta; unknown versions ask for a full resync"""
+    first = service.publish(RECORDS, ENS)
+    moved = [record("0xAAA", 1, 30.0), record("0xccc", 2, 10.0), record("0xbbb", None, 25.0)]
+    second = service.publish(moved, ENS)
+    third = service.publish(moved[:2] + [record("0xddd", 3, 5.0)], ENS)
+
+    version, step = service.changes_since(second.version)
+    assert version == third.version
+    assert step["removed"] == ["0xbbb"]
+    assert [r["address"] for r in step["added"]] == ["0xddd"]
+    assert step["changed"] == [] and step["moved"] == []
+
+    _, delta = service.changes_since(first.version)
+    assert delta["removed"] == ["0xbbb"]
+    assert [r["address"] for r in delta["added"]] == ["0xddd"]
+    assert sorted((m["address"], m["from_rank"], m["leaderboard_rank"]) for m in delta["moved"]) == [
+        ("0xaaa", 2, 1), ("0xccc", 1, 2)
+    ]
+
+    assert service.changes_since(third.version)[1] == {"added": [], "removed": [], "changed": [], "moved": []}
+    assert service.changes_since(0)[1] is None
+
+def test_versions_survive_float_round_trip(service):
+    """Versions parsed as JavaScript numbers still find their diffs"""
+    first = service.publish(RECORDS, ENS)
+    second = service.publish(RECORDS[:2], ENS)
+    assert second.version > first.version
+    for version in (first.version, second.version):
+        assert int(float(version)) == version
+    version, delta = service.changes_since(int(float(first.version)))
+    assert version == second.version and delta["removed"] == ["0xccc"]
+
+def test_merge_changes_patches_sent_records():
+    """A record sent whole picks up later moves, and add-then-remove cancels out"""
+    added = record("0xeee", 3, 1.0)
+    delta = merge_changes([
+        {"added": [added, record("0xfff", 4, 1.0)], "removed": [], "changed": [], "moved": []},
+        {"added": [], "removed": ["0xfff"], "changed": [], "moved": [
+            {"address": "0xeee", "from_rank": 3, "leaderboard_rank": 2, "position": 2, "percentage": 1.5}
+        ]},
+    ])
+    assert delta["removed"] == [] and delta["moved"] == []
+    assert delta["added"][0]["data"]["leaderboard_rank"] == 2
+    assert delta["added"][0]["data"]["percentage"] == 1.5
+
+@pytest.mark.asyncio
+async def test_batch_positions(tmp_path, monkeypatch):
+    """Each query gets its rank, score and window, or an error of its own"""
+    monkeypatch.chdir(tmp_path)
+    snapshot_service.publish(RECORDS, ENS)
+    response = await addresses.search_positions(PositionBatchRequest(
+        queries=["carol.eth", "0xAAA", "0xbbb", "0xddd", "nobody.eth"], window=1
+    ))
+    carol, alice, bob, missing, unknown = json.loads(response.body)["results"]
+    assert (carol["resolved_address"], carol["position"], carol["score"]) == ("0xccc", 1, 10.0)
+    assert [r["address"] for r in carol["window"]] == ["0xccc", "0xAAA"]
+    assert (alice["position"], alice["next_round_number"]) == (2, 10)
+    assert [r["address"] for r in alice["window"]] == ["0xccc", "0xAAA", "0xbbb"]
+    assert bob["error"] == "Address has no rank"
+    assert missing["error"] == "Address not found"
+    assert unknown["error"] == "ENS name not found"
+
+@pytest.mark.asyncio
+async def test_field_projections(tmp_path, monkeypatch):
+    """fields=summary serves the compact records; other fields project record data"""
+    monkeypatch.chdir(tmp_path)
+    snapshot_service.publish(RECORDS, ENS)
+
+    response = await addresses.get_addresses(page=1, page_size=10, fields="summary")
+    summary = json.loads(response.body)["data"][0]
+    assert summary["address"] == "0xccc" and summary["leaderboard_rank"] == 1 and summary["score"] == 10.0
+    assert "merged_score_data" not in summary
+
+    response = await addresses.get_addresses(page=1, page_size=10, fields="leaderboard_rank, missing")
+    assert json.loads(response.body)["data"][1] == {"address": "0xAAA", "data": {"leaderboard_rank": 2}}
+
+    scores = {"prime_score": 20.0, "community_score": 5.0, "initialization_score": 5.0}
+    snapshot_service.publish([{"address": "0xAAA", "data": {"leaderboard_rank": 1, "merged_score_data": scores}}], {})
+    info = await addresses.get_address_info(AddressRequest(addresses=["0xaaa"]), fields="summary")
+    assert info["addresses_found"][0]["score"] == 30.0
+
+def test_file_lock_excludes_other_holders(tmp_path):
+    """Only one lock on a path is held at a time, and release frees it"""
+    path = str(tmp_path / "update.lock")
+    first, second = FileLock(path), FileLock(path)
+    assert first.acquire(blocking=False)
+    assert second.held_elsewhere()
+    assert not second.acquire(blocking=False)
+    first.release()
+    assert not second.held_elsewhere()
+    with second:
+        assert second.locked
+    assert not second.locked
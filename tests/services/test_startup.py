@@ -0,0 +1,26 @@
+"""
+Tests for application startup.
+
+This module contains tests for lazy initialization, including:
+- Importing the app without API keys and without loading web3 or the Dune client
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def test_app_imports_without_keys_or_web3(tmp_path):
+    """A read-only process starts without secrets and never imports web3"""
+    env = {k: v for k, v in os.environ.items() if k not in ("ALCHEMY_API_KEY", "DUNE_API_KEY")}
+    env["SCHEDULER_ENABLED"] = "false"
+    code = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import app.main; "
+        "print('web3' in sys.modules, 'dune_client' in sys.modules)"
+    )
+    # Run outside the repository so a local .env can't provide the keys
+    result = subprocess.run(
+        [sys.executable, "-c", code, ROOT], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["False", "False"]
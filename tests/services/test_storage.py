@@ -0,0 +1,70 @@
+"""
+Tests for the storage backends.
+
+This module contains tests for JSON and SQLite storage, including:
+- Round-tripping records in leaderboard order, ENS names and upstream caches
+- Upserts that only write changed records and delete missing ones
+- Partial ENS updates reaching the stored records
+- Rebuilding the snapshot when storage is newer
+"""
+import pytest
+from app.services.snapshot import SnapshotService
+from app.services.storage import JsonStorage, SqliteStorage
+from tests.helpers import RECORDS, record
+
+# Saved in leaderboard order, as the update pipeline saves them
+LEADERBOARD = sorted(RECORDS, key=lambda info: info["data"]["leaderboard_rank"] or float("inf"))
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return JsonStorage() if request.param == "json" else SqliteStorage(str(tmp_path / "leaderboard.db"))
+
+def test_round_trip(storage):
+    with pytest.raises(FileNotFoundError):
+        storage.load_addresses()
+    assert storage.load_ens() is None
+    assert storage.modified_ns() == 0
+
+    storage.save_addresses(LEADERBOARD)
+    storage.save_ens({"0xaaa": "alice.eth"})
+    storage.save_cache("dune", [{"address": "0xaaa"}])
+    assert storage.load_addresses()[0]["address"] == "0xccc"
+    assert storage.load_addresses()[1]["data"]["ens_name"] == "alice.eth"
+    assert storage.load_ens() == {"0xaaa": "alice.eth"}
+    assert storage.load_cache("dune", max_age=60) == [{"address": "0xaaa"}]
+    assert storage.load_cache("dune", max_age=-1) is None
+    assert storage.modified_ns() > 0
+
+def test_partial_ens_update(storage):
+    storage.save_addresses(LEADERBOARD)
+    storage.save_ens({"0xaaa": "alice.eth", "0xccc": "carol.eth"})
+    storage.update_ens({"0xaaa": None, "0xbbb": "bob.eth"})
+    assert storage.load_ens() == {"0xbbb": "bob.eth", "0xccc": "carol.eth"}
+    names = [address_info["data"].get("ens_name") for address_info in storage.load_addresses()]
+    assert names == ["carol.eth", None, "bob.eth"]
+
+def test_sqlite_upserts_only_changed_rows(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "leaderboard.db"))
+    assert storage.save_addresses(LEADERBOARD) == 3
+    modified = storage.modified_ns()
+    assert storage.save_addresses(LEADERBOARD) == 0
+    assert storage.modified_ns() == modified
+
+    changed = [LEADERBOARD[0], record("0xAAA", 2, 25.0)]
+    assert storage.save_addresses(changed) == 2  # One update, one delete
+    assert [address_info["address"] for address_info in storage.load_addresses()] == ["0xccc", "0xAAA"]
+    plan = storage.db.execute("EXPLAIN QUERY PLAN SELECT address FROM ens WHERE name = 'x'").fetchall()
+    assert "ens_name" in str(plan)
+
+def test_snapshot_rebuilt_from_sqlite(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    storage = SqliteStorage(str(tmp_path / "leaderboard.db"))
+    service = SnapshotService(storage)
+    storage.save_addresses(LEADERBOARD)
+    storage.save_ens({"0xaaa": "alice.eth"})
+    assert service.is_stale()
+    service.ensure_current()
+    assert not service.is_stale()
+    assert service.current().count == 3
+    assert service.current().ens_address("alice.eth") == "0xaaa"
@@ -0,0 +1,104 @@
+"""
+Tests for the snapshot event stream.
+
+This module contains tests for StreamService and the /stream route, including:
+- Pushing the version, changed totals and the delta of a new snapshot, encoded once for all subscribers
+- Filtering deltas to the addresses a subscriber watches
+- Catching up from a snapshot version on reconnect
+- Ending the stream of a subscriber that falls behind
+"""
+import asyncio
+import json
+import pytest
+from app.routes import stream
+from app.services.snapshot import SnapshotService, snapshot_service
+from app.services.storage import JsonStorage
+from app.services.stream import StreamService, stream_service
+from tests.helpers import record
+
+BEFORE = [record("0xaaa", 1, 30.0), record("0xbbb", 2, 20.0)]
+AFTER = [record("0xaaa", 1, 30.0), record("0xbbb", 2, 25.0), record("0xccc", 3, 5.0)]
+
+def parse(event: bytes):
+    """The name, id and data of one encoded event"""
+    fields = dict(line.split(": ", 1) for line in event.decode().strip().split("\n"))
+    return fields["event"], fields.get("id"), json.loads(fields["data"])
+
+def drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(parse(subscription.queue.get_nowait()))
+    return events
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return SnapshotService(JsonStorage())
+
+@pytest.mark.asyncio
+async def test_pushes_new_snapshot(snapshots):
+    """Every subscriber gets the same encoded events; deltas go only to those who asked"""
+    first = snapshots.publish(BEFORE, {})
+    service = StreamService(snapshots)
+    plain, whole, watching = service.subscribe(), service.subscribe(changes=True), service.subscribe(addresses=frozenset({"0xccc"}))
+    try:
+        assert not service.check()
+        second = snapshots.publish(AFTER, {})
+        assert service.check()
+        version = ("version", str(second.version), {"version": second.version, "previous": first.version})
+        totals = ("global", None, {"total_score": 60.0, "total_prime_cached": 0, "total_addresses": 3})
+        assert drain(plain) == [version, totals]
+        events = drain(whole)
+        assert events[:2] == [version, totals]
+        name, _, delta = events[2]
+        assert name == "changes" and delta["since"] == first.version
+        assert [entry["address"] for entry in delta["added"]] == ["0xccc"]
+        assert [entry["address"] for entry in delta["changed"]] == ["0xbbb"]
+        name, _, delta = drain(watching)[2]
+        assert [entry["address"] for entry in delta["added"]] == ["0xccc"] and delta["changed"] == []
+        # The totals are unchanged by a republish, so only the version is pushed
+        snapshots.publish(AFTER, {})
+        assert service.check()
+        assert [event[0] for event in drain(plain)] == ["version"]
+        assert [event[0] for event in drain(whole)] == ["version", "changes"]
+        assert drain(watching) == [("version", str(snapshots.current().version), {"version": snapshots.current().version, "previous": second.version})]
+    finally:
+        service._task.cancel()
+
+@pytest.mark.asyncio
+async def test_catches_up_and_drops_laggards(snapshots):
+    """A reconnecting client gets the delta it missed; a full queue ends the stream"""
+    first = snapshots.publish(BEFORE, {})
+    snapshots.publish(AFTER, {})
+    service = StreamService(snapshots)
+    service.QUEUE_SIZE = 2
+    subscription = service.subscribe(changes=True)
+    try:
+        events = [parse(event) for event in service.initial_events(subscription, since=first.version)]
+        assert [event[0] for event in events] == ["version", "global", "changes"]
+        assert [parse(event)[0] for event in service.initial_events(subscription, since=1)][-1] == "resync"
+        for _ in range(3):
+            snapshots.publish(BEFORE, {})
+            service.check()
+        assert subscription.queue.get_nowait() is None
+        assert subscription not in service.subscribers
+    finally:
+        service._task.cancel()
+
+@pytest.mark.asyncio
+async def test_stream_route(tmp_path, monkeypatch):
+    """The route sends the current state, then what the fan-out task pushes"""
+    monkeypatch.chdir(tmp_path)
+    snapshot_service.publish(BEFORE, {})
+    response = await stream.get_stream(changes=False, addresses="0xBBB", since=None, last_event_id=None)
+    assert response.media_type == "text/event-stream"
+    body = response.body_iterator
+    try:
+        assert [parse(await body.__anext__())[0] for _ in range(2)] == ["version", "global"]
+        snapshot_service.publish(AFTER, {})
+        stream_service.check()
+        names = [parse(await asyncio.wait_for(body.__anext__(), 1))[0] for _ in range(3)]
+        assert names == ["version", "global", "changes"]
+    finally:
+        await body.aclose()
+    assert not stream_service.subscribers
@@ -0,0 +1,47 @@
+"""
+Tests for the tracing service.
+
+This module contains tests for span tracing, including:
+- Nesting across asyncio.gather
+- Overlapping traces staying separate
+- Error status on failing spans
+"""
+import asyncio
+import pytest
+from app.services.tracing import Tracer
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_gather():
+    """Spans opened in gathered tasks attach to the span that created the tasks"""
+    tracer = Tracer()
+
+    async def fetch(address):
+        with tracer.span("fetch", address=address):
+            await asyncio.sleep(0.01)
+            tracer.add("retries")
+
+    async def run(run_id):
+        with tracer.span("run", run_id=run_id):
+            await asyncio.gather(*(fetch(f"{run_id}-{i}") for i in range(3)))
+
+    await asyncio.gather(run("a"), run("b"))
+
+    traces = tracer.get_traces()
+    assert sorted(trace["attributes"]["run_id"] for trace in traces) == ["a", "b"]
+    for trace in traces:
+        run_id = trace["attributes"]["run_id"]
+        assert len(trace["children"]) == 3
+        assert all(child["attributes"]["address"].startswith(run_id) for child in trace["children"])
+        assert all(child["attributes"]["retries"] == 1 for child in trace["children"])
+        assert trace["duration"] >= max(child["duration"] for child in trace["children"])
+
+def test_failing_span_records_error():
+    tracer = Tracer()
+    with pytest.raises(ValueError):
+        with tracer.span("broken"):
+            raise ValueError("bad data")
+
+    trace = tracer.get_traces()[0]
+    assert trace["status"] == "error"
+    assert trace["error"] == "bad data"
+    assert tracer.current() is None
@@ -0,0 +1,70 @@
+"""
+Tests for the single-run update mutex.
+
+This module contains tests for SchedulerService.run_update, including:
+- Skipping a trigger while another run is in progress, in this or another worker
+- Recording the trigger, timing and outcome of the latest run
+- Releasing the mutex when a run fails
+"""
+import asyncio
+import pytest
+from app.services.filelock import FileLock
+from app.services.scheduler import SchedulerService
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    """A scheduler whose update waits on an event and fails when told to"""
+    monkeypatch.chdir(tmp_path)
+    service = SchedulerService()
+    control = {"release": asyncio.Event(), "error": None, "runs": 0}
+
+    async def update_interacting_addresses(run_id=None):
+        control["runs"] += 1
+        service.current_run_id = f"run-{control['runs']}"
+        await control["release"].wait()
+        if control["error"]:
+            raise control["error"]
+
+    service.update_interacting_addresses = update_interacting_addresses
+    return service, control
+
+@pytest.mark.asyncio
+async def test_concurrent_trigger_is_skipped(scheduler):
+    service, control = scheduler
+    first = asyncio.ensure_future(service.run_update("scheduled"))
+    await asyncio.sleep(0)
+    assert service.is_update_running()
+    assert await service.run_update("manual") is False
+    assert service.last_run["trigger"] == "scheduled" and service.last_run["status"] == "running"
+    control["release"].set()
+    assert await first is True
+    assert control["runs"] == 1
+    assert not service.is_update_running()
+    run = service.last_run
+    assert (run["trigger"], run["status"], run["run_id"], run["error"]) == ("scheduled", "success", "run-1", None)
+    assert run["started"] <= run["ended"]
+
+@pytest.mark.asyncio
+async def test_lock_released_after_failure(scheduler):
+    service, control = scheduler
+    control["release"].set()
+    control["error"] = RuntimeError("wayfinder down")
+    assert await service.run_update("manual") is True
+    assert (service.last_run["status"], service.last_run["error"]) == ("failed", "wayfinder down")
+    assert not service.is_update_running()
+    control["error"] = None
+    assert await service.run_update("manual") is True
+    assert service.last_run["status"] == "success" and control["runs"] == 2
+
+@pytest.mark.asyncio
+async def test_run_in_another_worker_is_skipped(scheduler):
+    service, control = scheduler
+    other_worker = FileLock(service.run_lock.path)
+    assert other_worker.acquire(blocking=False)
+    try:
+        assert service.is_update_running()
+        assert await service.run_update("manual") is False
+        assert control["runs"] == 0
+    finally:
+        other_worker.release()
+    assert not service.is_update_running()